@@ -0,0 +1,380 @@
+# almacen.py
+# Almacén columnar binario para los datos de ventas.
+# Convierte ventas.csv en un directorio con un archivo binario por columna
+# (tipos fijos) más un meta.json, y lo abre con memory-mapping para que el
+# arranque no tenga que volver a parsear texto ni derivar el calendario.
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import cubo
+from dimensiones import ORDEN_DIA_SEMANA
+
+VERSION_ESQUEMA = 2
+FILAS_POR_BLOQUE = 1_000_000
+# Por debajo de este tamaño el pool de procesos cuesta más de lo que ahorra
+FILAS_MINIMAS_PARALELO = 2_000_000
+
+# Columna -> (archivo, tipo en disco)
+COLUMNAS = {
+    'Fecha': ('fecha.bin', 'int32'),          # días desde 1970-01-01
+    'Producto': ('producto.bin', 'int16'),    # código de categoría
+    'Región': ('region.bin', 'int16'),        # código de categoría
+    'Ventas': ('ventas.bin', 'int32'),
+    'Mes': ('mes.bin', 'int8'),
+    'Año': ('anio.bin', 'int16'),
+    'Trimestre': ('trimestre.bin', 'int8'),
+    'Día_Semana': ('dia_semana.bin', 'int8'),  # 0 = lunes
+}
+
+ARCHIVO_CUBO = 'cubo.npz'
+
+# Un solo hilo por proceso revisa, ingiere o anexa al almacén a la vez.
+# Es reentrante: anexar() lo retiene mientras carga el cubo y extiende las
+# estructuras derivadas, que vuelven a llamar a preparar().
+_lock = threading.RLock()
+CATEGORICAS = ['Producto', 'Región']
+COLUMNAS_LOTE = ['Fecha', 'Producto', 'Región', 'Ventas']
+
+
+# Directorio del almacén asociado a un CSV (ventas.csv -> ventas_columnar/)
+def ruta_almacen(ruta_csv):
+    return os.path.splitext(ruta_csv)[0] + '_columnar'
+
+
+def _leer_meta(ruta):
+    with open(os.path.join(ruta, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _escribir_meta(ruta, meta):
+    temporal = os.path.join(ruta, 'meta.json.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, os.path.join(ruta, 'meta.json'))
+
+
+# Convertir un bloque de filas (Fecha, Producto, Región, Ventas) a columnas
+# tipadas, extendiendo las tablas de categorías con los valores nuevos
+def columnas_desde_filas(df, categorias):
+    fechas = pd.to_datetime(df['Fecha']).to_numpy(dtype='datetime64[D]')
+    dias = fechas.astype(np.int64)
+    calendario = pd.DatetimeIndex(fechas)
+
+    columnas = {
+        'Fecha': dias.astype(np.int32),
+        'Ventas': np.asarray(df['Ventas'], dtype=np.int32),
+        'Mes': calendario.month.to_numpy(dtype=np.int8),
+        'Año': calendario.year.to_numpy(dtype=np.int16),
+        'Trimestre': calendario.quarter.to_numpy(dtype=np.int8),
+        'Día_Semana': calendario.dayofweek.to_numpy(dtype=np.int8),
+    }
+    for dim in CATEGORICAS:
+        tabla = categorias.setdefault(dim, [])
+        valores, inverso = np.unique(np.asarray(df[dim], dtype=str), return_inverse=True)
+        for valor in valores:
+            if valor not in tabla:
+                tabla.append(str(valor))
+        posiciones = np.array([tabla.index(v) for v in valores], dtype=np.int16)
+        columnas[dim] = posiciones[inverso]
+    return columnas
+
+
+# Añadir columnas tipadas al final de los archivos binarios del almacén
+def escribir_columnas(ruta, columnas):
+    for nombre, (archivo, tipo) in COLUMNAS.items():
+        with open(os.path.join(ruta, archivo), 'ab') as f:
+            f.write(np.ascontiguousarray(columnas[nombre], dtype=tipo).tobytes())
+
+
+# Preparar un directorio temporal vacío donde escribir un almacén nuevo
+def iniciar_almacen(ruta):
+    temporal = ruta + '.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    for archivo, _ in COLUMNAS.values():
+        open(os.path.join(temporal, archivo), 'wb').close()
+    return temporal
+
+
+# Huella del contenido de un archivo (sha256), leída por bloques
+def hash_archivo(ruta, bytes_por_bloque=1 << 20):
+    huella = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(bytes_por_bloque), b''):
+            huella.update(bloque)
+    return huella.hexdigest()
+
+
+# Escribir meta.json y reemplazar el almacén anterior por el temporal
+def cerrar_almacen(temporal, ruta, filas, categorias, origen, mtime_origen, hash_origen=None):
+    _escribir_meta(temporal, {
+        'version_esquema': VERSION_ESQUEMA,
+        'filas': filas,
+        'columnas': {nombre: tipo for nombre, (_, tipo) in COLUMNAS.items()},
+        'categorias': categorias,
+        'dias_semana': ORDEN_DIA_SEMANA,
+        'origen': origen,
+        'mtime_origen': mtime_origen,
+        'hash_origen': hash_origen,
+        'version': time.time_ns(),
+    })
+    shutil.rmtree(ruta, ignore_errors=True)
+    os.rename(temporal, ruta)
+    return ruta
+
+
+# Convertir el CSV al almacén columnar leyendo por bloques (memoria acotada).
+# En la misma lectura se arma la muestra estratificada del modo aproximado.
+def ingerir_csv(ruta_csv, ruta=None, filas_por_bloque=FILAS_POR_BLOQUE):
+    import muestras  # muestras importa almacen
+    ruta = ruta or ruta_almacen(ruta_csv)
+    temporal = iniciar_almacen(ruta)
+
+    categorias = {}
+    filas = 0
+    muestra = muestras.vacia()
+    rng = np.random.default_rng(0)
+    for bloque in pd.read_csv(ruta_csv, chunksize=filas_por_bloque, encoding='utf-8'):
+        columnas = columnas_desde_filas(bloque, categorias)
+        escribir_columnas(temporal, columnas)
+        muestra = muestras.combinar(muestra, columnas, rng)
+        filas += len(bloque)
+
+    cerrar_almacen(temporal, ruta, filas, categorias,
+                   os.path.basename(ruta_csv), os.path.getmtime(ruta_csv), hash_archivo(ruta_csv))
+    muestras.guardar(muestra, ruta, _leer_meta(ruta))
+    return ruta
+
+
+# El almacén se reconstruye si no existe, si cambió el esquema o si el CSV
+# es más reciente que la última ingesta
+def necesita_ingesta(ruta_csv, ruta=None):
+    ruta = ruta or ruta_almacen(ruta_csv)
+    if not os.path.exists(os.path.join(ruta, 'meta.json')):
+        return True
+    if not os.path.exists(ruta_csv):
+        return False
+    meta = _leer_meta(ruta)
+    if meta.get('version_esquema') != VERSION_ESQUEMA:
+        return True
+    return os.path.getmtime(ruta_csv) > meta['mtime_origen']
+
+
+# Abrir las columnas del almacén como memmaps de solo lectura
+def abrir_columnas(ruta):
+    meta = _leer_meta(ruta)
+    filas = meta['filas']
+    columnas = {}
+    for nombre, (archivo, tipo) in COLUMNAS.items():
+        if filas == 0:
+            columnas[nombre] = np.zeros(0, dtype=tipo)
+        else:
+            columnas[nombre] = np.memmap(os.path.join(ruta, archivo), dtype=tipo, mode='r', shape=(filas,))
+    return columnas, meta
+
+
+# Armar el DataFrame de ventas a partir de las columnas en disco. Fecha
+# queda como los días desde 1970 guardados: pasarla a datetime64[ns]
+# costaría una columna nueva de 8 bytes por fila en cada carga; con_fechas()
+# la convierte solo en las filas que se materializan.
+def a_dataframe(columnas, meta):
+    datos = {
+        'Fecha': columnas['Fecha'],
+        'Producto': pd.Categorical.from_codes(columnas['Producto'], meta['categorias']['Producto']),
+        'Región': pd.Categorical.from_codes(columnas['Región'], meta['categorias']['Región']),
+        'Ventas': columnas['Ventas'],
+        'Mes': columnas['Mes'],
+        'Año': columnas['Año'],
+        'Trimestre': columnas['Trimestre'],
+        'Día_Semana': pd.Categorical.from_codes(columnas['Día_Semana'], meta['dias_semana'], ordered=True),
+    }
+    return pd.DataFrame(datos, copy=False)
+
+
+# Las mismas filas con Fecha como fecha (datetime64) en lugar de días
+def con_fechas(df):
+    return df.assign(Fecha=pd.to_datetime(np.asarray(df['Fecha']).astype('datetime64[D]')))
+
+
+# El CSV tiene fecha más nueva pero el mismo contenido que se ingirió (un
+# deploy o una copia): basta con anotar la fecha nueva, el almacén, su
+# versión y todo lo calculado a partir de él siguen valiendo
+def _mismo_origen(ruta_csv, ruta):
+    if not os.path.exists(os.path.join(ruta, 'meta.json')):
+        return False
+    meta = _leer_meta(ruta)
+    if meta.get('version_esquema') != VERSION_ESQUEMA or not meta.get('hash_origen'):
+        return False
+    if hash_archivo(ruta_csv) != meta['hash_origen']:
+        return False
+    meta['mtime_origen'] = os.path.getmtime(ruta_csv)
+    _escribir_meta(ruta, meta)
+    return True
+
+
+# Dejar el almacén al día respecto al CSV y devolver su versión actual.
+# Todas las sesiones lo llaman en cada rerun: una sola ingiere a la vez.
+def preparar(ruta_csv='ventas.csv'):
+    ruta = ruta_almacen(ruta_csv)
+    with _lock:
+        if necesita_ingesta(ruta_csv, ruta):
+            if not os.path.exists(ruta_csv):
+                raise FileNotFoundError(ruta_csv)
+            if not _mismo_origen(ruta_csv, ruta):
+                ingerir_csv(ruta_csv, ruta)
+        return _leer_meta(ruta)['version']
+
+
+# Recorrer el almacén en bloques de columnas leídas con np.fromfile. A
+# diferencia de los memmaps, cada bloque se libera al pasar al siguiente y
+# la memoria no crece con el tamaño del histórico.
+def bloques_columnas(ruta_csv='ventas.csv', filas_por_bloque=FILAS_POR_BLOQUE):
+    preparar(ruta_csv)
+    ruta = ruta_almacen(ruta_csv)
+    meta = _leer_meta(ruta)
+    for inicio in range(0, meta['filas'], filas_por_bloque):
+        cuantas = min(filas_por_bloque, meta['filas'] - inicio)
+        yield {
+            nombre: np.fromfile(os.path.join(ruta, archivo), dtype=tipo, count=cuantas,
+                                offset=inicio * np.dtype(tipo).itemsize)
+            for nombre, (archivo, tipo) in COLUMNAS.items()
+        }, meta
+
+
+# Lo mismo, como DataFrames con las etiquetas de las categorías
+def leer_bloques(ruta_csv='ventas.csv', filas_por_bloque=FILAS_POR_BLOQUE):
+    for columnas, meta in bloques_columnas(ruta_csv, filas_por_bloque):
+        yield a_dataframe(columnas, meta)
+
+
+# Punto de entrada para los scripts: ingesta automática si hace falta y
+# lectura del almacén mapeado en memoria
+def cargar_ventas(ruta_csv='ventas.csv'):
+    preparar(ruta_csv)
+    columnas, meta = abrir_columnas(ruta_almacen(ruta_csv))
+    return a_dataframe(columnas, meta)
+
+
+# Cubo de agregados persistido en el almacén. Si falta o quedó de otra
+# versión se reconstruye una vez desde las columnas y se guarda; con
+# procesos > 1 y suficientes filas, en paralelo sobre las particiones Año/Mes.
+def cargar_cubo(ruta_csv='ventas.csv', procesos=1):
+    version = preparar(ruta_csv)
+    ruta = ruta_almacen(ruta_csv)
+    archivo = os.path.join(ruta, ARCHIVO_CUBO)
+    if os.path.exists(archivo):
+        cubo_ventas, version_cubo = cubo.cargar(archivo)
+        if version_cubo == str(version):
+            return cubo_ventas
+    columnas, meta = abrir_columnas(ruta)
+    if procesos > 1 and meta['filas'] >= FILAS_MINIMAS_PARALELO:
+        import particiones  # particiones importa almacen
+        cubo_ventas = particiones.construir_cubo(ruta_csv, procesos)
+    else:
+        cubo_ventas = cubo.construir_cubo(a_dataframe(columnas, meta))
+    cubo.guardar(cubo_ventas, archivo, version)
+    return cubo_ventas
+
+
+# Revisar un lote antes de anexarlo: una fecha vacía o inválida, un
+# Producto o Región vacío, o Ventas vacía, con decimales o fuera de int32 se
+# guardarían mal en el almacén y en todo lo derivado de él, así que se
+# rechaza el lote entero indicando las filas
+def _validar_lote(lote):
+    fechas = pd.to_datetime(lote['Fecha'], errors='coerce')
+    ventas = pd.to_numeric(lote['Ventas'], errors='coerce')
+    limites = np.iinfo(np.int32)
+    problemas = {
+        'Fecha vacía o inválida': fechas.isna(),
+        'Producto vacío': lote['Producto'].isna() | (lote['Producto'].astype(str).str.strip() == ''),
+        'Región vacía': lote['Región'].isna() | (lote['Región'].astype(str).str.strip() == ''),
+        'Ventas vacía o no numérica': ventas.isna(),
+        'Ventas con decimales': ventas.notna() & (ventas != np.floor(ventas)),
+        'Ventas fuera del rango de int32': ventas.notna() & ((ventas < limites.min) | (ventas > limites.max)),
+    }
+    errores = []
+    for motivo, malas in problemas.items():
+        filas = lote.index[np.asarray(malas, dtype=bool)]
+        if len(filas):
+            resto = f" y {len(filas) - 10} más" if len(filas) > 10 else ''
+            errores.append(f"{motivo} en las filas {', '.join(map(str, filas[:10]))}{resto}")
+    if errores:
+        raise ValueError(f"Lote inválido, no se anexó nada: {'; '.join(errores)}")
+
+
+# Añadir un lote de ventas nuevas (Fecha, Producto, Región, Ventas) al
+# almacén y combinar sus agregados con el cubo guardado. Las estructuras
+# derivadas que estaban al día suman el lote y se guardan con la versión
+# nueva. El costo depende del tamaño del lote y del cubo, no del histórico.
+def anexar(lote, ruta_csv='ventas.csv'):
+    faltantes = [c for c in COLUMNAS_LOTE if c not in lote.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el lote: {', '.join(faltantes)}")
+    _validar_lote(lote)
+
+    # Estos módulos importan almacen
+    import bocetos
+    import indice_diario
+    import instantanea
+    import muestras
+    import particiones
+
+    # Con el lock tomado, una reingesta (preparar) u otro anexado del mismo
+    # proceso no puede intercalarse entre la lectura y la escritura de meta.json
+    with _lock:
+        historico = cargar_cubo(ruta_csv)
+        ruta = ruta_almacen(ruta_csv)
+        meta = _leer_meta(ruta)
+        filas = meta['filas']
+        version_anterior = meta['version']
+
+        # Descartar bytes de un anexado anterior que no llegó a registrarse en meta.json
+        for nombre, (archivo, tipo) in COLUMNAS.items():
+            os.truncate(os.path.join(ruta, archivo), filas * np.dtype(tipo).itemsize)
+
+        columnas = columnas_desde_filas(lote, meta['categorias'])
+        escribir_columnas(ruta, columnas)
+
+        meta['filas'] = filas + len(lote)
+        meta['version'] = time.time_ns()
+        delta = cubo.construir_cubo(a_dataframe(columnas, meta))
+        combinado = cubo.combinar(historico, delta)
+        cubo.guardar(combinado, os.path.join(ruta, ARCHIVO_CUBO), meta['version'])
+
+        derivados = {derivado: derivado.anexar(ruta_csv, columnas, meta, version_anterior)
+                     for derivado in (particiones, indice_diario, bocetos, muestras)}
+        instantanea.anexar(ruta_csv, combinado, version_anterior, derivados[indice_diario], derivados[bocetos],
+                           meta)
+
+        # La versión nueva se publica al final, con todo lo derivado ya
+        # extendido: quien la lea no encuentra nada viejo que reconstruir
+        _escribir_meta(ruta, meta)
+    return meta['version']
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Almacén columnar de ventas.")
+    parser.add_argument('csv', nargs='?', default='ventas.csv', help="CSV base del almacén")
+    parser.add_argument('--anexar', metavar='LOTE', help="CSV con ventas nuevas a añadir al almacén")
+    args = parser.parse_args()
+
+    if args.anexar:
+        lote = pd.read_csv(args.anexar, encoding='utf-8')
+        try:
+            anexar(lote, args.csv)
+        except ValueError as error:
+            parser.error(str(error))
+        print(f"Se anexaron {len(lote):,} registros a {ruta_almacen(args.csv)}")
+    else:
+        destino = ingerir_csv(args.csv)
+        print(f"Almacén columnar generado en: {destino}")
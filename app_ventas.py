@@ -4,6 +4,21 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import almacen
+import cache_consultas
+import exportacion
+import instantanea
+import instrumentacion
+import lenguaje_olap
+import muestras
+import presupuesto_render
+import servicio
+import tablas_arrow
+import vistas
+from motor_olap import MotorOLAP
 
 # Configuración de página
 st.set_page_config(
@@ -13,6 +28,25 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Diagnóstico (OLAP_DIAGNOSTICO=1): tiempos de este rerun
+instrumentacion.iniciar_rerun()
+
+# Solo se ejecuta la pestaña visible: conservar los valores de los widgets
+# de las demás pestañas para cuando se vuelva a ellas
+WIDGETS_PESTAÑAS = [
+    "slice_producto_individual", "slice_region_individual", "slice_detalle", "slice_pagina",
+    "slice_rango_fechas", "slice_ventana",
+    "dice_productos", "dice_regiones", "dice_trimestres",
+    "rollup_nivel", "rollup_dimension",
+    "drill_trimestre", "drill_mes",
+    "pivot_index", "pivot_columns", "export_formato",
+    "consulta_texto",
+]
+vistas.conservar_widgets(st.session_state, WIDGETS_PESTAÑAS)
+
+# Ventanas de la tendencia móvil del Slice (días)
+VENTANAS_MOVILES = [7, 30, 90]
+
 st.markdown("""
 <style>
     .main-header {
@@ -111,33 +145,133 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Funciones auxiliares
-@st.cache_data
-def load_data():
+def data_version():
+    # Versión del almacén: cambia al regenerarlo o al anexar ventas nuevas
     try:
-        df = pd.read_csv('ventas.csv', parse_dates=['Fecha'])
-        df['Mes'] = df['Fecha'].dt.month
-        df['Año'] = df['Fecha'].dt.year
-        df['Trimestre'] = df['Fecha'].dt.quarter
-        df['Día_Semana'] = df['Fecha'].dt.day_name()
-        return df
+        return almacen.preparar('ventas.csv')
     except FileNotFoundError:
-        st.error("Archivo 'ventas.csv' no encontrado. Por favor, asegúrate de que el archivo existe.")
         return None
 
-def create_kpi_metrics(df):
+@st.cache_resource
+def cargador():
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='carga_motor')
+
+def cargar_motor():
+    # Arranque en caliente: cubo, índices y vistas materializadas salen de
+    # la instantánea en disco (memory-mapping). Con OLAP_CALENTAR=1 además
+    # se calculan las vistas por defecto antes de responder y se muestrea el
+    # almacén si no tiene la muestra del modo aproximado; si el calentamiento
+    # materializó vistas que la instantánea no tenía, se vuelve a guardar
+    # para que el próximo arranque las abra ya calculadas.
+    motor = MotorOLAP.desde_almacen('ventas.csv', particionado=True, desde_instantanea=True)
+    if instantanea.CALENTAR:
+        previas = set(motor.reticulo.vistas)
+        instantanea.calentar(motor)
+        if set(motor.reticulo.vistas) != previas:
+            instantanea.guardar(motor, 'ventas.csv')
+        muestras.cargar_estimaciones('ventas.csv')
+    return motor
+
+@st.cache_resource(max_entries=2)
+def load_data(version):
+    # Motor OLAP sobre el cubo de agregados persistido: las pestañas le
+    # consultan a él en vez de recorrer las filas. Las filas de detalle
+    # se leen solo de las particiones Año/Mes que tocan los filtros.
+    # Se carga en un hilo (devuelve un Future) para que el modo aproximado
+    # pueda responder desde la muestra mientras tanto.
+    return cargador().submit(cargar_motor)
+
+def motor_exacto(futuro, version):
+    # Una carga fallida no queda en la caché: el próximo rerun la reintenta
+    try:
+        return futuro.result()
+    except Exception:
+        load_data.clear(version)
+        raise
+
+@st.cache_resource(max_entries=2)
+def load_muestra(version):
+    # Solo la muestra ya guardada (se arma al ingerir, al anexar o al
+    # calentar); si no hay, se espera al motor exacto
+    return muestras.MotorAproximado.desde_almacen('ventas.csv', construir=False)
+
+@st.fragment(run_every=1)
+def esperar_motor_exacto(futuro):
+    # Cuando termina la carga exacta se vuelve a ejecutar toda la página
+    if futuro.done():
+        st.rerun()
+    st.caption("Refinando al resultado exacto en segundo plano…")
+
+def mostrar_intervalo(totales, clave='suma_ic'):
+    # Solo en modo aproximado: semiancho del intervalo de confianza del 95%
+    if clave in totales:
+        st.caption(f"± ${totales[clave]:,.0f} (IC 95%)")
+
+def mostrar_grafico(nombre, fig):
+    # Incluye la serialización de la figura hacia el navegador
+    with instrumentacion.medir(f'render.{nombre}'):
+        st.plotly_chart(fig, use_container_width=True)
+
+def figura(nombre, entradas, construir):
+    # La figura se reconstruye solo si cambian sus entradas o los datos
+    def construir_medido():
+        with instrumentacion.medir(f'grafico.{nombre}'):
+            return construir()
+    return vistas.memo(st.session_state, nombre, (motor.version, entradas), construir_medido)
+
+def avisar_poda(info):
+    # Informa lo que el presupuesto de render dejó fuera del gráfico
+    aviso = presupuesto_render.describir(info)
+    if aviso:
+        st.caption(aviso)
+
+@st.fragment(run_every=1)
+def progreso_exportacion(trabajo):
+    # Se refresca solo este bloque cada segundo mientras se escribe el archivo
+    progreso, mensaje = trabajo.estado()
+    st.progress(progreso, text=mensaje)
+    if trabajo.terminado():
+        st.rerun()
+
+def mostrar_exportacion():
+    trabajo = st.session_state.get("exportacion")
+    if trabajo is None:
+        return
+    if not trabajo.terminado():
+        progreso_exportacion(trabajo)
+    elif trabajo.error is not None:
+        st.error(f"No se pudo exportar: {trabajo.error}")
+    elif trabajo.ruta is not None:
+        # El archivo se lee recién al pedir la descarga y se borra al servirla
+        st.download_button(
+            f"Descargar {trabajo.nombre_archivo()}",
+            data=trabajo.entregar,
+            file_name=trabajo.nombre_archivo(),
+            mime=exportacion.TIPOS_MIME[trabajo.formato],
+            on_click=olvidar_exportacion,
+            key="export_descarga"
+        )
+
+def olvidar_exportacion():
+    st.session_state["exportacion"] = None
+
+def create_kpi_metrics(motor):
     col1, col2, col3, col4 = st.columns(4)
+    totales = motor.totales()
     
     with col1:
-        total_ventas = df['Ventas'].sum()
+        total_ventas = totales['suma']
+        intervalo = f"<p>± ${totales['suma_ic']:,.0f} (IC 95%)</p>" if 'suma_ic' in totales else ""
         st.markdown(f"""
         <div class="metric-card">
             <h3>Ventas Totales</h3>
             <h2>${total_ventas:,.0f}</h2>
+            {intervalo}
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
-        total_productos = df['Producto'].nunique()
+        total_productos = len(motor.miembros('Producto'))
         st.markdown(f"""
         <div class="metric-card">
             <h3>Productos</h3>
@@ -146,7 +280,7 @@ def create_kpi_metrics(df):
         """, unsafe_allow_html=True)
     
     with col3:
-        total_regiones = df['Región'].nunique()
+        total_regiones = len(motor.miembros('Región'))
         st.markdown(f"""
         <div class="metric-card">
             <h3>Regiones</h3>
@@ -155,415 +289,687 @@ def create_kpi_metrics(df):
         """, unsafe_allow_html=True)
     
     with col4:
-        promedio_ventas = df['Ventas'].mean()
+        promedio_ventas = totales['promedio']
         st.markdown(f"""
         <div class="metric-card">
             <h3>Venta Promedio</h3>
             <h2>${promedio_ventas:.0f}</h2>
         </div>
         """, unsafe_allow_html=True)
+    
+    # Mediana y p95 desde los bocetos por celda, días desde el índice diario
+    # (solo con el motor exacto)
+    if aproximado:
+        return
+    col5, col6, col7, _ = st.columns(4)
+    cuantiles = motor.cuantiles()
+    precision = f"<p>± {motor.bocetos['precision']:.0%} (boceto)</p>"
+    
+    with col5:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Venta Mediana</h3>
+            <h2>${cuantiles[0.5]:,.0f}</h2>
+            {precision}
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col6:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Venta P95</h3>
+            <h2>${cuantiles[0.95]:,.0f}</h2>
+            {precision}
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col7:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>Días con Ventas</h3>
+            <h2>{motor.dias_con_ventas():,}</h2>
+        </div>
+        """, unsafe_allow_html=True)
 
 # Cargar datos
-df = load_data()
-if df is None:
+version_datos = data_version()
+if version_datos is None:
+    st.error("Archivo 'ventas.csv' no encontrado. Por favor, asegúrate de que el archivo existe.")
     st.stop()
+with instrumentacion.medir('carga.datos'):
+    futuro_motor = load_data(version_datos)
+    # Modo aproximado: mientras el motor exacto no está listo se responde
+    # desde la muestra estratificada
+    motor = None
+    if st.session_state.get("modo_aproximado", False) and not futuro_motor.done():
+        motor = load_muestra(version_datos)
+    if motor is None:
+        motor = motor_exacto(futuro_motor, version_datos)
+aproximado = isinstance(motor, muestras.MotorAproximado)
 
 # Header principal
 st.markdown('<h1 class="main-header">OLAP Analytics Dashboard</h1>', unsafe_allow_html=True)
 st.markdown("---")
 
 # KPIs principales
-create_kpi_metrics(df)
+create_kpi_metrics(motor)
 st.markdown("---")
 
 # Sidebar para controles con estilo más sobrio
 with st.sidebar:
     st.markdown("## Panel de Control")
     
+    st.toggle(
+        "Modo aproximado",
+        key="modo_aproximado",
+        help="Responde desde una muestra estratificada (Producto × Región × Mes) con intervalos de confianza "
+             "mientras se carga el motor exacto"
+    )
+    if aproximado:
+        st.info("Resultados estimados desde la muestra estratificada")
+        esperar_motor_exacto(futuro_motor)
+    
     # Filtros globales
     st.markdown("### Filtros Globales")
     
-    años_disponibles = sorted(df['Año'].unique())
+    años_disponibles = motor.miembros('Año')
     año_seleccionado = st.selectbox(
         "Año:", 
         años_disponibles, 
         index=len(años_disponibles)-1,
+        key="filtro_año",
         help="Selecciona el año para filtrar los datos"
     )
     
-    # Filtrar datos por año
-    df_filtrado = df[df['Año'] == año_seleccionado]
+    # Filtro por año sobre el cubo (las filas solo se leen en las tablas de detalle)
+    filtro_año = {'Año': [año_seleccionado]}
+    totales_año = motor.totales(filtro_año)
     
     # Información del dataset filtrado con estilo más sobrio
     st.markdown("### Información del Dataset")
     st.markdown(f"""
-    **Registros totales:** {len(df_filtrado):,}  
+    **Registros totales:** {totales_año['conteo']:,}  
     **Periodo:** {año_seleccionado}  
     **Última actualización:** Hoy
     """)
 
 # Layout principal con pestañas
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
+# (on_change="rerun": solo la pestaña abierta ejecuta su contenido)
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
     "Slice Analysis", 
     "Dice Operations", 
     "Roll-up Analysis", 
     "Drill-down Explorer", 
-    "Pivot Tables"
-])
+    "Pivot Tables",
+    "Query Console"
+], key="pestaña_activa", on_change="rerun")
 
 # TAB 1: SLICE ANALYSIS MEJORADO
 with tab1:
-    st.markdown('<div class="section-header">Slice Analysis</div>', unsafe_allow_html=True)
-    st.markdown('<span class="operation-badge">SLICE</span>Análisis detallado por múltiples dimensiones', unsafe_allow_html=True)
-    
-    # Filtros separados para Producto y Región
-    col_filtros1, col_filtros2 = st.columns(2)
-    
-    with col_filtros1:
-        st.markdown("#### Filtro por Producto:")
-        productos_disponibles = ["Todos"] + sorted(df_filtrado['Producto'].unique())
-        producto_seleccionado = st.selectbox(
-            "Selecciona un producto:",
-            productos_disponibles,
-            key="slice_producto_individual",
-            help="Filtra los datos por un producto específico"
-        )
-    
-    with col_filtros2:
-        st.markdown("#### Filtro por Región:")
-        regiones_disponibles = ["Todas"] + sorted(df_filtrado['Región'].unique())
-        region_seleccionada = st.selectbox(
-            "Selecciona una región:",
-            regiones_disponibles,
-            key="slice_region_individual",
-            help="Filtra los datos por una región específica"
-        )
-    
-    # Aplicar filtros
-    df_slice = df_filtrado.copy()
-    filtros_aplicados = []
-    
-    if producto_seleccionado != "Todos":
-        df_slice = df_slice[df_slice['Producto'] == producto_seleccionado]
-        filtros_aplicados.append(f"Producto: {producto_seleccionado}")
-    
-    if region_seleccionada != "Todas":
-        df_slice = df_slice[df_slice['Región'] == region_seleccionada]
-        filtros_aplicados.append(f"Región: {region_seleccionada}")
-    
-    # Mostrar filtros aplicados
-    if filtros_aplicados:
-        st.info(f"Filtros aplicados: {' | '.join(filtros_aplicados)}")
-    else:
-        st.info("Mostrando todos los datos (sin filtros aplicados)")
-    
-    # Layout de métricas y visualización
-    col1, col2 = st.columns([1, 2])
-    
-    with col1:
-        st.markdown("#### Métricas del Slice:")
-        st.metric("Total Ventas", f"${df_slice['Ventas'].sum():,.0f}")
-        st.metric("Registros", f"{len(df_slice):,}")
-        if len(df_slice) > 0:
-            st.metric("Venta Promedio", f"${df_slice['Ventas'].mean():.0f}")
+    if tab1.open:
+        st.markdown('<div class="section-header">Slice Analysis</div>', unsafe_allow_html=True)
+        st.markdown('<span class="operation-badge">SLICE</span>Análisis detallado por múltiples dimensiones', unsafe_allow_html=True)
+        
+        # Filtros separados para Producto y Región
+        col_filtros1, col_filtros2 = st.columns(2)
+        
+        with col_filtros1:
+            st.markdown("#### Filtro por Producto:")
+            productos_disponibles = ["Todos"] + motor.miembros('Producto', filtro_año)
+            producto_seleccionado = st.selectbox(
+                "Selecciona un producto:",
+                productos_disponibles,
+                key="slice_producto_individual",
+                help="Filtra los datos por un producto específico"
+            )
+        
+        with col_filtros2:
+            st.markdown("#### Filtro por Región:")
+            regiones_disponibles = ["Todas"] + motor.miembros('Región', filtro_año)
+            region_seleccionada = st.selectbox(
+                "Selecciona una región:",
+                regiones_disponibles,
+                key="slice_region_individual",
+                help="Filtra los datos por una región específica"
+            )
+        
+        # Aplicar filtros
+        filtros_slice = dict(filtro_año)
+        filtros_aplicados = []
+        
+        if producto_seleccionado != "Todos":
+            filtros_slice['Producto'] = [producto_seleccionado]
+            filtros_aplicados.append(f"Producto: {producto_seleccionado}")
+        
+        if region_seleccionada != "Todas":
+            filtros_slice['Región'] = [region_seleccionada]
+            filtros_aplicados.append(f"Región: {region_seleccionada}")
+        
+        totales_slice = motor.totales(filtros_slice)
+        
+        # Mostrar filtros aplicados
+        if filtros_aplicados:
+            st.info(f"Filtros aplicados: {' | '.join(filtros_aplicados)}")
         else:
-            st.metric("Venta Promedio", "$0")
-    
-    with col2:
-        if len(df_slice) > 0:
-            # Visualización temporal
-            ventas_temporales = df_slice.groupby('Mes')['Ventas'].sum().reset_index()
+            st.info("Mostrando todos los datos (sin filtros aplicados)")
+        
+        # Layout de métricas y visualización
+        col1, col2 = st.columns([1, 2])
+        
+        with col1:
+            st.markdown("#### Métricas del Slice:")
+            st.metric("Total Ventas", f"${totales_slice['suma']:,.0f}")
+            mostrar_intervalo(totales_slice)
+            st.metric("Registros", f"{totales_slice['conteo']:,}")
+            if totales_slice['conteo'] > 0:
+                st.metric("Venta Promedio", f"${totales_slice['promedio']:.0f}")
+                mostrar_intervalo(totales_slice, 'promedio_ic')
+            else:
+                st.metric("Venta Promedio", "$0")
+            if not aproximado and totales_slice['conteo'] > 0:
+                cuantiles_slice = motor.cuantiles(filtros_slice)
+                st.metric("Venta Mediana", f"${cuantiles_slice[0.5]:,.0f}")
+                st.metric("Venta P95", f"${cuantiles_slice[0.95]:,.0f}")
+                st.caption(f"Mediana y P95 estimadas con error relativo menor a {motor.bocetos['precision']:.0%}")
+                st.metric("Días con Ventas", f"{motor.dias_con_ventas(filtros_slice):,}")
+        
+        with col2:
+            if totales_slice['conteo'] > 0:
+                # Visualización temporal
+                ventas_temporales = motor.rollup(['Mes'], filtros_slice)
+                
+                if len(ventas_temporales) > 0:
+                    serie_slice, poda_slice = presupuesto_render.reducir_puntos(ventas_temporales, 'Mes', 'Ventas')
+                    fig_slice = figura('slice_linea', filtros_slice, lambda: px.line(
+                        serie_slice, 
+                        x='Mes', 
+                        y='Ventas',
+                        title=f'Evolución temporal - Filtros: {", ".join(filtros_aplicados) if filtros_aplicados else "Sin filtros"}',
+                        markers=True
+                    ).update_layout(
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(size=12)
+                    ))
+                    mostrar_grafico('slice_linea', fig_slice)
+                    avisar_poda(poda_slice)
+                else:
+                    st.warning("No hay datos suficientes para mostrar la evolución temporal")
+            else:
+                st.warning("No hay datos que coincidan con los filtros seleccionados")
+        
+        # Rango de fechas libre y tendencia móvil (índice diario de sumas
+        # acumuladas: cada total es una resta, sin recorrer las filas)
+        st.markdown("#### Rango de fechas y tendencia móvil")
+        if aproximado:
+            st.write("El análisis por rango de fechas se habilita al terminar la carga exacta")
+        else:
+            primer_dia, ultimo_dia = motor.rango_fechas()
+            # El rango reemplaza al filtro de año; Producto y Región se mantienen
+            filtros_rango = {dim: valores for dim, valores in filtros_slice.items() if dim != 'Año'}
+            rango_guardado = st.session_state.get("slice_rango_fechas")
+            if not rango_guardado or any(not primer_dia <= dia <= ultimo_dia for dia in rango_guardado):
+                st.session_state["slice_rango_fechas"] = (max(primer_dia, ultimo_dia - timedelta(days=89)), ultimo_dia)
             
-            if len(ventas_temporales) > 0:
-                fig_slice = px.line(
-                    ventas_temporales, 
-                    x='Mes', 
-                    y='Ventas',
-                    title=f'Evolución temporal - Filtros: {", ".join(filtros_aplicados) if filtros_aplicados else "Sin filtros"}',
-                    markers=True
+            col_rango1, col_rango2 = st.columns([1, 2])
+            with col_rango1:
+                rango_fechas = st.date_input(
+                    "Fechas:",
+                    min_value=primer_dia,
+                    max_value=ultimo_dia,
+                    key="slice_rango_fechas",
+                    help="Total del período y variación contra el mismo período del año anterior"
                 )
-                fig_slice.update_layout(
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font=dict(size=12)
+                ventana_movil = st.selectbox(
+                    "Ventana móvil (días):",
+                    VENTANAS_MOVILES,
+                    key="slice_ventana"
                 )
-                st.plotly_chart(fig_slice, use_container_width=True)
+                if len(rango_fechas) == 2:
+                    desde_rango, hasta_rango = rango_fechas
+                    comparacion = motor.interanual(desde_rango, hasta_rango, filtros_rango)
+                    variacion = comparacion['variacion']
+                    st.metric(
+                        "Ventas del rango",
+                        f"${comparacion['actual']['suma']:,.0f}",
+                        delta=f"{variacion:+.1%} vs. año anterior" if variacion is not None else None
+                    )
+                    st.metric("Registros del rango", f"{comparacion['actual']['conteo']:,}")
+                else:
+                    st.info("Elegí la fecha final del rango")
+            
+            with col_rango2:
+                if len(rango_fechas) == 2:
+                    serie_movil = motor.movil(ventana_movil, desde_rango, hasta_rango, filtros_rango)
+                    serie_movil, poda_movil = presupuesto_render.reducir_puntos(serie_movil, 'Fecha', 'Ventas')
+                    fig_movil = figura('slice_movil', (filtros_rango, desde_rango, hasta_rango, ventana_movil), lambda: px.line(
+                        serie_movil,
+                        x='Fecha',
+                        y=['Ventas', 'Año anterior'],
+                        title=f'Ventas móviles de {ventana_movil} días',
+                        labels={'value': 'Ventas', 'variable': ''}
+                    ).update_layout(
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(size=12)
+                    ))
+                    mostrar_grafico('slice_movil', fig_movil)
+                    avisar_poda(poda_movil)
+        
+        # Tabla detallada (colapsible)
+        with st.expander("Ver datos detallados del slice"):
+            if aproximado:
+                st.write("Los registros se muestran al terminar la carga exacta")
+            elif totales_slice['conteo'] > 0:
+                # Las filas solo se materializan si se pide la tabla, y solo
+                # las de la página visible
+                if st.toggle("Cargar registros", key="slice_detalle"):
+                    total_filas = totales_slice['conteo']
+                    paginas, _, _ = presupuesto_render.pagina(total_filas, 1)
+                    # Si el slice cambió y tiene menos páginas, volver a la última
+                    if st.session_state.get("slice_pagina", 1) > paginas:
+                        st.session_state["slice_pagina"] = paginas
+                    numero_pagina = st.number_input(
+                        f"Página (de {paginas:,}):",
+                        min_value=1,
+                        max_value=paginas,
+                        key="slice_pagina"
+                    )
+                    _, desde, hasta = presupuesto_render.pagina(total_filas, numero_pagina)
+                    # Con pyarrow la página llega como tabla Arrow armada
+                    # sobre las columnas del almacén, sin pasar por pandas
+                    df_slice = motor.registros(filtros_slice, desde, hasta,
+                                               'arrow' if tablas_arrow.DISPONIBLE else 'pandas')
+                    st.caption(f"Mostrando filas {desde + 1:,}–{hasta:,} de {total_filas:,}")
+                    st.dataframe(df_slice, use_container_width=True)
             else:
-                st.warning("No hay datos suficientes para mostrar la evolución temporal")
-        else:
-            st.warning("No hay datos que coincidan con los filtros seleccionados")
-    
-    # Tabla detallada (colapsible)
-    with st.expander("Ver datos detallados del slice"):
-        if len(df_slice) > 0:
-            st.dataframe(df_slice, use_container_width=True)
-        else:
-            st.write("No hay datos para mostrar")
+                st.write("No hay datos para mostrar")
 
 # TAB 2: DICE OPERATIONS
 with tab2:
-    st.markdown('<div class="section-header">Dice Operations</div>', unsafe_allow_html=True)
-    st.markdown('<span class="operation-badge">DICE</span>Análisis con filtros múltiples simultáneos', unsafe_allow_html=True)
-    
-    col1, col2 = st.columns([1, 2])
-    
-    with col1:
-        st.markdown("#### Filtros Múltiples:")
-        productos_dice = st.multiselect(
-            "Productos:", 
-            sorted(df_filtrado['Producto'].unique()), 
-            default=list(df_filtrado['Producto'].unique())[:3],
-            key="dice_productos",
-            help="Selecciona múltiples productos para el análisis"
-        )
+    if tab2.open:
+        st.markdown('<div class="section-header">Dice Operations</div>', unsafe_allow_html=True)
+        st.markdown('<span class="operation-badge">DICE</span>Análisis con filtros múltiples simultáneos', unsafe_allow_html=True)
         
-        regiones_dice = st.multiselect(
-            "Regiones:", 
-            sorted(df_filtrado['Región'].unique()), 
-            default=list(df_filtrado['Región'].unique())[:2],
-            key="dice_regiones",
-            help="Selecciona múltiples regiones para el análisis"
-        )
+        col1, col2 = st.columns([1, 2])
         
-        # Filtro adicional por trimestre
-        trimestres_dice = st.multiselect(
-            "Trimestres:",
-            sorted(df_filtrado['Trimestre'].unique()),
-            default=sorted(df_filtrado['Trimestre'].unique()),
-            key="dice_trimestres",
-            help="Selecciona los trimestres a analizar"
-        )
-    
-    with col2:
-        if productos_dice and regiones_dice and trimestres_dice:
-            df_dice = df_filtrado[
-                (df_filtrado['Producto'].isin(productos_dice)) & 
-                (df_filtrado['Región'].isin(regiones_dice)) &
-                (df_filtrado['Trimestre'].isin(trimestres_dice))
-            ]
+        with col1:
+            st.markdown("#### Filtros Múltiples:")
+            productos_año = motor.miembros('Producto', filtro_año)
+            productos_dice = st.multiselect(
+                "Productos:", 
+                productos_año, 
+                default=productos_año[:3],
+                key="dice_productos",
+                help="Selecciona múltiples productos para el análisis"
+            )
             
-            if len(df_dice) > 0:
-                # Heatmap de correlaciones
-                pivot_dice = df_dice.pivot_table(
-                    values='Ventas', 
-                    index='Región', 
-                    columns='Producto', 
-                    aggfunc='sum', 
-                    fill_value=0
-                )
-                
-                fig_dice = px.imshow(
-                    pivot_dice.values,
-                    x=pivot_dice.columns,
-                    y=pivot_dice.index,
-                    color_continuous_scale='RdYlBu_r',
-                    title="Heatmap: Ventas por Región y Producto"
+            regiones_año = motor.miembros('Región', filtro_año)
+            regiones_dice = st.multiselect(
+                "Regiones:", 
+                regiones_año, 
+                default=regiones_año[:2],
+                key="dice_regiones",
+                help="Selecciona múltiples regiones para el análisis"
+            )
+            
+            # Filtro adicional por trimestre
+            trimestres_año = motor.miembros('Trimestre', filtro_año)
+            trimestres_dice = st.multiselect(
+                "Trimestres:",
+                trimestres_año,
+                default=trimestres_año,
+                key="dice_trimestres",
+                help="Selecciona los trimestres a analizar"
+            )
+        
+        with col2:
+            if productos_dice and regiones_dice and trimestres_dice:
+                filtros_dice = dict(
+                    filtro_año,
+                    Producto=productos_dice,
+                    Región=regiones_dice,
+                    Trimestre=trimestres_dice
                 )
-                fig_dice.update_layout(height=400)
-                st.plotly_chart(fig_dice, use_container_width=True)
+                totales_dice = motor.dice(filtros_dice)
                 
-                # Métricas del dice
-                col_m1, col_m2, col_m3 = st.columns(3)
-                with col_m1:
-                    st.metric("Total Filtrado", f"${df_dice['Ventas'].sum():,.0f}")
-                with col_m2:
-                    st.metric("Registros", f"{len(df_dice):,}")
-                with col_m3:
-                    porcentaje = (len(df_dice) / len(df_filtrado)) * 100
-                    st.metric("% del Total", f"{porcentaje:.1f}%")
+                if totales_dice['conteo'] > 0:
+                    # Heatmap de correlaciones
+                    pivot_dice = motor.pivot('Región', 'Producto', filtros_dice)
+                    matriz_dice, poda_dice = presupuesto_render.limitar_matriz(pivot_dice)
+                    
+                    fig_dice = figura('dice_heatmap', filtros_dice, lambda: px.imshow(
+                        matriz_dice.values,
+                        x=matriz_dice.columns,
+                        y=matriz_dice.index,
+                        color_continuous_scale='RdYlBu_r',
+                        title="Heatmap: Ventas por Región y Producto"
+                    ).update_layout(height=400))
+                    mostrar_grafico('dice_heatmap', fig_dice)
+                    avisar_poda(poda_dice)
+                    
+                    # Métricas del dice
+                    col_m1, col_m2, col_m3 = st.columns(3)
+                    with col_m1:
+                        st.metric("Total Filtrado", f"${totales_dice['suma']:,.0f}")
+                        mostrar_intervalo(totales_dice)
+                    with col_m2:
+                        st.metric("Registros", f"{totales_dice['conteo']:,}")
+                    with col_m3:
+                        porcentaje = (totales_dice['conteo'] / totales_año['conteo']) * 100
+                        st.metric("% del Total", f"{porcentaje:.1f}%")
+                else:
+                    st.warning("No hay datos que coincidan con los filtros seleccionados")
             else:
-                st.warning("No hay datos que coincidan con los filtros seleccionados")
-        else:
-            st.info("Selecciona al menos un elemento en cada filtro para ver el análisis")
+                st.info("Selecciona al menos un elemento en cada filtro para ver el análisis")
 
 # TAB 3: ROLL-UP ANALYSIS
 with tab3:
-    st.markdown('<div class="section-header">Roll-up Analysis</div>', unsafe_allow_html=True)
-    st.markdown('<span class="operation-badge">ROLL-UP</span>Agregación hacia niveles más generales', unsafe_allow_html=True)
-    
-    col1, col2 = st.columns([1, 2])
-    
-    with col1:
-        st.markdown("#### Nivel de agregación:")
-        nivel_rollup = st.selectbox(
-            "Selecciona nivel:", 
-            ["Año", "Trimestre", "Mes"],
-            key="rollup_nivel",
-            help="Nivel de agregación temporal"
-        )
+    if tab3.open:
+        st.markdown('<div class="section-header">Roll-up Analysis</div>', unsafe_allow_html=True)
+        st.markdown('<span class="operation-badge">ROLL-UP</span>Agregación hacia niveles más generales', unsafe_allow_html=True)
         
-        dimension_rollup = st.selectbox(
-            "Dimensión adicional:",
-            ["Producto", "Región", "Ninguna"],
-            key="rollup_dimension",
-            help="Dimensión adicional para el análisis"
-        )
-    
-    with col2:
-        if dimension_rollup == "Ninguna":
-            rollup_data = df_filtrado.groupby(nivel_rollup)['Ventas'].sum().reset_index()
-            fig_rollup = px.bar(
-                rollup_data, 
-                x=nivel_rollup, 
-                y='Ventas',
-                title=f"Roll-up: Ventas por {nivel_rollup}",
-                color='Ventas',
-                color_continuous_scale='viridis'
+        col1, col2 = st.columns([1, 2])
+        
+        with col1:
+            st.markdown("#### Nivel de agregación:")
+            nivel_rollup = st.selectbox(
+                "Selecciona nivel:", 
+                ["Año", "Trimestre", "Mes"],
+                key="rollup_nivel",
+                help="Nivel de agregación temporal"
             )
-        else:
-            rollup_data = df_filtrado.groupby([nivel_rollup, dimension_rollup])['Ventas'].sum().reset_index()
-            fig_rollup = px.bar(
-                rollup_data, 
-                x=nivel_rollup, 
-                y='Ventas',
-                color=dimension_rollup,
-                title=f"Roll-up: Ventas por {nivel_rollup} y {dimension_rollup}",
-                barmode='group'
+            
+            dimension_rollup = st.selectbox(
+                "Dimensión adicional:",
+                ["Producto", "Región", "Ninguna"],
+                key="rollup_dimension",
+                help="Dimensión adicional para el análisis"
             )
         
-        fig_rollup.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
-        st.plotly_chart(fig_rollup, use_container_width=True)
-        
-        # Mostrar top performers
-        st.markdown("#### Top Performers")
-        if dimension_rollup != "Ninguna":
-            top_data = rollup_data.nlargest(5, 'Ventas')
-            for i, row in top_data.iterrows():
-                st.write(f"**{row[nivel_rollup]} - {row[dimension_rollup]}:** ${row['Ventas']:,.0f}")
+        with col2:
+            if dimension_rollup == "Ninguna":
+                rollup_data = motor.rollup([nivel_rollup], filtro_año)
+                poda_rollup = {}
+                fig_rollup = figura('rollup_barras', (filtro_año, nivel_rollup, dimension_rollup), lambda: px.bar(
+                    rollup_data, 
+                    x=nivel_rollup, 
+                    y='Ventas',
+                    title=f"Roll-up: Ventas por {nivel_rollup}",
+                    error_y='IC 95%' if aproximado else None,
+                    color='Ventas',
+                    color_continuous_scale='viridis'
+                ).update_layout(
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    paper_bgcolor='rgba(0,0,0,0)'
+                ))
+            else:
+                rollup_data = motor.rollup([nivel_rollup, dimension_rollup], filtro_año)
+                barras_rollup, poda_rollup = presupuesto_render.limitar_categorias(
+                    rollup_data, dimension_rollup, 'Ventas', otras_dims=[nivel_rollup]
+                )
+                fig_rollup = figura('rollup_barras', (filtro_año, nivel_rollup, dimension_rollup), lambda: px.bar(
+                    barras_rollup, 
+                    x=nivel_rollup, 
+                    y='Ventas',
+                    color=dimension_rollup,
+                    title=f"Roll-up: Ventas por {nivel_rollup} y {dimension_rollup}",
+                    barmode='group'
+                ).update_layout(
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    paper_bgcolor='rgba(0,0,0,0)'
+                ))
+            
+            mostrar_grafico('rollup_barras', fig_rollup)
+            avisar_poda(poda_rollup)
+            
+            # Mostrar top performers
+            st.markdown("#### Top Performers")
+            if dimension_rollup != "Ninguna":
+                top_data = rollup_data.nlargest(5, 'Ventas')
+                for i, row in top_data.iterrows():
+                    st.write(f"**{row[nivel_rollup]} - {row[dimension_rollup]}:** ${row['Ventas']:,.0f}")
 
 # TAB 4: DRILL-DOWN EXPLORER
 with tab4:
-    st.markdown('<div class="section-header">Drill-down Explorer</div>', unsafe_allow_html=True)
-    st.markdown('<span class="operation-badge">DRILL-DOWN</span>Navegación desde general hacia específico', unsafe_allow_html=True)
-    
-    # Drill-down interactivo
-    drill_data = df_filtrado.groupby(['Año', 'Trimestre', 'Mes', 'Producto', 'Región'])['Ventas'].sum().reset_index()
-    
-    # Sunburst chart para drill-down
-    fig_drill = px.sunburst(
-        drill_data, 
-        path=['Trimestre', 'Mes', 'Región', 'Producto'], 
-        values='Ventas',
-        title="Explorador Jerárquico - Click para hacer drill-down",
-        height=600
-    )
-    fig_drill.update_layout(
-        font_size=10,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)'
-    )
-    st.plotly_chart(fig_drill, use_container_width=True)
-    
-    # Drill-down por niveles
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("#### Drill-down por Niveles")
-        # Nivel 1: Trimestre
-        trimestre_drill = st.selectbox(
-            "1. Trimestre:", 
-            sorted(df_filtrado['Trimestre'].unique()), 
-            key="drill_trimestre",
-            help="Primer nivel de drill-down"
-        )
-        df_nivel1 = df_filtrado[df_filtrado['Trimestre'] == trimestre_drill]
+    if tab4.open:
+        st.markdown('<div class="section-header">Drill-down Explorer</div>', unsafe_allow_html=True)
+        st.markdown('<span class="operation-badge">DRILL-DOWN</span>Navegación desde general hacia específico', unsafe_allow_html=True)
         
-        # Nivel 2: Mes
-        meses_disponibles = sorted(df_nivel1['Mes'].unique())
-        mes_drill = st.selectbox(
-            "2. Mes:", 
-            meses_disponibles, 
-            key="drill_mes",
-            help="Segundo nivel de drill-down"
+        # Drill-down interactivo
+        drill_data = motor.drilldown(['Año', 'Trimestre', 'Mes', 'Producto', 'Región'], filtro_año)
+        hojas_drill, poda_drill = presupuesto_render.limitar_hojas(
+            drill_data, ['Trimestre', 'Mes', 'Región', 'Producto'], 'Ventas'
         )
-        df_nivel2 = df_nivel1[df_nivel1['Mes'] == mes_drill]
-    
-    with col2:
-        # Visualización del drill-down
-        if len(df_nivel2) > 0:
-            ventas_drill = df_nivel2.groupby(['Región', 'Producto'])['Ventas'].sum().reset_index()
-            
-            fig_drill_bar = px.treemap(
-                ventas_drill,
-                path=['Región', 'Producto'],
-                values='Ventas',
-                title=f"Drill-down: T{trimestre_drill} - Mes {mes_drill}"
+        
+        # Sunburst chart para drill-down
+        fig_drill = figura('drill_sunburst', filtro_año, lambda: px.sunburst(
+            hojas_drill, 
+            path=poda_drill['ruta'], 
+            values='Ventas',
+            title="Explorador Jerárquico - Click para hacer drill-down",
+            height=600
+        ).update_layout(
+            font_size=10,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)'
+        ))
+        mostrar_grafico('drill_sunburst', fig_drill)
+        avisar_poda(poda_drill)
+        
+        # Drill-down por niveles
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("#### Drill-down por Niveles")
+            # Nivel 1: Trimestre
+            trimestre_drill = st.selectbox(
+                "1. Trimestre:", 
+                motor.miembros('Trimestre', filtro_año), 
+                key="drill_trimestre",
+                help="Primer nivel de drill-down"
             )
-            st.plotly_chart(fig_drill_bar, use_container_width=True)
+            filtros_nivel1 = dict(filtro_año, Trimestre=[trimestre_drill])
             
-            # Métricas del nivel actual
-            st.metric("Ventas del Periodo", f"${df_nivel2['Ventas'].sum():,.0f}")
+            # Nivel 2: Mes
+            meses_disponibles = motor.miembros('Mes', filtros_nivel1)
+            mes_drill = st.selectbox(
+                "2. Mes:", 
+                meses_disponibles, 
+                key="drill_mes",
+                help="Segundo nivel de drill-down"
+            )
+            filtros_nivel2 = dict(filtros_nivel1, Mes=[mes_drill])
+            totales_nivel2 = motor.totales(filtros_nivel2)
+        
+        with col2:
+            # Visualización del drill-down
+            if totales_nivel2['conteo'] > 0:
+                ventas_drill = motor.drilldown(['Región', 'Producto'], filtros_nivel2)
+                hojas_treemap, poda_treemap = presupuesto_render.limitar_hojas(
+                    ventas_drill, ['Región', 'Producto'], 'Ventas'
+                )
+                
+                fig_drill_bar = figura('drill_treemap', filtros_nivel2, lambda: px.treemap(
+                    hojas_treemap,
+                    path=poda_treemap['ruta'],
+                    values='Ventas',
+                    title=f"Drill-down: T{trimestre_drill} - Mes {mes_drill}"
+                ))
+                mostrar_grafico('drill_treemap', fig_drill_bar)
+                avisar_poda(poda_treemap)
+                
+                # Métricas del nivel actual
+                st.metric("Ventas del Periodo", f"${totales_nivel2['suma']:,.0f}")
+                mostrar_intervalo(totales_nivel2)
 
 # TAB 5: PIVOT TABLES
 with tab5:
-    st.markdown('<div class="section-header">Pivot Tables</div>', unsafe_allow_html=True)
-    st.markdown('<span class="operation-badge">PIVOT</span>Tablas dinámicas y matrices de correlación', unsafe_allow_html=True)
-    
-    col1, col2 = st.columns([1, 2])
-    
-    with col1:
-        st.markdown("#### Configuración de Pivot:")
+    if tab5.open:
+        st.markdown('<div class="section-header">Pivot Tables</div>', unsafe_allow_html=True)
+        st.markdown('<span class="operation-badge">PIVOT</span>Tablas dinámicas y matrices de correlación', unsafe_allow_html=True)
         
-        indice_pivot = st.selectbox(
-            "Índice (filas):", 
-            ["Región", "Producto", "Mes", "Trimestre"], 
-            key="pivot_index",
-            help="Selecciona la dimensión para las filas"
-        )
-        columna_pivot = st.selectbox(
-            "Columnas:", 
-            ["Producto", "Región", "Mes", "Trimestre"], 
-            key="pivot_columns",
-            help="Selecciona la dimensión para las columnas"
-        )
+        col1, col2 = st.columns([1, 2])
         
-        if indice_pivot == columna_pivot:
-            st.warning("El índice y las columnas no pueden ser iguales")
-        else:
-            # Crear pivot table
-            pivot_table = df_filtrado.pivot_table(
-                values='Ventas', 
-                index=indice_pivot, 
-                columns=columna_pivot, 
-                aggfunc='sum', 
-                fill_value=0
-            )
+        with col1:
+            st.markdown("#### Configuración de Pivot:")
             
-            # Botón de exportación
-            if st.button("Exportar a Excel", key="export_pivot"):
-                pivot_table.to_excel('cubo_para_powerbi.xlsx')
-                st.success("Archivo 'cubo_para_powerbi.xlsx' exportado correctamente!")
-    
-    with col2:
-        if indice_pivot != columna_pivot:
-            # Mostrar pivot table como heatmap
-            fig_pivot = px.imshow(
-                pivot_table.values,
-                x=pivot_table.columns,
-                y=pivot_table.index,
-                color_continuous_scale='Viridis',
-                title=f"Matriz: {indice_pivot} vs {columna_pivot}",
-                aspect="auto"
+            indice_pivot = st.selectbox(
+                "Índice (filas):", 
+                ["Región", "Producto", "Mes", "Trimestre"], 
+                key="pivot_index",
+                help="Selecciona la dimensión para las filas"
+            )
+            columna_pivot = st.selectbox(
+                "Columnas:", 
+                ["Producto", "Región", "Mes", "Trimestre"], 
+                key="pivot_columns",
+                help="Selecciona la dimensión para las columnas"
             )
-            fig_pivot.update_layout(height=500)
-            st.plotly_chart(fig_pivot, use_container_width=True)
-            
-            # Mostrar tabla numérica
-            with st.expander("Ver tabla numérica"):
-                st.dataframe(pivot_table, use_container_width=True)
             
-            # Estadísticas de la tabla pivot
-            st.markdown("#### Estadísticas:")
-            col_s1, col_s2, col_s3 = st.columns(3)
-            with col_s1:
-                st.metric("Máximo", f"${pivot_table.values.max():,.0f}")
-            with col_s2:
-                st.metric("Promedio", f"${pivot_table.values.mean():,.0f}")
-            with col_s3:
-                st.metric("Mínimo", f"${pivot_table.values.min():,.0f}")
+            if indice_pivot == columna_pivot:
+                st.warning("El índice y las columnas no pueden ser iguales")
+            else:
+                # Crear pivot table
+                pivot_table = motor.pivot(indice_pivot, columna_pivot, filtro_año)
+                
+                # Exportación para Power BI en segundo plano: cubo, roll-ups,
+                # drill-down y el pivot elegido, del año, descargables al terminar
+                formatos_export = exportacion.formatos_disponibles()
+                formato_export = st.selectbox(
+                    "Formato de exportación:",
+                    list(formatos_export),
+                    format_func=formatos_export.get,
+                    key="export_formato"
+                )
+                if st.button("Exportar para Power BI", key="export_pivot", disabled=aproximado,
+                             help="Disponible con los datos exactos" if aproximado else None):
+                    anterior = st.session_state.get("exportacion")
+                    if anterior is not None:
+                        anterior.descartar()
+                    st.session_state["exportacion"] = exportacion.iniciar(
+                        motor.cubo, filtro_año, formato_export, pivot=(indice_pivot, columna_pivot)
+                    )
+                mostrar_exportacion()
+        
+        with col2:
+            if indice_pivot != columna_pivot:
+                # Mostrar pivot table como heatmap
+                matriz_pivot, poda_pivot = presupuesto_render.limitar_matriz(pivot_table)
+                fig_pivot = figura('pivot_heatmap', (filtro_año, indice_pivot, columna_pivot), lambda: px.imshow(
+                    matriz_pivot.values,
+                    x=matriz_pivot.columns,
+                    y=matriz_pivot.index,
+                    color_continuous_scale='Viridis',
+                    title=f"Matriz: {indice_pivot} vs {columna_pivot}",
+                    aspect="auto"
+                ).update_layout(height=500))
+                mostrar_grafico('pivot_heatmap', fig_pivot)
+                avisar_poda(poda_pivot)
+                
+                # Mostrar tabla numérica
+                with st.expander("Ver tabla numérica"):
+                    st.dataframe(pivot_table, use_container_width=True)
+                
+                # Estadísticas de la tabla pivot
+                st.markdown("#### Estadísticas:")
+                col_s1, col_s2, col_s3 = st.columns(3)
+                with col_s1:
+                    st.metric("Máximo", f"${pivot_table.values.max():,.0f}")
+                with col_s2:
+                    st.metric("Promedio", f"${pivot_table.values.mean():,.0f}")
+                with col_s3:
+                    st.metric("Mínimo", f"${pivot_table.values.min():,.0f}")
+
+# TAB 6: CONSULTAS DECLARATIVAS
+with tab6:
+    if tab6.open:
+        st.markdown('<div class="section-header">Query Console</div>', unsafe_allow_html=True)
+        st.markdown('<span class="operation-badge">SELECT</span>Consultas SELECT medidas BY dimensiones WHERE filtros', unsafe_allow_html=True)
+        
+        if aproximado:
+            st.info("Las consultas se ejecutan con los datos exactos: disponible cuando termine la carga")
+        else:
+            texto_consulta = st.text_area(
+                "Consulta:",
+                value=f"SELECT SUM(Ventas), AVG(Ventas) BY Producto, Región WHERE Año = {año_seleccionado} "
+                      f"ORDER BY Ventas DESC LIMIT 10",
+                key="consulta_texto",
+                height=100,
+                help="Medidas: SUM, COUNT, MIN, MAX, AVG de Ventas. Dimensiones: Fecha, Año, Trimestre, Mes, "
+                     "Producto, Región, Día_Semana. Condiciones: =, IN (...), BETWEEN ... AND ..."
+            )
+            try:
+                consulta_lenguaje = lenguaje_olap.analizar(texto_consulta)
+                plan_consulta = lenguaje_olap.planificar(consulta_lenguaje, motor)
+            except ValueError as error:
+                st.error(f"Consulta inválida: {error}")
+            else:
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    if not consulta_lenguaje.explicar:
+                        resultado_consulta = lenguaje_olap.ejecutar(plan_consulta, motor)
+                        st.markdown(f"#### Resultado ({len(resultado_consulta):,} filas):")
+                        st.dataframe(resultado_consulta.head(presupuesto_render.FILAS_POR_PAGINA),
+                                     use_container_width=True, hide_index=True)
+                        if len(resultado_consulta) > presupuesto_render.FILAS_POR_PAGINA:
+                            st.caption(f"Mostrando las primeras {presupuesto_render.FILAS_POR_PAGINA:,} filas (use LIMIT)")
+                with col2:
+                    st.markdown("#### Explain:")
+                    st.dataframe(lenguaje_olap.explicar(plan_consulta), use_container_width=True, hide_index=True)
+                    st.metric("Costo del plan", f"{plan_consulta.costo:,}", help="Celdas o filas leídas")
+
+# Panel de diagnóstico (solo con OLAP_DIAGNOSTICO=1)
+if instrumentacion.ACTIVO:
+    total_rerun, eventos_rerun = instrumentacion.fin_rerun()
+    with st.sidebar.expander("Diagnóstico de rendimiento"):
+        st.markdown(f"**Rerun actual:** {total_rerun * 1000:.1f} ms")
+        st.dataframe(
+            pd.DataFrame(
+                [(nombre, segundos * 1000) for nombre, segundos in eventos_rerun],
+                columns=['Operación', 'ms']
+            ).groupby('Operación', as_index=False).sum().sort_values('ms', ascending=False),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.markdown("**Percentiles del proceso (ms):**")
+        st.dataframe(
+            pd.DataFrame(instrumentacion.resumen()).T.round(2),
+            use_container_width=True
+        )
+        st.markdown("**Contadores del proceso:**")
+        st.dataframe(
+            pd.DataFrame(sorted(instrumentacion.contadores().items()), columns=['Contador', 'Total']),
+            use_container_width=True,
+            hide_index=True
+        )
+        estadisticas_cache = cache_consultas.CACHE.estadisticas()
+        st.markdown(
+            f"**Caché de consultas:** {estadisticas_cache['aciertos']:,} aciertos / "
+            f"{estadisticas_cache['fallos']:,} fallos · "
+            f"{estadisticas_cache['bytes_usados'] / 1024:,.0f} KB"
+        )
+        estadisticas_servicio = servicio.SERVICIO.estadisticas()
+        st.markdown(
+            f"**Servicio de consultas:** {estadisticas_servicio['hilos']} hilos · "
+            f"{estadisticas_servicio['ejecutadas']:,} ejecutadas / "
+            f"{estadisticas_servicio['agrupadas']:,} agrupadas · "
+            f"{estadisticas_servicio['en_curso']} en curso"
+        )
+        if not aproximado:
+            estadisticas_reticulo = motor.reticulo.estadisticas()
+            st.markdown("**Vistas materializadas:**")
+            st.dataframe(
+                pd.DataFrame(estadisticas_reticulo['vistas']).round(1),
+                use_container_width=True,
+                hide_index=True
+            )
+            st.markdown("**Últimos planes (consulta → vista):**")
+            st.dataframe(
+                pd.DataFrame(estadisticas_reticulo['planes'], columns=['consulta', 'vista', 'celdas']),
+                use_container_width=True,
+                hide_index=True
+            )
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,259 @@
+# benchmark_olap.py
+# Benchmark de las operaciones OLAP para distintos tamaños de dataset.
+# Genera los datos con el modelo estacional de generador_datos.py, mide la
+# carga, cada operación de las pestañas del dashboard, la exportación a
+# Excel (la misma de exportacion.py que usa el dashboard) y el pico de
+# memoria, y guarda los resultados en JSON para poder comparar corridas. Las
+# mediciones que necesitan una dependencia que no está instalada (plotly,
+# openpyxl) quedan como {"omitido": motivo} en lugar de desaparecer:
+#
+#   python benchmark_olap.py --tamaños 10000 100000 1000000 --salida base.json
+#   python benchmark_olap.py --tamaños 10000 100000 1000000 --comparar base.json
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import almacen
+import generador_datos
+
+TAMAÑOS = [10**4, 10**5, 10**6, 10**7, 10**8]
+
+
+# Generar (o reutilizar) el dataset de un tamaño dado en formato columnar
+def preparar_datos(directorio, filas, semilla, procesos):
+    ruta_csv = os.path.join(directorio, f'ventas_{filas}.csv')
+    ruta = almacen.ruta_almacen(ruta_csv)
+    meta = os.path.join(ruta, 'meta.json')
+    if os.path.exists(meta):
+        with open(meta, encoding='utf-8') as f:
+            if json.load(f)['filas'] == filas:
+                return ruta_csv
+    dia_inicio = int(np.datetime64(generador_datos.fecha_inicio, 'D').astype(np.int64))
+    dia_fin = int(np.datetime64(generador_datos.fecha_fin, 'D').astype(np.int64))
+    bloques = generador_datos.generar_bloques(
+        filas, semilla, dia_inicio, dia_fin, generador_datos.filas_por_bloque, procesos
+    )
+    generador_datos.escribir_columnar(ruta, bloques)
+    return ruta_csv
+
+
+# Cronometrar una función varias veces (mediana y mínimo en segundos)
+def cronometrar(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {'mediana_s': statistics.median(tiempos), 'min_s': min(tiempos), 'repeticiones': repeticiones}
+
+
+# Medir todas las operaciones sobre un dataset ya generado.
+# Se ejecuta en un proceso aparte para que el pico de memoria sea propio.
+def medir(ruta_csv, repeticiones, procesos):
+    import cubo
+    import exportacion
+    import lenguaje_olap
+    import particiones
+    import presupuesto_render
+    import tablas_arrow
+    from motor_olap import MotorOLAP
+
+    resultados = {}
+
+    # Carga en frío: sin el cubo persistido, se construye desde las columnas
+    archivo_cubo = os.path.join(almacen.ruta_almacen(ruta_csv), almacen.ARCHIVO_CUBO)
+    if os.path.exists(archivo_cubo):
+        os.remove(archivo_cubo)
+    resultados['carga_fria'] = cronometrar(lambda: MotorOLAP.desde_almacen(ruta_csv, procesos=procesos), 1)
+    resultados['carga'] = cronometrar(lambda: MotorOLAP.desde_almacen(ruta_csv), repeticiones)
+
+    # Cubo del histórico completo: un núcleo contra map-reduce por particiones
+    particiones.preparar(ruta_csv)
+    resultados['cubo_secuencial'] = cronometrar(
+        lambda: cubo.construir_cubo(almacen.cargar_ventas(ruta_csv)), repeticiones
+    )
+    resultados['cubo_paralelo'] = cronometrar(
+        lambda: particiones.construir_cubo(ruta_csv, procesos), repeticiones
+    )
+
+    # Sin caché de resultados: se mide el cálculo, no el acierto
+    motor = MotorOLAP.desde_almacen(ruta_csv, cache=False)
+    motor_particionado = MotorOLAP.desde_almacen(ruta_csv, cache=False, particionado=True)
+    año = motor.miembros('Año')[-1]
+    productos = motor.miembros('Producto')
+    regiones = motor.miembros('Región')
+    filtro_año = {'Año': [año]}
+    filtros_slice = dict(filtro_año, Producto=[productos[0]], Región=[regiones[0]])
+    filtros_rango = {'Producto': [productos[0]], 'Región': [regiones[0]]}
+    filtros_dice = dict(filtro_año, Producto=productos[:3], Región=regiones[:2], Trimestre=[1, 2, 3, 4])
+
+    operaciones = {
+        'slice': lambda: (motor.totales(filtros_slice), motor.rollup(['Mes'], filtros_slice)),
+        'slice_detalle': lambda: motor.registros(filtros_slice),
+        'slice_detalle_particionado': lambda: motor_particionado.registros(filtros_slice),
+        'slice_pagina_arrow': lambda: motor_particionado.registros(
+            filtros_slice, 0, presupuesto_render.FILAS_POR_PAGINA, 'arrow' if tablas_arrow.DISPONIBLE else 'pandas'
+        ),
+        'dice': lambda: (motor.dice(filtros_dice), motor.pivot('Región', 'Producto', filtros_dice)),
+        'rollup_año': lambda: motor.rollup(['Año', 'Producto'], filtro_año),
+        'rollup_trimestre': lambda: motor.rollup(['Trimestre', 'Producto'], filtro_año),
+        'rollup_mes': lambda: motor.rollup(['Mes', 'Producto'], filtro_año),
+        'drilldown': lambda: motor.drilldown(['Año', 'Trimestre', 'Mes', 'Producto', 'Región'], filtro_año),
+        'pivot': lambda: motor.pivot('Región', 'Producto', filtro_año),
+        'rango_interanual': lambda: motor.interanual(*motor.rango_fechas(), filtros_rango),
+        'movil_30': lambda: motor.movil(30, *motor.rango_fechas(), filtros_rango),
+        'kpi_cuantiles': lambda: (motor.cuantiles(filtros_slice), motor.dias_con_ventas(filtros_slice)),
+        'lenguaje_dia_semana': lambda: lenguaje_olap.consultar(
+            f"SELECT SUM(Ventas), MAX(Ventas) BY Día_Semana WHERE Año = {año}", motor_particionado
+        ),
+    }
+    for nombre, operacion in operaciones.items():
+        resultados[nombre] = cronometrar(operacion, repeticiones)
+
+    try:
+        import plotly.express as px
+        drill = motor.drilldown(['Año', 'Trimestre', 'Mes', 'Producto', 'Región'], filtro_año)
+
+        # Como en el dashboard: con el presupuesto de render aplicado
+        def sunburst():
+            hojas, poda = presupuesto_render.limitar_hojas(
+                drill, ['Trimestre', 'Mes', 'Región', 'Producto'], 'Ventas'
+            )
+            return px.sunburst(hojas, path=poda['ruta'], values='Ventas')
+        resultados['figura_sunburst'] = cronometrar(sunburst, repeticiones)
+    except ImportError:
+        resultados['figura_sunburst'] = {'omitido': "falta la dependencia plotly"}
+
+    # Como el botón de la pestaña Pivot: todas las hojas del cubo del año
+    # más reciente con exportacion.exportar (openpyxl en modo write-only)
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        resultados['exportar_excel'] = {'omitido': "falta la dependencia openpyxl"}
+    else:
+        with tempfile.TemporaryDirectory() as temporal:
+            destino = os.path.join(temporal, 'cubo.xlsx')
+            resultados['exportar_excel'] = cronometrar(
+                lambda: exportacion.exportar(destino, motor.cubo, filtro_año, 'xlsx'), repeticiones
+            )
+
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    resultados['pico_rss_mb'] = pico / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return resultados
+
+
+# Comparar contra una corrida anterior; devuelve las regresiones encontradas.
+# Los tiempos solo cuentan como regresión si además empeoran más de minimo_ms,
+# para no marcar el ruido de operaciones de pocos milisegundos.
+def comparar(actual, anterior, tolerancia, minimo_ms):
+    regresiones = []
+    previos = {str(r['filas']): r for r in anterior['resultados']}
+    for r in actual['resultados']:
+        base = previos.get(str(r['filas']))
+        if base is None:
+            continue
+        for operacion, medicion in r['operaciones'].items():
+            referencia = base['operaciones'].get(operacion)
+            if referencia is None:
+                continue
+            omitida = next((m['omitido'] for m in (medicion, referencia) if isinstance(m, dict) and 'omitido' in m),
+                           None)
+            if omitida:
+                print(f"{r['filas']:>12,} {operacion:<18} omitida: {omitida}")
+                continue
+            if isinstance(medicion, dict):
+                antes, despues, unidad = referencia['min_s'] * 1000, medicion['min_s'] * 1000, 'ms'
+                significativo = despues - antes > minimo_ms
+            else:
+                antes, despues, unidad = referencia, medicion, 'MB'
+                significativo = True
+            if antes <= 0:
+                continue
+            razon = despues / antes
+            marca = '  <-- REGRESIÓN' if razon > 1 + tolerancia and significativo else ''
+            print(f"{r['filas']:>12,} {operacion:<18} {antes:>10.2f} {unidad} "
+                  f"-> {despues:>10.2f} {unidad}  x{razon:.2f}{marca}")
+            if marca:
+                regresiones.append((r['filas'], operacion, razon))
+    return regresiones
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de operaciones OLAP por tamaño de dataset.")
+    parser.add_argument('--tamaños', type=int, nargs='+', default=TAMAÑOS, help="Filas de cada dataset")
+    parser.add_argument('--repeticiones', type=int, default=5, help="Repeticiones por operación")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                        help="Procesos para generar datos y para el cubo por particiones")
+    parser.add_argument('--directorio', default='bench_datos', help="Dónde guardar los datasets generados")
+    parser.add_argument('--salida', default='bench_resultados.json', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', metavar='ANTERIOR', help="JSON de una corrida anterior")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Empeoramiento admitido (0.2 = 20%%)")
+    parser.add_argument('--minimo-ms', type=float, default=1.0,
+                        help="Empeoramiento absoluto mínimo para marcar una regresión de tiempo")
+    parser.add_argument('--medir', metavar='CSV', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if min(args.tamaños) <= 0:
+        parser.error("--tamaños deben ser enteros positivos")
+    for opcion in ('repeticiones', 'procesos'):
+        if getattr(args, opcion) <= 0:
+            parser.error(f"--{opcion} debe ser un entero positivo")
+    if args.tolerancia < 0 or args.minimo_ms < 0:
+        parser.error("--tolerancia y --minimo-ms no pueden ser negativos")
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Modo interno: medir un dataset y devolver el JSON por stdout
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.repeticiones, args.procesos)))
+        sys.exit(0)
+
+    os.makedirs(args.directorio, exist_ok=True)
+    resultados = []
+    for filas in args.tamaños:
+        print(f"Preparando {filas:,} filas...", file=sys.stderr)
+        ruta_csv = preparar_datos(args.directorio, filas, args.semilla, args.procesos)
+        salida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--medir', ruta_csv,
+             '--repeticiones', str(args.repeticiones), '--procesos', str(args.procesos)],
+            check=True, capture_output=True, text=True
+        )
+        operaciones = json.loads(salida.stdout)
+        resultados.append({'filas': filas, 'operaciones': operaciones})
+        print(f"{filas:>12,} filas: carga {operaciones['carga']['min_s']*1000:.1f} ms, "
+              f"pico RSS {operaciones['pico_rss_mb']:.0f} MB", file=sys.stderr)
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'semilla': args.semilla,
+        'resultados': resultados,
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en {args.salida}", file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(informe, json.load(f), args.tolerancia, args.minimo_ms)
+        if regresiones:
+            sys.exit(1)
@@ -0,0 +1,70 @@
+# bitmaps.py
+# Índices bitmap por dimensión: un bitmap empaquetado (1 bit por fila) para
+# cada miembro de Producto, Región, Año, Trimestre y Mes. Un slice o dice se
+# resuelve con OR dentro de cada dimensión y AND entre dimensiones, y las
+# filas solo se materializan cuando una tabla de detalle las necesita.
+# Sirven al motor con las filas en memoria; el motor particionado (el del
+# dashboard) no los construye: poda particiones Año/Mes por estadísticas.
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONES_INDEXADAS = ['Producto', 'Región', 'Año', 'Trimestre', 'Mes']
+
+# Cantidad de bits encendidos por cada valor de byte
+_BITS_POR_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+# Construir los bitmaps de todas las dimensiones indexadas
+def construir_indice(df, dimensiones=DIMENSIONES_INDEXADAS):
+    bitmaps = {}
+    for dim in dimensiones:
+        columna = df[dim]
+        if isinstance(columna.dtype, pd.CategoricalDtype):
+            codigos = columna.cat.codes.to_numpy()
+            miembros = {etiqueta: i for i, etiqueta in enumerate(columna.cat.categories)}
+        else:
+            codigos = columna.to_numpy()
+            miembros = {valor: valor for valor in np.unique(codigos).tolist()}
+        bitmaps[dim] = {miembro: np.packbits(codigos == codigo) for miembro, codigo in miembros.items()}
+    return {'filas': len(df), 'bitmaps': bitmaps}
+
+
+def _vacio(indice):
+    return np.zeros((indice['filas'] + 7) // 8, dtype=np.uint8)
+
+
+def _completo(indice):
+    return np.packbits(np.ones(indice['filas'], dtype=bool))
+
+
+# Bitmap de las filas que cumplen los filtros {dimensión: valor o lista}
+def seleccionar(indice, filtros):
+    resultado = _completo(indice)
+    for dim, valores in filtros.items():
+        if valores is None:
+            continue
+        if np.isscalar(valores):
+            valores = [valores]
+        union = _vacio(indice)
+        for valor in valores:
+            bitmap = indice['bitmaps'][dim].get(valor)
+            if bitmap is not None:
+                np.bitwise_or(union, bitmap, out=union)
+        np.bitwise_and(resultado, union, out=resultado)
+    return resultado
+
+
+# Número de filas seleccionadas (sin desempaquetar)
+def contar(bitmap):
+    return int(_BITS_POR_BYTE[bitmap].sum())
+
+
+# Posiciones de las filas seleccionadas, para materializar con df.iloc
+def posiciones(indice, bitmap):
+    return np.flatnonzero(np.unpackbits(bitmap, count=indice['filas']))
+
+
+# Memoria ocupada por el índice, en bytes
+def tamaño(indice):
+    return sum(b.nbytes for miembros in indice['bitmaps'].values() for b in miembros.values())
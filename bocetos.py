@@ -0,0 +1,205 @@
+# bocetos.py
+# Bocetos de cuantiles de Ventas por celda Año/Mes x Producto x Región, para
+# mostrar la mediana y el percentil 95 de cualquier slice sin recorrer las
+# filas. Cada celda es un histograma de cubetas logarítmicas (como
+# DDSketch): la cubeta i cuenta las ventas en (γ^(i-1), γ^i] con
+# γ = (1 + α) / (1 - α), y el cuantil estimado está a menos de α (error
+# relativo, OLAP_BOCETO_PRECISION, 1% por defecto) del exacto.
+#
+# Todas las celdas comparten las mismas cubetas, así que combinar bocetos es
+# sumar conteos: un slice suma las celdas que admiten sus filtros igual que
+# el cubo de agregados. Por eso un lote anexado solo suma sus conteos a los
+# guardados. Se guardan en el almacén (bocetos.npz) por versión:
+#
+#   python bocetos.py ventas.csv
+
+import os
+
+import numpy as np
+
+import almacen
+
+ARCHIVO_BOCETOS = 'bocetos.npz'
+PRECISION = float(os.environ.get('OLAP_BOCETO_PRECISION', '0.01'))
+
+# Ejes del arreglo de conteos (el último son las cubetas)
+EJES = ['Año', 'Mes', 'Producto', 'Región']
+
+
+def _cubeta(valores, gamma):
+    # Ventas menores que 1 van a la primera cubeta
+    return np.ceil(np.log(np.maximum(valores, 1)) / np.log(gamma)).astype(np.int64)
+
+
+# Conteos de un bloque de columnas en la rejilla 'forma' (años desde
+# primer_año, cubetas desde desplazamiento)
+def _contar(columnas, forma, primer_año, desplazamiento, gamma):
+    _, meses, productos, regiones, cubetas = forma
+    celda = (((columnas['Año'].astype(np.int64) - primer_año) * meses + columnas['Mes'] - 1)
+             * productos + columnas['Producto']) * regiones + columnas['Región']
+    plano = celda * cubetas + _cubeta(columnas['Ventas'], gamma) - desplazamiento
+    return np.bincount(plano, minlength=int(np.prod(forma))).reshape(forma)
+
+
+# Recorrer el almacén por bloques y contar cada venta en la cubeta de su celda
+def construir(ruta_csv='ventas.csv', precision=PRECISION):
+    columnas, meta = almacen.abrir_columnas(almacen.ruta_almacen(ruta_csv))
+    gamma = (1 + precision) / (1 - precision)
+    productos = np.asarray(meta['categorias']['Producto'])
+    regiones = np.asarray(meta['categorias']['Región'])
+    if meta['filas'] == 0:
+        años = np.zeros(0, dtype=np.int64)
+        desplazamiento, cubetas = 0, 1
+    else:
+        años = np.arange(int(columnas['Año'].min()), int(columnas['Año'].max()) + 1)
+        desplazamiento = int(_cubeta(columnas['Ventas'].min(), gamma))
+        cubetas = int(_cubeta(columnas['Ventas'].max(), gamma)) - desplazamiento + 1
+    forma = (len(años), 12, len(productos), len(regiones), cubetas)
+
+    conteos = np.zeros(forma, dtype=np.int64)
+    for bloque, _ in almacen.bloques_columnas(ruta_csv):
+        conteos += _contar(bloque, forma, años[0] if len(años) else 0, desplazamiento, gamma)
+
+    return {
+        'años': años,
+        'productos': productos,
+        'regiones': regiones,
+        'precision': precision,
+        'gamma': gamma,
+        'desplazamiento': desplazamiento,
+        'conteos': conteos,
+    }
+
+
+# Sumar los conteos de un lote de filas (columnas del almacén) a los
+# bocetos. Los ejes de años, productos, regiones y cubetas se ensanchan si
+# el lote cae fuera de ellos; los conteos previos quedan en su lugar.
+def extender(bocetos, columnas, categorias):
+    if len(columnas['Ventas']) == 0:
+        return bocetos
+    gamma = bocetos['gamma']
+    previos = bocetos['conteos']
+    productos = np.asarray(categorias['Producto'])
+    regiones = np.asarray(categorias['Región'])
+    años_lote = (int(columnas['Año'].min()), int(columnas['Año'].max()))
+    cubetas_lote = (int(_cubeta(columnas['Ventas'].min(), gamma)), int(_cubeta(columnas['Ventas'].max(), gamma)))
+    if len(bocetos['años']):
+        primer_año = min(int(bocetos['años'][0]), años_lote[0])
+        ultimo_año = max(int(bocetos['años'][-1]), años_lote[1])
+        desplazamiento = min(bocetos['desplazamiento'], cubetas_lote[0])
+        ultima_cubeta = max(bocetos['desplazamiento'] + previos.shape[-1] - 1, cubetas_lote[1])
+    else:
+        primer_año, ultimo_año = años_lote
+        desplazamiento, ultima_cubeta = cubetas_lote
+    años = np.arange(primer_año, ultimo_año + 1)
+    forma = (len(años), 12, len(productos), len(regiones), ultima_cubeta - desplazamiento + 1)
+
+    conteos = _contar(columnas, forma, primer_año, desplazamiento, gamma)
+    if len(bocetos['años']):
+        a, _, p, r, c = previos.shape
+        desde_año = int(bocetos['años'][0]) - primer_año
+        desde_cubeta = bocetos['desplazamiento'] - desplazamiento
+        conteos[desde_año:desde_año + a, :, :p, :r, desde_cubeta:desde_cubeta + c] += previos
+    return dict(bocetos, años=años, productos=productos, regiones=regiones,
+                desplazamiento=desplazamiento, conteos=conteos)
+
+
+def guardar(bocetos, ruta, version=None):
+    temporal = ruta + '.tmp.npz'
+    np.savez(temporal, version=str(version), **bocetos)
+    os.replace(temporal, ruta)
+
+
+def _abrir(ruta):
+    with np.load(ruta) as datos:
+        bocetos = {nombre: datos[nombre] for nombre in datos.files if nombre != 'version'}
+        for nombre in ('precision', 'gamma'):
+            bocetos[nombre] = float(bocetos[nombre])
+        bocetos['desplazamiento'] = int(bocetos['desplazamiento'])
+        return bocetos, str(datos['version'])
+
+
+# Bocetos del almacén: se reutilizan los guardados si son de la versión
+# actual y tienen la precisión configurada
+def cargar(ruta_csv='ventas.csv', precision=PRECISION):
+    version = almacen.preparar(ruta_csv)
+    archivo = os.path.join(almacen.ruta_almacen(ruta_csv), ARCHIVO_BOCETOS)
+    if os.path.exists(archivo):
+        bocetos, version_bocetos = _abrir(archivo)
+        if version_bocetos == str(version) and bocetos['precision'] == precision:
+            return bocetos
+    bocetos = construir(ruta_csv, precision)
+    guardar(bocetos, archivo, version)
+    return bocetos
+
+
+# Sumar a los bocetos guardados un lote anexado al almacén, si eran de la
+# versión anterior y de la precisión configurada; si no, se reconstruyen
+# en el próximo cargar()
+def anexar(ruta_csv, columnas, meta_almacen, version_anterior, precision=PRECISION):
+    archivo = os.path.join(almacen.ruta_almacen(ruta_csv), ARCHIVO_BOCETOS)
+    if not os.path.exists(archivo):
+        return None
+    bocetos, version_bocetos = _abrir(archivo)
+    if version_bocetos != str(version_anterior) or bocetos['precision'] != precision:
+        return None
+    bocetos = extender(bocetos, columnas, meta_almacen['categorias'])
+    guardar(bocetos, archivo, meta_almacen['version'])
+    return bocetos
+
+
+# Índices de cada eje que admiten los filtros. Trimestre se traduce a sus
+# meses; las dimensiones sin eje (Día_Semana) no se pueden filtrar.
+def _seleccion(bocetos, filtros=None):
+    filtros = filtros or {}
+    meses = np.arange(1, 13)
+    permitidos = np.ones(12, dtype=bool)
+    if filtros.get('Mes') is not None:
+        permitidos &= np.isin(meses, filtros['Mes'])
+    if filtros.get('Trimestre') is not None:
+        permitidos &= np.isin((meses - 1) // 3 + 1, filtros['Trimestre'])
+    miembros = {'Año': bocetos['años'], 'Producto': bocetos['productos'], 'Región': bocetos['regiones']}
+    seleccion = []
+    for eje in EJES:
+        if eje == 'Mes':
+            seleccion.append(np.flatnonzero(permitidos))
+        elif filtros.get(eje) is None:
+            seleccion.append(np.arange(len(miembros[eje])))
+        else:
+            seleccion.append(np.flatnonzero(np.isin(miembros[eje], filtros[eje])))
+    return seleccion
+
+
+# Boceto combinado de las celdas que admiten los filtros
+def combinar(bocetos, filtros=None):
+    return bocetos['conteos'][np.ix_(*_seleccion(bocetos, filtros))].sum(axis=(0, 1, 2, 3))
+
+
+# Cuantiles de Ventas bajo los filtros: {probabilidad: valor estimado}.
+# Cada valor está a menos de bocetos['precision'] (relativo) del exacto.
+def cuantiles(bocetos, probabilidades=(0.5, 0.95), filtros=None):
+    histograma = combinar(bocetos, filtros)
+    total = int(histograma.sum())
+    if total == 0:
+        return {p: 0.0 for p in probabilidades}
+    acumulado = np.cumsum(histograma)
+    gamma = bocetos['gamma']
+    resultado = {}
+    for p in probabilidades:
+        cubeta = int(np.searchsorted(acumulado, p * (total - 1), side='right'))
+        resultado[p] = 2 * gamma ** (cubeta + bocetos['desplazamiento']) / (gamma + 1)
+    return resultado
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bocetos de cuantiles de Ventas por celda del cubo.")
+    parser.add_argument('csv', nargs='?', default='ventas.csv', help="CSV base del almacén")
+    args = parser.parse_args()
+
+    bocetos = cargar(args.csv)
+    estimados = cuantiles(bocetos)
+    print(f"Bocetos guardados en {os.path.join(almacen.ruta_almacen(args.csv), ARCHIVO_BOCETOS)} "
+          f"({bocetos['conteos'].nbytes / 1024:,.0f} KB): mediana ≈ {estimados[0.5]:,.0f}, "
+          f"p95 ≈ {estimados[0.95]:,.0f} (±{bocetos['precision']:.0%})")
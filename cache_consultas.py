@@ -0,0 +1,140 @@
+# cache_consultas.py
+# Caché de resultados OLAP compartida por todo el proceso (todas las
+# sesiones de Streamlit). La clave es una consulta canónica (dimensiones,
+# filtros, medida, agregación); se desaloja por LRU dentro de un presupuesto
+# de bytes y se vacía cuando cambia la versión del dataset.
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import cubo
+
+AGREGACIONES = ['suma', 'conteo', 'minimo', 'maximo', 'todas']
+PRESUPUESTO_MB = int(os.environ.get('OLAP_CACHE_MB', '256'))
+
+
+@dataclass(frozen=True)
+class Consulta:
+    dimensiones: tuple = ()
+    filtros: tuple = ()          # ((dimensión, (valores ordenados...)), ...)
+    medida: str = 'Ventas'
+    agregacion: str = 'suma'
+    pivot: bool = False          # True: dimensiones = (filas, columnas)
+
+
+def _valor_canonico(valor):
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+
+# Armar una consulta canónica: el orden de los filtros y de sus valores no
+# cambia la clave, y los escalares equivalen a listas de un elemento
+def consulta(dimensiones=(), filtros=None, agregacion='suma', pivot=False, medida='Ventas'):
+    if agregacion not in AGREGACIONES:
+        raise ValueError(f"Agregación no soportada: {agregacion}")
+    canonicos = []
+    for dim, valores in sorted((filtros or {}).items()):
+        if valores is None:
+            continue
+        if np.isscalar(valores):
+            valores = [valores]
+        canonicos.append((dim, tuple(sorted({_valor_canonico(v) for v in valores}, key=str))))
+    return Consulta(tuple(dimensiones), tuple(canonicos), medida, agregacion, pivot)
+
+
+# Resolver una consulta sobre el cubo de agregados
+def ejecutar(cubo_ventas, c):
+    filtros = {dim: list(valores) for dim, valores in c.filtros}
+    if c.pivot:
+        filas, columnas = c.dimensiones
+        medida = 'suma' if c.agregacion == 'todas' else c.agregacion
+        return cubo.pivot(cubo_ventas, filas, columnas, filtros, medida=medida)
+    if not c.dimensiones:
+        return cubo.totales(cubo_ventas, filtros)
+    datos = cubo.agregar(cubo_ventas, c.dimensiones, filtros)
+    if c.agregacion == 'todas':
+        return datos
+    return datos[list(c.dimensiones) + [cubo.MEDIDAS[c.agregacion]]]
+
+
+# Tamaño aproximado de un resultado en memoria
+def tamaño_resultado(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return int(resultado.memory_usage(deep=True).sum())
+    if isinstance(resultado, pd.Series):
+        return int(resultado.memory_usage(deep=True))
+    if isinstance(resultado, np.ndarray):
+        return int(resultado.nbytes)
+    if isinstance(resultado, dict):
+        return sys.getsizeof(resultado) + sum(sys.getsizeof(v) for v in resultado.values())
+    return sys.getsizeof(resultado)
+
+
+class CacheResultados:
+    def __init__(self, presupuesto_bytes=PRESUPUESTO_MB * 1024 * 1024):
+        self.presupuesto_bytes = presupuesto_bytes
+        self._entradas = OrderedDict()   # consulta -> (resultado, bytes)
+        self._lock = threading.Lock()
+        self.version = None
+        self.bytes_usados = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    # Devolver el resultado guardado o calcularlo con calcular() y guardarlo.
+    # Los resultados se comparten entre sesiones: no deben modificarse.
+    def obtener(self, c, version, calcular):
+        with self._lock:
+            if version != self.version:
+                self._vaciar()
+                self.version = version
+            if c in self._entradas:
+                self._entradas.move_to_end(c)
+                self.aciertos += 1
+                return self._entradas[c][0]
+            self.fallos += 1
+
+        resultado = calcular()
+        tamaño = tamaño_resultado(resultado)
+
+        with self._lock:
+            if version != self.version or tamaño > self.presupuesto_bytes or c in self._entradas:
+                return resultado
+            self._entradas[c] = (resultado, tamaño)
+            self.bytes_usados += tamaño
+            while self.bytes_usados > self.presupuesto_bytes:
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self.bytes_usados -= liberado
+                self.desalojos += 1
+        return resultado
+
+    def _vaciar(self):
+        self._entradas.clear()
+        self.bytes_usados = 0
+
+    def invalidar(self):
+        with self._lock:
+            self._vaciar()
+            self.version = None
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'bytes_usados': self.bytes_usados,
+                'presupuesto_bytes': self.presupuesto_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+            }
+
+
+# Caché única del proceso
+CACHE = CacheResultados()
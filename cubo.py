@@ -0,0 +1,209 @@
+# cubo.py
+# Cubo de agregados precalculado: Año x Trimestre x Mes x Producto x Región.
+# Se construye una sola vez a partir de las filas y las operaciones OLAP
+# (slice, dice, roll-up, drill-down, pivot) se resuelven reduciendo el
+# arreglo por ejes, sin volver a recorrer las filas.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONES = ['Año', 'Trimestre', 'Mes', 'Producto', 'Región']
+
+# Nombre de columna de salida para cada medida del cubo
+MEDIDAS = {
+    'suma': 'Ventas',
+    'conteo': 'Registros',
+    'minimo': 'Mínimo',
+    'maximo': 'Máximo',
+}
+
+# Arreglos opcionales con la misma forma que se guardan junto al cubo
+# (por ejemplo la varianza de las estimaciones de muestras.py)
+ADICIONALES = ['varianza']
+
+
+# Miembros ordenados y código de cada fila para una columna de dimensión.
+# Las categóricas y los enteros de rango corto se codifican sin ordenar filas.
+def _codificar(columna):
+    if isinstance(columna.dtype, pd.CategoricalDtype):
+        categorias = np.asarray(columna.cat.categories, dtype=str)
+        orden = np.arange(len(categorias)) if columna.cat.ordered else np.argsort(categorias, kind='stable')
+        posicion = np.empty(len(orden), dtype=np.intp)
+        posicion[orden] = np.arange(len(orden))
+        return categorias[orden], posicion[columna.cat.codes.to_numpy()]
+
+    valores = np.asarray(columna)
+    if np.issubdtype(valores.dtype, np.integer) and len(valores):
+        minimo, maximo = int(valores.min()), int(valores.max())
+        if maximo - minimo < 4096:
+            return np.arange(minimo, maximo + 1), valores.astype(np.intp) - minimo
+    return np.unique(valores, return_inverse=True)
+
+
+# Construir el cubo denso a partir de un DataFrame con las columnas derivadas
+def construir_cubo(df):
+    miembros = {}
+    codigos = []
+    for dim in DIMENSIONES:
+        valores, codigo = _codificar(df[dim])
+        miembros[dim] = valores
+        codigos.append(codigo)
+
+    forma = tuple(len(miembros[dim]) for dim in DIMENSIONES)
+    celdas = int(np.prod(forma))
+    plano = np.ravel_multi_index(codigos, forma) if len(df) else np.zeros(0, dtype=np.intp)
+    entero = np.issubdtype(np.asarray(df['Ventas']).dtype, np.integer)
+    ventas = np.asarray(df['Ventas'], dtype=np.float64)
+
+    suma = np.bincount(plano, weights=ventas, minlength=celdas)
+    if entero:
+        suma = np.rint(suma).astype(np.int64)
+    conteo = np.bincount(plano, minlength=celdas).astype(np.int64)
+    minimo = np.full(celdas, np.inf)
+    maximo = np.full(celdas, -np.inf)
+    np.minimum.at(minimo, plano, ventas)
+    np.maximum.at(maximo, plano, ventas)
+
+    return {
+        'dimensiones': list(DIMENSIONES),
+        'miembros': miembros,
+        'entero': bool(entero),
+        'suma': suma.reshape(forma),
+        'conteo': conteo.reshape(forma),
+        'minimo': minimo.reshape(forma),
+        'maximo': maximo.reshape(forma),
+    }
+
+
+# Unir dos cubos (por ejemplo el histórico y un lote nuevo). El costo depende
+# del número de celdas, no del número de filas que originaron cada cubo.
+def combinar(a, b):
+    miembros = {dim: np.union1d(a['miembros'][dim], b['miembros'][dim]) for dim in DIMENSIONES}
+    forma = tuple(len(miembros[dim]) for dim in DIMENSIONES)
+    entero = a['entero'] and b['entero']
+    resultado = {
+        'dimensiones': list(DIMENSIONES),
+        'miembros': miembros,
+        'entero': entero,
+        'suma': np.zeros(forma, dtype=np.int64 if entero else np.float64),
+        'conteo': np.zeros(forma, dtype=np.int64),
+        'minimo': np.full(forma, np.inf),
+        'maximo': np.full(forma, -np.inf),
+    }
+    for parcial in (a, b):
+        posiciones = np.ix_(*[np.searchsorted(miembros[dim], parcial['miembros'][dim]) for dim in DIMENSIONES])
+        resultado['suma'][posiciones] += parcial['suma']
+        resultado['conteo'][posiciones] += parcial['conteo']
+        resultado['minimo'][posiciones] = np.minimum(resultado['minimo'][posiciones], parcial['minimo'])
+        resultado['maximo'][posiciones] = np.maximum(resultado['maximo'][posiciones], parcial['maximo'])
+    return resultado
+
+
+# Guardar / leer el cubo en un .npz junto a una etiqueta de versión
+def guardar(cubo, ruta, version=None):
+    arreglos = {medida: cubo[medida] for medida in MEDIDAS}
+    arreglos.update({nombre: cubo[nombre] for nombre in ADICIONALES if nombre in cubo})
+    for i, dim in enumerate(DIMENSIONES):
+        arreglos[f'miembros_{i}'] = cubo['miembros'][dim]
+    temporal = ruta + '.tmp.npz'
+    np.savez(temporal, entero=cubo['entero'], version=str(version), **arreglos)
+    os.replace(temporal, ruta)
+
+
+def cargar(ruta):
+    with np.load(ruta) as datos:
+        cubo = {
+            'dimensiones': list(DIMENSIONES),
+            'miembros': {dim: datos[f'miembros_{i}'] for i, dim in enumerate(DIMENSIONES)},
+            'entero': bool(datos['entero']),
+        }
+        for medida in MEDIDAS:
+            cubo[medida] = datos[medida]
+        for nombre in ADICIONALES:
+            if nombre in datos.files:
+                cubo[nombre] = datos[nombre]
+        return cubo, str(datos['version'])
+
+
+# Recortar el cubo a los miembros indicados en los filtros (slice / dice)
+def _filtrar(cubo, filtros):
+    arreglos = {medida: cubo[medida] for medida in MEDIDAS}
+    miembros = dict(cubo['miembros'])
+    for dim, valores in (filtros or {}).items():
+        if valores is None:
+            continue
+        if np.isscalar(valores):
+            valores = [valores]
+        eje = DIMENSIONES.index(dim)
+        posiciones = np.flatnonzero(np.isin(miembros[dim], list(valores)))
+        miembros[dim] = miembros[dim][posiciones]
+        for medida in arreglos:
+            arreglos[medida] = np.take(arreglos[medida], posiciones, axis=eje)
+    return arreglos, miembros
+
+
+# Reducir el cubo a las dimensiones de 'por' (roll-up) aplicando los filtros.
+# Devuelve solo las celdas con registros, ordenadas como un groupby.
+def agregar(cubo, por=(), filtros=None):
+    por = list(por)
+    arreglos, miembros = _filtrar(cubo, filtros)
+    ejes = tuple(i for i, dim in enumerate(DIMENSIONES) if dim not in por)
+    orden = [DIMENSIONES.index(dim) for dim in por]
+    restantes = sorted(orden)
+    transponer = [restantes.index(i) for i in orden]
+
+    reducidos = {
+        'suma': arreglos['suma'].sum(axis=ejes),
+        'conteo': arreglos['conteo'].sum(axis=ejes),
+        'minimo': arreglos['minimo'].min(axis=ejes, initial=np.inf),
+        'maximo': arreglos['maximo'].max(axis=ejes, initial=-np.inf),
+    }
+    reducidos = {m: np.atleast_1d(np.transpose(a, transponer)) for m, a in reducidos.items()}
+    if cubo['entero']:
+        for medida in ('minimo', 'maximo'):
+            reducidos[medida] = np.where(reducidos['conteo'] > 0, reducidos[medida], 0).astype(np.int64)
+
+    con_datos = reducidos['conteo'] > 0
+    posiciones = np.nonzero(con_datos)
+    resultado = {dim: miembros[dim][pos] for dim, pos in zip(por, posiciones)}
+    for medida, columna in MEDIDAS.items():
+        resultado[columna] = reducidos[medida][con_datos]
+    # Los arreglos ya son nuevos: el DataFrame los toma sin copiarlos
+    return pd.DataFrame(resultado, columns=por + list(MEDIDAS.values()), copy=False)
+
+
+# Totales (suma, conteo, mínimo, máximo y promedio) de un slice o dice
+def totales(cubo, filtros=None):
+    fila = agregar(cubo, (), filtros)
+    if len(fila) == 0:
+        return {'suma': 0.0, 'conteo': 0, 'minimo': 0.0, 'maximo': 0.0, 'promedio': 0.0}
+    fila = fila.iloc[0]
+    return {
+        'suma': float(fila['Ventas']),
+        'conteo': int(fila['Registros']),
+        'minimo': float(fila['Mínimo']),
+        'maximo': float(fila['Máximo']),
+        'promedio': float(fila['Ventas']) / int(fila['Registros']),
+    }
+
+
+# Miembros de una dimensión que tienen datos bajo los filtros dados
+def miembros(cubo, dim, filtros=None):
+    return list(agregar(cubo, [dim], filtros)[dim])
+
+
+# Tabla dinámica índice x columnas con la suma de ventas (huecos en 0).
+# Índice y columnas pueden ser una dimensión o una lista de dimensiones.
+def pivot(cubo, indice, columnas, filtros=None, medida='suma'):
+    indice = [indice] if isinstance(indice, str) else list(indice)
+    columnas = [columnas] if isinstance(columnas, str) else list(columnas)
+    datos = agregar(cubo, indice + columnas, filtros)
+    return datos.pivot_table(
+        values=MEDIDAS[medida],
+        index=indice,
+        columns=columnas,
+        aggfunc='sum',
+        fill_value=0
+    )
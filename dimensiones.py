@@ -0,0 +1,91 @@
+# dimensiones.py
+# Diccionarios de dimensiones: Producto, Región y Día_Semana se guardan como
+# códigos enteros compactos con una tabla de categorías compartida. Los
+# filtros de los widgets se traducen a comparaciones de códigos y las
+# etiquetas solo se recuperan para mostrar resultados.
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONES_CATEGORICAS = ['Producto', 'Región', 'Día_Semana']
+
+# Orden natural de los días (el almacén guarda 0 = lunes)
+ORDEN_DIA_SEMANA = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+# Tabla de una dimensión: etiquetas en orden de código, código de cada
+# etiqueta y orden de presentación (alfabético, o el de la semana)
+def _tabla(etiquetas, ordenada):
+    etiquetas = np.asarray(etiquetas, dtype=str)
+    if ordenada:
+        orden = np.arange(len(etiquetas))
+    else:
+        orden = np.argsort(etiquetas, kind='stable')
+    return {
+        'etiquetas': etiquetas,
+        'codigo': {etiqueta: i for i, etiqueta in enumerate(etiquetas)},
+        'orden': orden,
+    }
+
+
+# Construir el diccionario a partir de las columnas categóricas del DataFrame.
+# Las tablas son las mismas categorías que usa cada columna, así que los
+# códigos de la tabla y de las filas coinciden sin recodificar.
+def construir_diccionario(df):
+    diccionario = {}
+    for dim in DIMENSIONES_CATEGORICAS:
+        if dim in df.columns and isinstance(df[dim].dtype, pd.CategoricalDtype):
+            diccionario[dim] = _tabla(df[dim].cat.categories, df[dim].cat.ordered)
+    return diccionario
+
+
+# Etiquetas -> códigos (las etiquetas desconocidas se descartan)
+def codificar(diccionario, dim, valores):
+    if np.isscalar(valores):
+        valores = [valores]
+    codigo = diccionario[dim]['codigo']
+    return np.array([codigo[v] for v in valores if v in codigo], dtype=np.int16)
+
+
+# Códigos -> etiquetas, solo para mostrar
+def decodificar(diccionario, dim, codigos):
+    return diccionario[dim]['etiquetas'][np.asarray(codigos)]
+
+
+# Etiquetas de una dimensión en su orden de presentación
+def etiquetas(diccionario, dim):
+    tabla = diccionario[dim]
+    return list(tabla['etiquetas'][tabla['orden']])
+
+
+# Códigos de una columna: de un DataFrame (categórica o numérica) o
+# directamente de las columnas del almacén, que ya guardan los códigos
+def _codigos(df, dim):
+    columna = df[dim]
+    if not isinstance(columna, pd.Series):
+        return np.asarray(columna)
+    if isinstance(columna.dtype, pd.CategoricalDtype):
+        return columna.cat.codes.to_numpy()
+    return columna.to_numpy()
+
+
+# Máscara booleana de filas que cumplen los filtros {dimensión: valores}.
+# Las dimensiones del diccionario se comparan por código y las numéricas
+# (Año, Trimestre, Mes) directamente sobre sus enteros. df puede ser un
+# DataFrame o las columnas del almacén ({columna: arreglo}).
+def mascara(df, filtros, diccionario):
+    filas = len(df) if isinstance(df, pd.DataFrame) else len(next(iter(df.values())))
+    resultado = np.ones(filas, dtype=bool)
+    for dim, valores in filtros.items():
+        if valores is None:
+            continue
+        codigos = _codigos(df, dim)
+        if dim in diccionario:
+            buscados = codificar(diccionario, dim, valores)
+        else:
+            buscados = np.atleast_1d(np.asarray(valores))
+        if len(buscados) == 1:
+            resultado &= codigos == buscados[0]
+        else:
+            resultado &= np.isin(codigos, buscados)
+    return resultado
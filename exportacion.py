@@ -0,0 +1,186 @@
+# exportacion.py
+# Exportación del cubo para Power BI. Escribe el cubo completo, los roll-ups,
+# el drill-down y el pivot como hojas separadas de un Excel en modo
+# write-only de openpyxl (las filas van directo al archivo, sin armar el
+# libro en memoria) o como un .zip con un Parquet por tabla (requiere
+# pyarrow), que Power BI lee directamente.
+#
+# En el dashboard la exportación corre en un hilo de fondo con progreso y
+# el resultado se descarga; cada exportación escribe su propio archivo
+# temporal en lugar de pisar uno compartido en el servidor, y lo borra al
+# servir la descarga, al iniciar otra o cuando termina la sesión.
+
+import os
+import tempfile
+import threading
+import weakref
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cubo
+
+FORMATOS = {
+    'xlsx': 'Excel (una hoja por tabla)',
+    'parquet': 'Parquet (un archivo por tabla, .zip)',
+}
+EXTENSIONES = {'xlsx': '.xlsx', 'parquet': '.zip'}
+TIPOS_MIME = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/zip',
+}
+FILAS_POR_LOTE = 10_000
+TRABAJADORES = int(os.environ.get('OLAP_EXPORTADORES', '2'))
+
+_ejecutor = ThreadPoolExecutor(max_workers=TRABAJADORES, thread_name_prefix='exportacion')
+
+
+# Tablas que se exportan: hoja -> función que la calcula desde el cubo.
+# Se calculan una a una al escribirlas, no todas de antemano. pivot es el
+# par (filas, columnas) de la tabla dinámica.
+def tablas(cubo_ventas, filtros=None, pivot=('Región', 'Producto')):
+    filas, columnas = pivot
+    return {
+        'Cubo': lambda: cubo.agregar(cubo_ventas, cubo.DIMENSIONES, filtros),
+        'Rollup Año-Producto': lambda: cubo.agregar(cubo_ventas, ['Año', 'Producto'], filtros),
+        'Rollup Trimestre-Región': lambda: cubo.agregar(cubo_ventas, ['Año', 'Trimestre', 'Región'], filtros),
+        'Drilldown Año-Mes-Producto': lambda: cubo.agregar(cubo_ventas, ['Año', 'Mes', 'Producto'], filtros),
+        f'Pivot {filas}-{columnas}': lambda: cubo.pivot(cubo_ventas, filas, columnas, filtros).reset_index(),
+    }
+
+
+def _sin_progreso(fraccion, mensaje):
+    pass
+
+
+def escribir_excel(destino, tablas_exportar, progreso=_sin_progreso):
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    total = len(tablas_exportar)
+    for i, (nombre, calcular) in enumerate(tablas_exportar.items()):
+        progreso(i / total, f"Escribiendo hoja '{nombre}'")
+        datos = calcular()
+        hoja = libro.create_sheet(title=nombre[:31])
+        hoja.append([str(columna) for columna in datos.columns])
+        for inicio in range(0, len(datos), FILAS_POR_LOTE):
+            lote = datos.iloc[inicio:inicio + FILAS_POR_LOTE]
+            for fila in lote.itertuples(index=False, name=None):
+                hoja.append([valor.item() if hasattr(valor, 'item') else valor for valor in fila])
+            progreso((i + min(inicio + FILAS_POR_LOTE, len(datos)) / max(len(datos), 1)) / total,
+                     f"Escribiendo hoja '{nombre}'")
+    libro.save(destino)
+    progreso(1.0, "Exportación terminada")
+    return destino
+
+
+def escribir_parquet(destino, tablas_exportar, progreso=_sin_progreso):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    total = len(tablas_exportar)
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as archivo:
+        for i, (nombre, calcular) in enumerate(tablas_exportar.items()):
+            progreso(i / total, f"Escribiendo '{nombre}.parquet'")
+            datos = calcular()
+            datos.columns = [str(columna) for columna in datos.columns]
+            with archivo.open(f'{nombre}.parquet', 'w') as parquet:
+                pq.write_table(pa.Table.from_pandas(datos, preserve_index=False), parquet)
+    progreso(1.0, "Exportación terminada")
+    return destino
+
+
+ESCRITORES = {'xlsx': escribir_excel, 'parquet': escribir_parquet}
+
+
+# Formatos que se pueden ofrecer con las dependencias instaladas
+def formatos_disponibles():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return {'xlsx': FORMATOS['xlsx']}
+    return dict(FORMATOS)
+
+
+# Escribir las tablas del cubo en el formato pedido
+def exportar(destino, cubo_ventas, filtros=None, formato='xlsx', progreso=_sin_progreso,
+             pivot=('Región', 'Producto')):
+    return ESCRITORES[formato](destino, tablas(cubo_ventas, filtros, pivot), progreso)
+
+
+def _borrar(ruta):
+    if os.path.exists(ruta):
+        os.remove(ruta)
+
+
+# Exportación en curso en un hilo de fondo. progreso/mensaje se actualizan
+# mientras escribe; al terminar, ruta apunta al archivo temporal generado,
+# que se borra también si el Trabajo se descarta sin descargarse (la
+# sesión terminó) o al cerrar el proceso.
+class Trabajo:
+    def __init__(self, formato):
+        self.formato = formato
+        self.progreso = 0.0
+        self.mensaje = "En cola"
+        self.ruta = None
+        self.error = None
+        self.futuro = None
+        self._lock = threading.Lock()
+        self._finalizador = None
+
+    def _terminar(self, ruta):
+        self.ruta = ruta
+        self._finalizador = weakref.finalize(self, _borrar, ruta)
+
+    def _avanzar(self, fraccion, mensaje):
+        with self._lock:
+            self.progreso = min(max(fraccion, 0.0), 1.0)
+            self.mensaje = mensaje
+
+    def estado(self):
+        with self._lock:
+            return self.progreso, self.mensaje
+
+    def terminado(self):
+        return self.futuro is not None and self.futuro.done()
+
+    def nombre_archivo(self):
+        return 'cubo_para_powerbi' + EXTENSIONES[self.formato]
+
+    # Borrar el archivo temporal (al iniciar otra exportación). Si todavía
+    # se está escribiendo, se borra cuando termine.
+    def descartar(self):
+        if self.futuro is not None and not self.futuro.done():
+            self.futuro.add_done_callback(lambda _: self.descartar())
+            return
+        if self._finalizador is not None:
+            self._finalizador()
+        self.ruta = None
+
+    # Contenido del archivo para servir la descarga (se lee una vez, al
+    # pedirla); el temporal se borra en cuanto se leyó
+    def entregar(self):
+        with open(self.ruta, 'rb') as archivo:
+            contenido = archivo.read()
+        self.descartar()
+        return contenido
+
+
+def _ejecutar(trabajo, cubo_ventas, filtros, pivot):
+    descriptor, ruta = tempfile.mkstemp(prefix='cubo_powerbi_', suffix=EXTENSIONES[trabajo.formato])
+    os.close(descriptor)
+    try:
+        exportar(ruta, cubo_ventas, filtros, trabajo.formato, trabajo._avanzar, pivot)
+    except Exception as error:
+        os.remove(ruta)
+        trabajo.error = error
+        trabajo._avanzar(1.0, f"Error al exportar: {error}")
+        return None
+    trabajo._terminar(ruta)
+    return ruta
+
+
+# Lanzar una exportación en segundo plano y devolver su Trabajo
+def iniciar(cubo_ventas, filtros=None, formato='xlsx', pivot=('Región', 'Producto')):
+    trabajo = Trabajo(formato)
+    trabajo.futuro = _ejecutor.submit(_ejecutar, trabajo, cubo_ventas, filtros, pivot)
+    return trabajo
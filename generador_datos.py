@@ -1,64 +1,146 @@
 # generador_datos.py
 
-import pandas as pd
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from datetime import datetime, timedelta
-import random
+import pandas as pd
+
+import almacen
 
-# Parámetros
+# Parámetros por defecto
 num_registros = 5000
 productos = ['A', 'B', 'C', 'D']
 regiones = ['Norte', 'Sur', 'Este', 'Oeste', 'Centro']
-fecha_inicio = datetime(2023, 1, 1)
-fecha_fin = datetime(2024, 12, 31)
-
-# Función para generar una fecha aleatoria entre dos fechas
-def fecha_aleatoria(inicio, fin):
-    delta = fin - inicio
-    return inicio + timedelta(days=random.randint(0, delta.days))
-
-# Función para generar ventas con estacionalidad
-def generar_ventas(fecha, producto, region):
-    mes = fecha.month
-
-    # Base de ventas aleatoria
-    base = random.randint(100, 300)
-
-    # Aumentos por estacionalidad
-    if mes in [3, 4]:  # primavera
-        base *= 1.2
-    elif mes in [11, 12]:  # fin de año
-        base *= 1.5
-    elif mes in [6, 9]:  # ventas bajas
-        base *= 0.8
-
-    # Ajustes por producto
-    if producto == 'A':
-        base *= 1.1
-    elif producto == 'C':
-        base *= 0.95
-
-    # Ajustes por región
-    if region == 'Centro':
-        base *= 1.3
-    elif region == 'Sur':
-        base *= 0.9
-
-    return int(base)
-
-# Generar registros
-data = []
-for _ in range(num_registros):
-    fecha = fecha_aleatoria(fecha_inicio, fecha_fin)
-    producto = random.choice(productos)
-    region = random.choice(regiones)
-    ventas = generar_ventas(fecha, producto, region)
-
-    data.append([fecha, producto, region, ventas])
-
-# Crear DataFrame
-df = pd.DataFrame(data, columns=['Fecha', 'Producto', 'Región', 'Ventas'])
-
-# Guardar CSV
-df.to_csv('ventas.csv', index=False, encoding='utf-8')
-print("Archivo 'ventas.csv' generado con estacionalidad.")
\ No newline at end of file
+fecha_inicio = '2023-01-01'
+fecha_fin = '2024-12-31'
+filas_por_bloque = 1_000_000
+
+# Tablas de multiplicadores (mismo modelo estacional que la versión original)
+# Estacionalidad por mes (índice 1..12)
+FACTOR_MES = np.ones(13)
+FACTOR_MES[[3, 4]] = 1.2    # primavera
+FACTOR_MES[[11, 12]] = 1.5  # fin de año
+FACTOR_MES[[6, 9]] = 0.8    # ventas bajas
+
+# Ajustes por producto y por región (alineados con las listas de arriba)
+FACTOR_PRODUCTO = np.array([{'A': 1.1, 'C': 0.95}.get(p, 1.0) for p in productos])
+FACTOR_REGION = np.array([{'Centro': 1.3, 'Sur': 0.9}.get(r, 1.0) for r in regiones])
+
+
+# Generar un bloque de registros con su propio flujo aleatorio.
+# Devuelve las columnas tipadas del almacén (fechas como días, categorías como códigos).
+def generar_bloque(semilla, filas, dia_inicio, dia_fin):
+    rng = np.random.default_rng(semilla)
+    dias = rng.integers(dia_inicio, dia_fin, endpoint=True, size=filas)
+    producto = rng.integers(0, len(productos), size=filas)
+    region = rng.integers(0, len(regiones), size=filas)
+    base = rng.integers(100, 300, endpoint=True, size=filas).astype(np.float64)
+
+    fechas = dias.astype('datetime64[D]')
+    mes = fechas.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    año = fechas.astype('datetime64[Y]').astype(np.int64) + 1970
+
+    ventas = base * FACTOR_MES[mes] * FACTOR_PRODUCTO[producto] * FACTOR_REGION[region]
+
+    return {
+        'Fecha': dias.astype(np.int32),
+        'Producto': producto.astype(np.int16),
+        'Región': region.astype(np.int16),
+        'Ventas': ventas.astype(np.int32),
+        'Mes': mes.astype(np.int8),
+        'Año': año.astype(np.int16),
+        'Trimestre': ((mes - 1) // 3 + 1).astype(np.int8),
+        'Día_Semana': ((dias + 3) % 7).astype(np.int8),  # 1970-01-01 fue jueves
+    }
+
+
+# Escritores por formato: reciben los bloques en orden
+def escribir_csv(ruta, bloques):
+    filas = 0
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        for columnas in bloques:
+            df = pd.DataFrame({
+                'Fecha': columnas['Fecha'].astype('datetime64[D]'),
+                'Producto': np.asarray(productos)[columnas['Producto']],
+                'Región': np.asarray(regiones)[columnas['Región']],
+                'Ventas': columnas['Ventas'],
+            })
+            df.to_csv(f, index=False, header=filas == 0)
+            filas += len(df)
+    return filas
+
+
+def escribir_columnar(ruta, bloques):
+    temporal = almacen.iniciar_almacen(ruta)
+    filas = 0
+    for columnas in bloques:
+        almacen.escribir_columnas(temporal, columnas)
+        filas += len(columnas['Fecha'])
+    categorias = {'Producto': list(productos), 'Región': list(regiones)}
+    almacen.cerrar_almacen(temporal, ruta, filas, categorias, 'generador_datos.py', time.time())
+    return filas
+
+
+# Repartir los bloques entre procesos. Cada bloque tiene su semilla derivada
+# de la semilla global, así el resultado no depende del número de procesos.
+# Se mantienen como máximo 2 bloques pendientes por proceso para acotar memoria.
+def generar_bloques(total, semilla, dia_inicio, dia_fin, bloque, procesos):
+    tamaños = [min(bloque, total - i) for i in range(0, total, bloque)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamaños))
+
+    if procesos <= 1:
+        for s, n in zip(semillas, tamaños):
+            yield generar_bloque(s, n, dia_inicio, dia_fin)
+        return
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        pendientes = []
+        for s, n in zip(semillas, tamaños):
+            pendientes.append(pool.submit(generar_bloque, s, n, dia_inicio, dia_fin))
+            if len(pendientes) >= 2 * procesos:
+                yield pendientes.pop(0).result()
+        for futuro in pendientes:
+            yield futuro.result()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Genera datos de ventas simulados con estacionalidad.")
+    parser.add_argument('--filas', type=int, default=num_registros, help="Número de registros a generar")
+    parser.add_argument('--inicio', default=fecha_inicio, help="Fecha inicial (AAAA-MM-DD)")
+    parser.add_argument('--fin', default=fecha_fin, help="Fecha final inclusive (AAAA-MM-DD)")
+    parser.add_argument('--semilla', type=int, default=None, help="Semilla para obtener siempre los mismos datos")
+    parser.add_argument('--formato', choices=['csv', 'columnar'], default='csv',
+                        help="csv: ventas.csv | columnar: almacén binario de almacen.py")
+    parser.add_argument('--bloque', type=int, default=filas_por_bloque, help="Filas por bloque escrito a disco")
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help="Procesos generadores")
+    parser.add_argument('--salida', default='ventas.csv', help="Archivo CSV de salida (o CSV base del almacén)")
+    args = parser.parse_args()
+
+    for opcion in ('filas', 'bloque', 'procesos'):
+        if getattr(args, opcion) <= 0:
+            parser.error(f"--{opcion} debe ser un entero positivo")
+    try:
+        inicio, fin = np.datetime64(args.inicio, 'D'), np.datetime64(args.fin, 'D')
+    except ValueError:
+        parser.error("--inicio y --fin deben ser fechas AAAA-MM-DD")
+    if fin < inicio:
+        parser.error("--fin no puede ser anterior a --inicio")
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    dia_inicio = int(np.datetime64(args.inicio, 'D').astype(np.int64))
+    dia_fin = int(np.datetime64(args.fin, 'D').astype(np.int64))
+    bloques = generar_bloques(args.filas, args.semilla, dia_inicio, dia_fin, args.bloque, args.procesos)
+
+    if args.formato == 'csv':
+        filas = escribir_csv(args.salida, bloques)
+        print(f"Archivo '{args.salida}' generado con estacionalidad ({filas:,} registros).")
+    else:
+        destino = almacen.ruta_almacen(args.salida)
+        filas = escribir_columnar(destino, bloques)
+        print(f"Almacén columnar '{destino}' generado con estacionalidad ({filas:,} registros).")
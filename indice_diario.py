@@ -0,0 +1,268 @@
+# indice_diario.py
+# Índice de sumas acumuladas por día para cada Producto x Región, sobre todo
+# el rango de Fecha del almacén. acumulado[d] es lo vendido (y la cantidad de
+# registros) antes del día d, así que el total de cualquier rango de fechas
+# es acumulado[fin] - acumulado[inicio]: dos lecturas y una resta, sin
+# recorrer las filas. Sobre eso salen las ventanas móviles (una resta por
+# día) y la comparación con el mismo período del año anterior.
+#
+# Ocupa días x productos x regiones x 2 enteros (unos cientos de KB para
+# años de datos) y se guarda en el almacén (indice_diario.npz) por versión.
+# Un lote anexado se suma sin recorrer el histórico: sus totales por día se
+# acumulan sobre las filas del acumulado desde su primer día. Para
+# precalcularlo:
+#
+#   python indice_diario.py ventas.csv
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import almacen
+
+ARCHIVO_INDICE = 'indice_diario.npz'
+MEDIDAS = {'suma': 'Ventas', 'conteo': 'Registros'}
+
+
+# Recorrer el almacén por bloques y acumular ventas y registros por día
+def construir(ruta_csv='ventas.csv'):
+    columnas, meta = almacen.abrir_columnas(almacen.ruta_almacen(ruta_csv))
+    productos = np.asarray(meta['categorias']['Producto'])
+    regiones = np.asarray(meta['categorias']['Región'])
+    if meta['filas'] == 0:
+        inicio, dias = 0, 0
+    else:
+        inicio = int(columnas['Fecha'].min())
+        dias = int(columnas['Fecha'].max()) - inicio + 1
+    forma = (dias, len(productos), len(regiones))
+    celdas = int(np.prod(forma))
+
+    suma = np.zeros(celdas, dtype=np.int64)
+    conteo = np.zeros(celdas, dtype=np.int64)
+    for bloque, _ in almacen.bloques_columnas(ruta_csv):
+        plano = (((bloque['Fecha'].astype(np.int64) - inicio) * len(productos) + bloque['Producto'])
+                 * len(regiones) + bloque['Región'])
+        suma += np.rint(np.bincount(plano, weights=bloque['Ventas'], minlength=celdas)).astype(np.int64)
+        conteo += np.bincount(plano, minlength=celdas)
+
+    ceros = np.zeros((1,) + forma[1:], dtype=np.int64)
+    return {
+        'inicio': inicio,
+        'productos': productos,
+        'regiones': regiones,
+        'suma': np.concatenate([ceros, suma.reshape(forma).cumsum(axis=0)]),
+        'conteo': np.concatenate([ceros, conteo.reshape(forma).cumsum(axis=0)]),
+    }
+
+
+# Sumar un lote de filas (columnas del almacén) al índice. Los ejes crecen
+# si el lote trae productos, regiones o días fuera del rango; del acumulado
+# solo cambian las filas posteriores al primer día del lote.
+def extender(indice, columnas, categorias):
+    if len(columnas['Fecha']) == 0:
+        return indice
+    dias = columnas['Fecha'].astype(np.int64)
+    productos = np.asarray(categorias['Producto'])
+    regiones = np.asarray(categorias['Región'])
+    dias_indice = len(indice['suma']) - 1
+    if dias_indice == 0:
+        inicio, fin = int(dias.min()), int(dias.max()) + 1
+    else:
+        inicio = min(indice['inicio'], int(dias.min()))
+        fin = max(indice['inicio'] + dias_indice, int(dias.max()) + 1)
+    forma = (fin - inicio, len(productos), len(regiones))
+    plano = ((dias - inicio) * len(productos) + columnas['Producto']) * len(regiones) + columnas['Región']
+    totales = {
+        'suma': np.rint(np.bincount(plano, weights=columnas['Ventas'], minlength=int(np.prod(forma)))),
+        'conteo': np.bincount(plano, minlength=int(np.prod(forma))),
+    }
+
+    extendido = {'inicio': inicio, 'productos': productos, 'regiones': regiones}
+    antes = indice['inicio'] - inicio if dias_indice else 0
+    primero = int(dias.min()) - inicio
+    for medida, por_dia in totales.items():
+        previo = indice[medida]
+        _, p, r = previo.shape
+        acumulado = np.zeros((forma[0] + 1,) + forma[1:], dtype=np.int64)
+        # Antes del rango previo no había ventas; después se repite el total
+        acumulado[antes:antes + len(previo), :p, :r] = previo
+        acumulado[antes + len(previo):, :p, :r] = previo[-1]
+        acumulado[primero + 1:] += por_dia.astype(np.int64).reshape(forma)[primero:].cumsum(axis=0)
+        extendido[medida] = acumulado
+    return extendido
+
+
+def guardar(indice, ruta, version=None):
+    temporal = ruta + '.tmp.npz'
+    np.savez(temporal, version=str(version), **indice)
+    os.replace(temporal, ruta)
+
+
+def _abrir(ruta):
+    with np.load(ruta) as datos:
+        indice = {nombre: datos[nombre] for nombre in datos.files if nombre != 'version'}
+        indice['inicio'] = int(indice['inicio'])
+        return indice, str(datos['version'])
+
+
+# Índice del almacén: se reutiliza el guardado si es de la versión actual
+def cargar(ruta_csv='ventas.csv'):
+    version = almacen.preparar(ruta_csv)
+    archivo = os.path.join(almacen.ruta_almacen(ruta_csv), ARCHIVO_INDICE)
+    if os.path.exists(archivo):
+        indice, version_indice = _abrir(archivo)
+        if version_indice == str(version):
+            return indice
+    indice = construir(ruta_csv)
+    guardar(indice, archivo, version)
+    return indice
+
+
+# Extender el índice guardado con un lote anexado al almacén, si era de la
+# versión anterior; si no, se reconstruye en el próximo cargar()
+def anexar(ruta_csv, columnas, meta_almacen, version_anterior):
+    archivo = os.path.join(almacen.ruta_almacen(ruta_csv), ARCHIVO_INDICE)
+    if not os.path.exists(archivo):
+        return None
+    indice, version_indice = _abrir(archivo)
+    if version_indice != str(version_anterior):
+        return None
+    indice = extender(indice, columnas, meta_almacen['categorias'])
+    guardar(indice, archivo, meta_almacen['version'])
+    return indice
+
+
+def _dias(fechas):
+    return (np.asarray(fechas, dtype='datetime64[D]') - np.datetime64(0, 'D')).astype(np.int64)
+
+
+# Primer y último día con datos
+def limites(indice):
+    ultimo = indice['inicio'] + len(indice['suma']) - 2
+    return (np.datetime64(indice['inicio'], 'D').astype(object),
+            np.datetime64(max(ultimo, indice['inicio']), 'D').astype(object))
+
+
+# Acumulados (días + 1) de las celdas que admiten los filtros de Producto y
+# Región; las demás dimensiones no aplican (el tiempo lo da el rango)
+def _acumulado(indice, medida, filtros=None):
+    filtros = filtros or {}
+    seleccion = []
+    for dim, miembros in (('Producto', indice['productos']), ('Región', indice['regiones'])):
+        valores = filtros.get(dim)
+        seleccion.append(slice(None) if valores is None else np.flatnonzero(np.isin(miembros, valores)))
+    return indice[medida][:, seleccion[0]][:, :, seleccion[1]].sum(axis=(1, 2))
+
+
+# Posición en el acumulado de lo vendido antes de cada día
+def _posicion(indice, dias):
+    return np.clip(np.asarray(dias) - indice['inicio'], 0, len(indice['suma']) - 1)
+
+
+# Totales de ventas y registros entre dos fechas (ambas incluidas)
+def rango(indice, desde, hasta, filtros=None):
+    inicio = _posicion(indice, _dias(desde))
+    fin = _posicion(indice, _dias(hasta) + 1)
+    resultado = {}
+    for medida in MEDIDAS:
+        acumulado = _acumulado(indice, medida, filtros)
+        resultado[medida] = int(acumulado[fin] - acumulado[inicio]) if fin > inicio else 0
+    return resultado
+
+
+# Ventas y registros entre dos fechas agrupados por 'por' (Fecha, Producto
+# y/o Región), como un groupby: solo los grupos con registros, ordenados.
+# Por día es una resta de filas consecutivas del acumulado; sin Fecha, una
+# sola resta por celda.
+def agrupar(indice, por, desde, hasta, filtros=None):
+    filtros = filtros or {}
+    inicio = int(_posicion(indice, _dias(desde)))
+    fin = max(int(_posicion(indice, _dias(hasta) + 1)), inicio)
+    ejes = {'Fecha': np.datetime64(indice['inicio'], 'D') + np.arange(inicio, fin)}
+    seleccion = []
+    for dim, miembros in (('Producto', indice['productos']), ('Región', indice['regiones'])):
+        valores = filtros.get(dim)
+        posiciones = np.arange(len(miembros)) if valores is None else np.flatnonzero(np.isin(miembros, valores))
+        ejes[dim] = miembros[posiciones]
+        seleccion.append(posiciones)
+
+    sumar = tuple(i for i, dim in enumerate(ejes) if dim not in por)
+    reducidos = {}
+    for medida in MEDIDAS:
+        acumulado = indice[medida][:, seleccion[0]][:, :, seleccion[1]]
+        if 'Fecha' in por:
+            valores = np.diff(acumulado[inicio:fin + 1], axis=0)
+        else:
+            valores = (acumulado[fin] - acumulado[inicio])[np.newaxis]
+        reducidos[medida] = valores.sum(axis=sumar)
+
+    con_datos = np.atleast_1d(reducidos['conteo'] > 0)
+    resultado = {}
+    if por:
+        rejilla = np.meshgrid(*[ejes[dim] for dim in ejes if dim in por], indexing='ij')
+        resultado = {dim: etiquetas[con_datos] for dim, etiquetas in zip([d for d in ejes if d in por], rejilla)}
+    for medida, columna in MEDIDAS.items():
+        resultado[columna] = np.atleast_1d(reducidos[medida])[con_datos]
+    tabla = pd.DataFrame(resultado, columns=list(por) + list(MEDIDAS.values()))
+    if 'Fecha' in por:
+        tabla['Fecha'] = tabla['Fecha'].astype('datetime64[ns]')
+    return tabla.sort_values(list(por), kind='stable', ignore_index=True) if por else tabla
+
+
+# Mismo rango un año antes y variación relativa de las ventas
+def interanual(indice, desde, hasta, filtros=None):
+    actual = rango(indice, desde, hasta, filtros)
+    un_año = pd.DateOffset(years=1)
+    anterior = rango(indice, pd.Timestamp(desde) - un_año, pd.Timestamp(hasta) - un_año, filtros)
+    variacion = (actual['suma'] - anterior['suma']) / anterior['suma'] if anterior['suma'] else None
+    return {'actual': actual, 'anterior': anterior, 'variacion': variacion}
+
+
+# Cantidad de días con al menos una venta bajo los filtros. Además de
+# Producto y Región admite Año, Trimestre y Mes, que se aplican a cada día.
+# Es exacta: sale de los registros por día del mismo índice.
+def dias_con_ventas(indice, filtros=None):
+    filtros = filtros or {}
+    con_ventas = np.diff(_acumulado(indice, 'conteo', filtros)) > 0
+    fechas = np.datetime64(indice['inicio'], 'D') + np.arange(len(con_ventas))
+    año = fechas.astype('datetime64[Y]').astype(np.int64) + 1970
+    mes = fechas.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    calendario = {'Año': año, 'Mes': mes, 'Trimestre': (mes - 1) // 3 + 1}
+    for dim, valores in calendario.items():
+        if filtros.get(dim) is not None:
+            con_ventas &= np.isin(valores, filtros[dim])
+    return int(con_ventas.sum())
+
+
+# Ventas de los últimos 'ventana' días hasta cada fecha del rango, y lo
+# mismo un año antes. Los días cuya ventana no cabe en los datos quedan
+# vacíos (NaN) en lugar de sumar de menos.
+def movil(indice, ventana, desde, hasta, filtros=None):
+    fechas = pd.date_range(pd.Timestamp(desde), pd.Timestamp(hasta), freq='D')
+    acumulado = _acumulado(indice, 'suma', filtros).astype(np.float64)
+    ultimo = indice['inicio'] + len(indice['suma']) - 1
+
+    def sumas(dias):
+        fin, inicio = dias + 1, dias + 1 - ventana
+        valores = acumulado[_posicion(indice, fin)] - acumulado[_posicion(indice, inicio)]
+        return np.where((inicio >= indice['inicio']) & (fin <= ultimo), valores, np.nan)
+
+    return pd.DataFrame({
+        'Fecha': fechas,
+        'Ventas': sumas(_dias(fechas.values)),
+        'Año anterior': sumas(_dias((fechas - pd.DateOffset(years=1)).values)),
+    })
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Índice diario de sumas acumuladas por Producto x Región.")
+    parser.add_argument('csv', nargs='?', default='ventas.csv', help="CSV base del almacén")
+    args = parser.parse_args()
+
+    indice = cargar(args.csv)
+    primero, ultimo = limites(indice)
+    print(f"Índice guardado en {os.path.join(almacen.ruta_almacen(args.csv), ARCHIVO_INDICE)} "
+          f"({primero} a {ultimo}, {indice['suma'].nbytes * 2 / 1024:,.0f} KB)")
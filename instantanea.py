@@ -0,0 +1,231 @@
+# instantanea.py
+# Instantánea en disco del motor OLAP ya calculado: cubo de agregados,
+# índice diario, bocetos de cuantiles y vistas materializadas del retículo
+# con sus frecuencias de consulta. Se guarda como un directorio de .npy
+# (ventas_columnar/instantanea/) que al arrancar se abre con memory-mapping,
+# así que reiniciar o redesplegar el servidor no vuelve a parsear el CSV ni
+# a recalcular agregados: solo se leen las páginas que usan las consultas.
+#
+# La instantánea vale mientras coincida su clave: huella (sha256) del CSV
+# de origen, versión del esquema del almacén y de la instantánea, versión
+# de los datos (cambia al anexar) y precisión de los bocetos. Al anexar un
+# lote se vuelve a escribir con el cubo combinado y las mismas vistas,
+# reducidas de él, en lugar de quedar vieja.
+#
+# La versión de los datos está en la clave porque el almacén puede tener
+# lotes anexados que el CSV no tiene: la huella sola no alcanza. Por eso la
+# instantánea no sobrevive a una reingesta, aunque el CSV sea idéntico: el
+# almacén nuevo tiene otra versión y cerrar_almacen borra el directorio
+# anterior con la instantánea adentro. La huella sirve para no reingerir:
+# si un deploy solo cambia la fecha del CSV, almacen.preparar ve el mismo
+# contenido y conserva el almacén, su versión y esta instantánea. Solo se
+# reingiere (y se pierde) si cambia el contenido, el esquema del almacén o
+# falta su meta.json.
+#
+# El calentamiento ejecuta las vistas por defecto del dashboard (año más
+# reciente, pivot Región x Producto, roll-up por Trimestre, ...) para que
+# el retículo las materialice antes de guardar. Conviene correrlo antes de
+# levantar Streamlit:
+#
+#   python instantanea.py ventas.csv --calentar
+#   streamlit run app_ventas.py
+#
+# o dejar que el propio dashboard caliente al cargar con OLAP_CALENTAR=1.
+# Calentar también deja lista la muestra del modo aproximado si el almacén
+# no la tiene.
+
+import json
+import os
+import shutil
+from collections import Counter
+
+import numpy as np
+
+import almacen
+import bocetos
+import cubo
+import reticulo
+
+DIRECTORIO = 'instantanea'
+VERSION_INSTANTANEA = 1
+CALENTAR = os.environ.get('OLAP_CALENTAR', '') not in ('', '0')
+
+
+def ruta_instantanea(ruta_csv):
+    return os.path.join(almacen.ruta_almacen(ruta_csv), DIRECTORIO)
+
+
+# Clave con la que se valida la instantánea contra el almacén actual (o
+# contra meta_almacen, el meta.json que un anexado está por publicar)
+def clave(ruta_csv='ventas.csv', meta_almacen=None):
+    if meta_almacen is None:
+        almacen.preparar(ruta_csv)
+        meta_almacen = almacen.abrir_columnas(almacen.ruta_almacen(ruta_csv))[1]
+    return {
+        'hash_origen': meta_almacen.get('hash_origen'),
+        'version_esquema': almacen.VERSION_ESQUEMA,
+        'version_instantanea': VERSION_INSTANTANEA,
+        'version': meta_almacen['version'],
+        'precision_bocetos': bocetos.PRECISION,
+    }
+
+
+def _guardar_arreglos(directorio, prefijo, arreglos):
+    for nombre, arreglo in arreglos.items():
+        np.save(os.path.join(directorio, f'{prefijo}.{nombre}.npy'), np.ascontiguousarray(arreglo))
+    return list(arreglos)
+
+
+def _abrir_arreglos(directorio, prefijo, nombres):
+    return {nombre: np.load(os.path.join(directorio, f'{prefijo}.{nombre}.npy'), mmap_mode='r')
+            for nombre in nombres}
+
+
+def _guardar_cubo(directorio, prefijo, cubo_ventas):
+    arreglos = {medida: cubo_ventas[medida] for medida in cubo.MEDIDAS}
+    arreglos.update({f'miembros_{i}': cubo_ventas['miembros'][dim] for i, dim in enumerate(cubo.DIMENSIONES)})
+    _guardar_arreglos(directorio, prefijo, arreglos)
+    return {'entero': bool(cubo_ventas['entero'])}
+
+
+def _abrir_cubo(directorio, prefijo, info):
+    arreglos = _abrir_arreglos(directorio, prefijo, list(cubo.MEDIDAS))
+    miembros = _abrir_arreglos(directorio, prefijo, [f'miembros_{i}' for i in range(len(cubo.DIMENSIONES))])
+    return dict(
+        arreglos,
+        dimensiones=list(cubo.DIMENSIONES),
+        # Los miembros son chicos y se comparan con isin: se leen enteros
+        miembros={dim: np.asarray(miembros[f'miembros_{i}']) for i, dim in enumerate(cubo.DIMENSIONES)},
+        entero=info['entero'],
+    )
+
+
+# Separar arreglos de escalares (los escalares van a meta.json)
+def _partir(datos):
+    arreglos = {nombre: valor for nombre, valor in datos.items() if isinstance(valor, np.ndarray) and valor.ndim}
+    escalares = {nombre: valor.item() if hasattr(valor, 'item') else valor
+                 for nombre, valor in datos.items() if nombre not in arreglos}
+    return arreglos, escalares
+
+
+# Escribir cubo, vistas, frecuencias, índice diario y bocetos en un
+# directorio temporal y reemplazar la instantánea anterior de una vez
+def _escribir(ruta_csv, cubo_ventas, vistas, frecuencias, diario, bocetos_ventas, meta_almacen=None):
+    ruta = ruta_instantanea(ruta_csv)
+    temporal = ruta + '.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    meta = {'clave': clave(ruta_csv, meta_almacen), 'cubo': _guardar_cubo(temporal, 'cubo', cubo_ventas), 'vistas': []}
+    for i, (nodo, vista) in enumerate(vistas.items()):
+        info = _guardar_cubo(temporal, f'vista{i}', vista)
+        meta['vistas'].append(dict(info, dimensiones=sorted(nodo)))
+    meta['frecuencias'] = [[sorted(dims), n] for dims, n in frecuencias.items()]
+    for nombre, datos in (('diario', diario), ('bocetos', bocetos_ventas)):
+        if datos is not None:
+            arreglos, escalares = _partir(datos)
+            meta[nombre] = {'arreglos': _guardar_arreglos(temporal, nombre, arreglos), 'escalares': escalares}
+
+    with open(os.path.join(temporal, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(ruta, ignore_errors=True)
+    os.rename(temporal, ruta)
+    return ruta
+
+
+# Guardar el estado del motor como instantánea
+def guardar(motor, ruta_csv='ventas.csv'):
+    vistas, frecuencias = motor.reticulo.estado()
+    return _escribir(ruta_csv, motor.cubo, vistas, frecuencias, motor.diario, motor.bocetos)
+
+
+def _leer_meta(ruta):
+    archivo = os.path.join(ruta, 'meta.json')
+    if not os.path.exists(archivo):
+        return None
+    with open(archivo, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Reescribir la instantánea después de anexar un lote, si era de la versión
+# anterior del almacén: el cubo combinado, las mismas vistas reducidas de
+# él, las mismas frecuencias y el índice diario y los bocetos ya extendidos
+# (si la instantánea los tenía y no se pudieron extender, queda vieja y se
+# rehace al cargar)
+def anexar(ruta_csv, cubo_ventas, version_anterior, diario=None, bocetos_ventas=None, meta_almacen=None):
+    meta = _leer_meta(ruta_instantanea(ruta_csv))
+    if meta is None or meta['clave'] != dict(clave(ruta_csv), version=version_anterior):
+        return None
+    if ('diario' in meta and diario is None) or ('bocetos' in meta and bocetos_ventas is None):
+        return None
+    vistas = {frozenset(info['dimensiones']): reticulo.reducir(cubo_ventas, info['dimensiones'])
+              for info in meta['vistas']}
+    frecuencias = Counter({frozenset(dims): n for dims, n in meta['frecuencias']})
+    return _escribir(ruta_csv, cubo_ventas, vistas, frecuencias, diario, bocetos_ventas, meta_almacen)
+
+
+# Abrir la instantánea si su clave coincide con el almacén actual. Devuelve
+# None si no existe o quedó vieja.
+def abrir(ruta_csv='ventas.csv'):
+    ruta = ruta_instantanea(ruta_csv)
+    meta = _leer_meta(ruta)
+    if meta is None or meta['clave'] != clave(ruta_csv):
+        return None
+
+    estado = {
+        'cubo': _abrir_cubo(ruta, 'cubo', meta['cubo']),
+        'vistas': {frozenset(info['dimensiones']): _abrir_cubo(ruta, f'vista{i}', info)
+                   for i, info in enumerate(meta['vistas'])},
+        'frecuencias': Counter({frozenset(dims): n for dims, n in meta['frecuencias']}),
+    }
+    for nombre in ('diario', 'bocetos'):
+        if nombre in meta:
+            estado[nombre] = dict(_abrir_arreglos(ruta, nombre, meta[nombre]['arreglos']),
+                                  **meta[nombre]['escalares'])
+    return estado
+
+
+# Vistas que pide el dashboard al abrirse, sobre el año más reciente
+def vistas_iniciales(motor):
+    año = motor.miembros('Año')[-1]
+    filtro_año = {'Año': [año]}
+    return {
+        'totales': lambda: motor.totales(),
+        'miembros': lambda: [motor.miembros(dim, filtro_año) for dim in ('Producto', 'Región')],
+        'año_actual': lambda: motor.totales(filtro_año),
+        'slice_mensual': lambda: motor.rollup(['Mes'], filtro_año),
+        'rollup_año': lambda: motor.rollup(['Año', 'Producto'], filtro_año),
+        'rollup_trimestre': lambda: motor.rollup(['Trimestre', 'Producto'], filtro_año),
+        'drilldown': lambda: motor.drilldown(['Año', 'Trimestre', 'Mes', 'Producto', 'Región'], filtro_año),
+        'pivot': lambda: motor.pivot('Región', 'Producto', filtro_año),
+        'cuantiles': lambda: (motor.cuantiles(), motor.cuantiles(filtro_año)),
+    }
+
+
+# Ejecutar las vistas iniciales (quedan en la caché de consultas del
+# proceso) y materializar en el retículo las que piden
+def calentar(motor):
+    for consulta in vistas_iniciales(motor).values():
+        consulta()
+    return motor.reticulo.seleccionar()
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    import muestras
+    from motor_olap import MotorOLAP
+
+    parser = argparse.ArgumentParser(description="Instantánea en disco del motor OLAP para arrancar en caliente.")
+    parser.add_argument('csv', nargs='?', default='ventas.csv', help="CSV base del almacén")
+    parser.add_argument('--calentar', action='store_true',
+                        help="Ejecutar las vistas por defecto del dashboard y materializarlas antes de guardar")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    motor = MotorOLAP.desde_almacen(args.csv, particionado=True)
+    if args.calentar:
+        print(f"Vistas materializadas: {', '.join(calentar(motor)) or 'ninguna'}")
+        muestras.cargar_estimaciones(args.csv)
+    print(f"Instantánea guardada en {guardar(motor, args.csv)} ({time.perf_counter() - inicio:.2f} s)")
@@ -0,0 +1,166 @@
+# instrumentacion.py
+# Instrumentación liviana del camino crítico: cronómetros y contadores para
+# la carga de datos, las operaciones OLAP y la construcción de gráficos.
+# Se activa con OLAP_DIAGNOSTICO=1; desactivada, medir() devuelve un
+# contexto vacío compartido y no toma tiempos ni locks.
+#
+# Con OLAP_METRICAS=ruta.jsonl cada rerun agrega una línea JSON con sus
+# eventos y los contadores acumulados del proceso (particiones leídas y
+# podadas, vistas del retículo usadas, consultas agrupadas, vistas de la
+# página reutilizadas). Los percentiles por operación de ese archivo y los
+# últimos contadores se obtienen con:
+#
+#   python instrumentacion.py ruta.jsonl
+
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+ACTIVO = os.environ.get('OLAP_DIAGNOSTICO', '') not in ('', '0')
+RUTA_METRICAS = os.environ.get('OLAP_METRICAS')
+MUESTRAS_POR_OPERACION = 1000
+
+_NULO = contextlib.nullcontext()
+_lock = threading.Lock()
+_tiempos = defaultdict(lambda: deque(maxlen=MUESTRAS_POR_OPERACION))
+_contadores = Counter()
+# Eventos del rerun en curso: Streamlit ejecuta cada sesión en su propio hilo
+_local = threading.local()
+
+
+class _Medicion:
+    __slots__ = ('nombre', 'inicio')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registrar(self.nombre, time.perf_counter() - self.inicio)
+        return False
+
+
+# Cronometrar un bloque:  with medir('olap.pivot'): ...
+def medir(nombre):
+    if not ACTIVO:
+        return _NULO
+    return _Medicion(nombre)
+
+
+def registrar(nombre, segundos):
+    with _lock:
+        _tiempos[nombre].append(segundos)
+    eventos = getattr(_local, 'eventos', None)
+    if eventos is not None:
+        eventos.append((nombre, segundos))
+
+
+def contar(nombre, n=1):
+    if ACTIVO:
+        with _lock:
+            _contadores[nombre] += n
+
+
+def iniciar_rerun():
+    if ACTIVO:
+        _local.eventos = []
+        _local.inicio = time.perf_counter()
+
+
+# Cerrar el rerun en curso: devuelve (duración total, eventos) y, si hay
+# archivo de métricas, agrega el rerun como una línea JSON
+def fin_rerun():
+    eventos = getattr(_local, 'eventos', None)
+    if not ACTIVO or eventos is None:
+        return 0.0, []
+    total = time.perf_counter() - _local.inicio
+    _local.eventos = None
+    registrar('rerun', total)
+    if RUTA_METRICAS:
+        linea = {
+            'ts': time.time(),
+            'rerun_ms': total * 1000,
+            'eventos': [{'op': nombre, 'ms': segundos * 1000} for nombre, segundos in eventos],
+            'contadores': contadores(),
+        }
+        with _lock, open(RUTA_METRICAS, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(linea, ensure_ascii=False) + '\n')
+    return total, eventos
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    k = (len(ordenados) - 1) * p / 100
+    bajo = int(k)
+    alto = min(bajo + 1, len(ordenados) - 1)
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (k - bajo)
+
+
+# Percentiles de listas de tiempos en ms por nombre
+def resumir(tiempos_ms):
+    return {
+        nombre: {
+            'n': len(valores),
+            'p50_ms': percentil(valores, 50),
+            'p90_ms': percentil(valores, 90),
+            'p99_ms': percentil(valores, 99),
+            'max_ms': max(valores),
+        }
+        for nombre, valores in sorted(tiempos_ms.items()) if valores
+    }
+
+
+# Percentiles por operación de las últimas mediciones del proceso
+def resumen():
+    with _lock:
+        copia = {nombre: [s * 1000 for s in valores] for nombre, valores in _tiempos.items()}
+    return resumir(copia)
+
+
+def contadores():
+    with _lock:
+        return dict(_contadores)
+
+
+# Percentiles por operación a partir de un archivo OLAP_METRICAS
+def resumen_archivo(ruta):
+    tiempos = defaultdict(list)
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            rerun = json.loads(linea)
+            tiempos['rerun'].append(rerun['rerun_ms'])
+            for evento in rerun['eventos']:
+                tiempos[evento['op']].append(evento['ms'])
+    return resumir(tiempos)
+
+
+# Contadores acumulados del proceso según la última línea del archivo
+def contadores_archivo(ruta):
+    ultimos = {}
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            ultimos = json.loads(linea).get('contadores', ultimos)
+    return ultimos
+
+
+if __name__ == '__main__':
+    import sys
+
+    ruta = sys.argv[1] if len(sys.argv) > 1 else (RUTA_METRICAS or 'metricas.jsonl')
+    print(f"{'operación':<28} {'n':>7} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'máx ms':>10}")
+    for nombre, r in resumen_archivo(ruta).items():
+        print(f"{nombre:<28} {r['n']:>7} {r['p50_ms']:>10.2f} {r['p90_ms']:>10.2f} "
+              f"{r['p99_ms']:>10.2f} {r['max_ms']:>10.2f}")
+    contados = contadores_archivo(ruta)
+    if contados:
+        print(f"\n{'contador':<32} {'total':>7}")
+        for nombre, n in sorted(contados.items()):
+            print(f"{nombre:<32} {n:>7,}")
@@ -0,0 +1,470 @@
+# lenguaje_olap.py
+# Lenguaje declarativo de consultas sobre el esquema de ventas:
+#
+#   SELECT SUM(Ventas), AVG(Ventas) BY Año, Producto
+#   WHERE Región IN ('Norte', 'Sur') AND Trimestre BETWEEN 2 AND 3
+#   ORDER BY Ventas DESC LIMIT 10
+#
+#   SELECT Ventas, Registros BY Fecha WHERE Fecha BETWEEN '2024-03-01' AND '2024-03-31'
+#
+# Medidas: SUM, COUNT, MIN, MAX y AVG de Ventas (COUNT(*) también), o el
+# nombre de su columna de salida (Ventas, Registros, Mínimo, Máximo,
+# Promedio). Dimensiones: Fecha, Año, Trimestre, Mes, Producto, Región y
+# Día_Semana, sin importar mayúsculas ni tildes. Condiciones: =, IN (...) y
+# BETWEEN ... AND ..., unidas con AND.
+#
+# El planificador primero poda los filtros (intersección por dimensión,
+# valores sin datos, filtros que no excluyen nada, fechas fuera del rango
+# del almacén) y después elige la fuente más barata que responde:
+#
+#   cubo     vista materializada más chica del retículo (o el cubo base)
+#   diario   índice de sumas acumuladas por día (rangos de Fecha, BY Fecha)
+#   filas    particiones Año/Mes que admiten los filtros y un groupby
+#
+# EXPLAIN (o --explain) muestra los pasos del plan y su costo en celdas o
+# filas leídas:
+#
+#   python lenguaje_olap.py "EXPLAIN SELECT Ventas BY Región WHERE Año = 2024"
+
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import cache_consultas
+import cubo
+import dimensiones
+import indice_diario
+import instrumentacion
+import particiones
+import reticulo
+
+# Función de agregación -> columna de salida
+FUNCIONES = {'SUM': 'Ventas', 'COUNT': 'Registros', 'MIN': 'Mínimo', 'MAX': 'Máximo', 'AVG': 'Promedio'}
+DIMENSIONES = ['Fecha', 'Año', 'Trimestre', 'Mes', 'Producto', 'Región', 'Día_Semana']
+NUMERICAS = ['Año', 'Trimestre', 'Mes']
+
+# Lo que responde el índice diario: grupos, filtros y medidas
+DIARIO_DIMENSIONES = {'Fecha', 'Producto', 'Región'}
+DIARIO_MEDIDAS = {'Ventas', 'Registros', 'Promedio'}
+
+PALABRAS = {'EXPLAIN', 'SELECT', 'BY', 'GROUP', 'WHERE', 'AND', 'IN', 'BETWEEN', 'ORDER', 'ASC', 'DESC', 'LIMIT'}
+
+_TOKEN = re.compile(r"""\s*(?:
+    '(?P<texto>[^']*)' | "(?P<texto2>[^"]*)"
+  | (?P<numero>-?\d+)
+  | (?P<nombre>[^\W\d]\w*)
+  | (?P<simbolo>[(),=*])
+)""", re.VERBOSE)
+
+
+@dataclass
+class Consulta:
+    medidas: list                 # columnas de salida, en orden
+    dimensiones: list = field(default_factory=list)
+    condiciones: list = field(default_factory=list)   # (dimensión, operador, valores)
+    orden: tuple = None           # (columna, descendente)
+    limite: int = None
+    explicar: bool = False
+
+
+@dataclass
+class Plan:
+    consulta: Consulta
+    fuente: str                   # 'cubo', 'diario', 'filas' o 'vacío'
+    filtros: dict                 # filtros ya podados {dimensión: [valores]}
+    fechas: tuple = None          # (desde, hasta) de Fecha, incluidas
+    pasos: list = field(default_factory=list)         # (paso, detalle, costo)
+
+    @property
+    def costo(self):
+        return sum(costo for _, _, costo in self.pasos)
+
+
+def _clave(nombre):
+    sin_tildes = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode()
+    return sin_tildes.lower()
+
+
+_NOMBRES_DIMENSION = {_clave(dim): dim for dim in DIMENSIONES}
+_NOMBRES_DIMENSION['anio'] = 'Año'
+_NOMBRES_MEDIDA = {_clave(columna): columna for columna in FUNCIONES.values()}
+
+
+# --- Análisis léxico y sintáctico ---------------------------------------
+
+# Tokens (tipo, valor); las palabras clave se pasan a mayúsculas
+def tokenizar(texto):
+    tokens = []
+    posicion = 0
+    texto = texto.strip().rstrip(';')
+    while posicion < len(texto):
+        encontrado = _TOKEN.match(texto, posicion)
+        if encontrado is None or encontrado.end() == posicion:
+            raise ValueError(f"Símbolo inesperado en la posición {posicion}: {texto[posicion:posicion + 10]!r}")
+        posicion = encontrado.end()
+        tipo = encontrado.lastgroup
+        if tipo is None:
+            continue
+        valor = encontrado.group(tipo)
+        if tipo == 'texto2':
+            tipo = 'texto'
+        elif tipo == 'numero':
+            valor = int(valor)
+        elif tipo == 'nombre' and valor.upper() in PALABRAS | set(FUNCIONES):
+            tipo, valor = 'palabra', valor.upper()
+        tokens.append((tipo, valor))
+    return tokens
+
+
+class _Lector:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.posicion = 0
+
+    def actual(self):
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else (None, None)
+
+    def avanzar(self):
+        token = self.actual()
+        self.posicion += 1
+        return token
+
+    # Consumir el token si es la palabra o el símbolo indicado
+    def aceptar(self, valor):
+        if self.actual()[1] == valor and self.actual()[0] in ('palabra', 'simbolo'):
+            self.posicion += 1
+            return True
+        return False
+
+    def esperar(self, valor):
+        if not self.aceptar(valor):
+            encontrado = self.actual()[1]
+            raise ValueError(f"Se esperaba {valor} y se encontró {'el final' if encontrado is None else encontrado!r}")
+
+    def nombre(self, que):
+        tipo, valor = self.avanzar()
+        if tipo != 'nombre':
+            raise ValueError(f"Se esperaba {que} y se encontró {'el final' if valor is None else valor!r}")
+        return valor
+
+    def valor(self):
+        tipo, valor = self.avanzar()
+        if tipo not in ('texto', 'numero', 'nombre'):
+            raise ValueError(f"Se esperaba un valor y se encontró {'el final' if valor is None else valor!r}")
+        return valor
+
+
+def _dimension(nombre):
+    try:
+        return _NOMBRES_DIMENSION[_clave(nombre)]
+    except KeyError:
+        raise ValueError(f"Dimensión desconocida: {nombre} (disponibles: {', '.join(DIMENSIONES)})") from None
+
+
+def _medida(lector):
+    tipo, valor = lector.avanzar()
+    if tipo == 'palabra' and valor in FUNCIONES:
+        lector.esperar('(')
+        if not lector.aceptar('*'):
+            argumento = lector.nombre('Ventas')
+            if _clave(argumento) != 'ventas':
+                raise ValueError(f"Solo se agrega la medida Ventas, no {argumento}")
+        elif valor != 'COUNT':
+            raise ValueError(f"{valor}(*) no tiene sentido; use {valor}(Ventas)")
+        lector.esperar(')')
+        return FUNCIONES[valor]
+    if tipo == 'nombre' and _clave(valor) in _NOMBRES_MEDIDA:
+        return _NOMBRES_MEDIDA[_clave(valor)]
+    raise ValueError(f"Medida desconocida: {valor} (use SUM, COUNT, MIN, MAX o AVG de Ventas)")
+
+
+# Valor de una condición con el tipo de su dimensión
+def _convertir(dim, valor):
+    if dim == 'Fecha':
+        try:
+            return np.datetime64(str(valor), 'D')
+        except ValueError:
+            raise ValueError(f"Fecha inválida: {valor!r} (formato AAAA-MM-DD)") from None
+    if dim in NUMERICAS:
+        if not isinstance(valor, int):
+            raise ValueError(f"{dim} es numérica y se comparó con {valor!r}")
+        return valor
+    return str(valor)
+
+
+def _condicion(lector):
+    dim = _dimension(lector.nombre('una dimensión'))
+    if lector.aceptar('='):
+        valor = _convertir(dim, lector.valor())
+        return (dim, 'BETWEEN', (valor, valor)) if dim == 'Fecha' else (dim, 'IN', [valor])
+    if lector.aceptar('IN'):
+        if dim == 'Fecha':
+            raise ValueError("Fecha se filtra con = o BETWEEN")
+        lector.esperar('(')
+        valores = [_convertir(dim, lector.valor())]
+        while lector.aceptar(','):
+            valores.append(_convertir(dim, lector.valor()))
+        lector.esperar(')')
+        return dim, 'IN', valores
+    if lector.aceptar('BETWEEN'):
+        desde = _convertir(dim, lector.valor())
+        lector.esperar('AND')
+        return dim, 'BETWEEN', (desde, _convertir(dim, lector.valor()))
+    raise ValueError(f"Condición incompleta sobre {dim}: use =, IN (...) o BETWEEN ... AND ...")
+
+
+# Texto -> Consulta. Los errores de sintaxis se informan con ValueError.
+def analizar(texto):
+    lector = _Lector(tokenizar(texto))
+    explicar = lector.aceptar('EXPLAIN')
+    lector.esperar('SELECT')
+    medidas = [_medida(lector)]
+    while lector.aceptar(','):
+        medidas.append(_medida(lector))
+
+    dims = []
+    if lector.aceptar('GROUP'):
+        lector.esperar('BY')
+        dims.append(_dimension(lector.nombre('una dimensión')))
+    elif lector.aceptar('BY'):
+        dims.append(_dimension(lector.nombre('una dimensión')))
+    if dims:
+        while lector.aceptar(','):
+            dims.append(_dimension(lector.nombre('una dimensión')))
+
+    condiciones = []
+    if lector.aceptar('WHERE'):
+        condiciones.append(_condicion(lector))
+        while lector.aceptar('AND'):
+            condiciones.append(_condicion(lector))
+
+    orden = None
+    if lector.aceptar('ORDER'):
+        lector.esperar('BY')
+        nombre = lector.nombre('una columna')
+        clave = _clave(nombre)
+        columna = _NOMBRES_MEDIDA.get(clave) or _NOMBRES_DIMENSION.get(clave) or nombre
+        descendente = lector.aceptar('DESC')
+        if not descendente:
+            lector.aceptar('ASC')
+        orden = (columna, descendente)
+
+    limite = None
+    if lector.aceptar('LIMIT'):
+        tipo, limite = lector.avanzar()
+        if tipo != 'numero' or limite < 0:
+            raise ValueError("LIMIT necesita un entero no negativo")
+
+    if lector.actual()[1] is not None:
+        raise ValueError(f"Sobra texto al final de la consulta: {lector.actual()[1]!r}")
+    medidas = list(dict.fromkeys(medidas))
+    dims = list(dict.fromkeys(dims))
+    if orden is not None and orden[0] not in medidas + dims:
+        raise ValueError(f"ORDER BY {orden[0]}: la columna no está en el resultado")
+    return Consulta(medidas, dims, condiciones, orden, limite, explicar)
+
+
+# --- Planificación ------------------------------------------------------
+
+def _miembros(motor, dim):
+    if dim == 'Día_Semana':
+        return list(dimensiones.ORDEN_DIA_SEMANA)
+    return motor.miembros(dim)
+
+
+# Intersección de las condiciones por dimensión, sin valores que no tienen
+# datos ni filtros que admiten todos los miembros; el rango de Fecha se
+# recorta al de los datos. Devuelve (filtros, fechas, vacía, pasos).
+def podar(consulta, motor):
+    filtros, fechas, pasos = {}, None, []
+    for dim, operador, valores in consulta.condiciones:
+        if dim == 'Fecha':
+            desde, hasta = valores
+            fechas = (desde, hasta) if fechas is None else (max(fechas[0], desde), min(fechas[1], hasta))
+            continue
+        miembros = _miembros(motor, dim)
+        if operador == 'BETWEEN':
+            desde, hasta = valores
+            admitidos = [m for m in miembros if desde <= m <= hasta]
+        else:
+            admitidos = [m for m in miembros if m in set(valores)]
+        filtros[dim] = admitidos if dim not in filtros else [m for m in filtros[dim] if m in set(admitidos)]
+
+    vacia = False
+    for dim in list(filtros):
+        total = len(_miembros(motor, dim))
+        if not filtros[dim]:
+            pasos.append(('Podar filtros', f"{dim}: ningún valor pedido tiene datos", 0))
+            vacia = True
+        elif len(filtros[dim]) == total:
+            pasos.append(('Podar filtros', f"{dim}: admite los {total} miembros, se descarta", 0))
+            del filtros[dim]
+        else:
+            pasos.append(('Filtro', f"{dim} ∈ {{{', '.join(map(str, filtros[dim]))}}}", 0))
+
+    if fechas is not None:
+        primero, ultimo = (np.datetime64(f, 'D') for f in motor.rango_fechas())
+        recortadas = (max(fechas[0], primero), min(fechas[1], ultimo))
+        if recortadas[0] > recortadas[1]:
+            pasos.append(('Podar filtros', f"Fecha {fechas[0]} a {fechas[1]} fuera de los datos "
+                                           f"({primero} a {ultimo})", 0))
+            vacia = True
+        elif recortadas == (primero, ultimo):
+            pasos.append(('Podar filtros', "Fecha cubre todos los datos, se descarta", 0))
+            fechas = None
+        else:
+            if recortadas != fechas:
+                pasos.append(('Podar filtros', "Fecha recortada al rango de los datos", 0))
+            fechas = recortadas
+            pasos.append(('Filtro', f"Fecha {fechas[0]} a {fechas[1]}", 0))
+    return filtros, fechas, vacia, pasos
+
+
+# Filtros Año/Mes implicados por un rango de fechas, para podar particiones
+def _filtros_tiempo(fechas):
+    meses = pd.period_range(pd.Timestamp(fechas[0]), pd.Timestamp(fechas[1]), freq='M')
+    return {'Año': sorted(set(meses.year)), 'Mes': sorted(set(meses.month))}
+
+
+def _consulta_cubo(consulta, filtros):
+    return cache_consultas.consulta(consulta.dimensiones, filtros, 'todas')
+
+
+# Plan de una consulta: poda de filtros y fuente más barata que la responde
+def planificar(consulta, motor):
+    filtros, fechas, vacia, pasos = podar(consulta, motor)
+    necesarias = set(consulta.dimensiones) | set(filtros)
+    if fechas is not None:
+        necesarias.add('Fecha')
+    if vacia:
+        pasos.append(('Resultado vacío', "sin leer datos", 0))
+        return Plan(consulta, 'vacío', filtros, fechas, pasos)
+
+    if necesarias <= set(cubo.DIMENSIONES):
+        nodo, vista = motor.reticulo.elegir(_consulta_cubo(consulta, filtros))
+        origen = 'cubo base' if nodo is None else f"vista materializada {reticulo.nombre_nodo(nodo)}"
+        pasos.append(('Leer agregados', f"{origen} ({reticulo.celdas(vista):,} celdas)", reticulo.celdas(vista)))
+        return Plan(consulta, 'cubo', filtros, fechas, pasos)
+
+    if (motor.diario is not None and necesarias <= DIARIO_DIMENSIONES
+            and set(consulta.medidas) <= DIARIO_MEDIDAS):
+        fechas = fechas or tuple(np.datetime64(f, 'D') for f in motor.rango_fechas())
+        dias = int((fechas[1] - fechas[0]).astype(np.int64)) + 1
+        productos = len(filtros.get('Producto', motor.diario['productos']))
+        regiones = len(filtros.get('Región', motor.diario['regiones']))
+        if 'Fecha' in consulta.dimensiones:
+            lecturas, detalle = (dias + 1) * productos * regiones, f"diferencias de {dias:,} días"
+        else:
+            lecturas, detalle = 2 * productos * regiones, f"acumulado[fin] - acumulado[inicio] ({dias:,} días)"
+        pasos.append(('Leer índice diario', f"{detalle} en {productos} × {regiones} celdas Producto × Región", lecturas))
+        return Plan(consulta, 'diario', filtros, fechas, pasos)
+
+    poda = {dim: valores for dim, valores in filtros.items() if dim in particiones.PODABLES}
+    if fechas is not None:
+        for dim, valores in _filtros_tiempo(fechas).items():
+            poda[dim] = [v for v in poda.get(dim, valores) if v in valores]
+    if motor.lector is not None:
+        filas = motor.totales(poda)['conteo']
+        detalle = f"particiones Año/Mes podadas por {', '.join(poda)}" if poda else "todas las particiones"
+    else:
+        filas = motor.totales()['conteo']
+        detalle = "todas las filas en memoria"
+    pasos.append(('Leer filas', f"{detalle} ({filas:,} filas)", filas))
+    if consulta.dimensiones:
+        pasos.append(('Agrupar', f"groupby {', '.join(consulta.dimensiones)}", 0))
+    return Plan(consulta, 'filas', dict(filtros, **{d: v for d, v in poda.items() if d not in filtros}), fechas, pasos)
+
+
+# --- Ejecución ----------------------------------------------------------
+
+def _desde_cubo(plan, motor):
+    resultado = motor.consultar(_consulta_cubo(plan.consulta, plan.filtros), 'lenguaje')
+    if isinstance(resultado, dict):
+        if not resultado['conteo']:
+            return pd.DataFrame(columns=list(cubo.MEDIDAS.values()))
+        return pd.DataFrame([{columna: resultado[medida] for medida, columna in cubo.MEDIDAS.items()}])
+    return resultado
+
+
+def _desde_diario(plan, motor):
+    return indice_diario.agrupar(motor.diario, plan.consulta.dimensiones, *plan.fechas, plan.filtros)
+
+
+def _desde_filas(plan, motor):
+    filas = motor.registros(plan.filtros)
+    if plan.fechas is not None:
+        fechas = filas['Fecha'].values.astype('datetime64[D]')
+        filas = filas[(fechas >= plan.fechas[0]) & (fechas <= plan.fechas[1])]
+    agregaciones = {'Ventas': 'sum', 'Registros': 'size', 'Mínimo': 'min', 'Máximo': 'max'}
+    por = plan.consulta.dimensiones
+    if not por:
+        if len(filas) == 0:
+            return pd.DataFrame(columns=list(agregaciones))
+        return pd.DataFrame([{columna: filas['Ventas'].agg(funcion) for columna, funcion in agregaciones.items()}])
+    return filas.groupby(por, observed=True, sort=True, as_index=False).agg(
+        **{columna: ('Ventas', funcion) for columna, funcion in agregaciones.items()})
+
+
+EJECUTORES = {'cubo': _desde_cubo, 'diario': _desde_diario, 'filas': _desde_filas}
+
+
+# Ejecutar un plan: dimensiones + medidas pedidas, con ORDER BY y LIMIT
+def ejecutar(plan, motor):
+    consulta = plan.consulta
+    if plan.fuente == 'vacío':
+        return pd.DataFrame(columns=consulta.dimensiones + consulta.medidas)
+    with instrumentacion.medir(f'lenguaje.{plan.fuente}'):
+        tabla = EJECUTORES[plan.fuente](plan, motor)
+    if 'Promedio' in consulta.medidas:
+        tabla = tabla.assign(Promedio=tabla['Ventas'] / tabla['Registros'])
+    tabla = tabla[consulta.dimensiones + consulta.medidas]
+    if consulta.orden is not None:
+        columna, descendente = consulta.orden
+        tabla = tabla.sort_values(columna, ascending=not descendente, kind='stable')
+    if consulta.limite is not None:
+        tabla = tabla.head(consulta.limite)
+    return tabla.reset_index(drop=True)
+
+
+# Plan como tabla (Paso, Detalle, Costo) con una fila final de total
+def explicar(plan):
+    pasos = [('Fuente', plan.fuente, 0)] + plan.pasos
+    consulta = plan.consulta
+    if consulta.orden is not None:
+        pasos.append(('Ordenar', f"{consulta.orden[0]} {'DESC' if consulta.orden[1] else 'ASC'}", 0))
+    if consulta.limite is not None:
+        pasos.append(('Limitar', f"{consulta.limite} filas", 0))
+    pasos.append(('Total', 'celdas o filas leídas', plan.costo))
+    return pd.DataFrame(pasos, columns=['Paso', 'Detalle', 'Costo'])
+
+
+# Analizar, planificar y ejecutar un texto. Devuelve (resultado, plan);
+# con EXPLAIN el resultado es la tabla del plan y no se ejecuta.
+def consultar(texto, motor):
+    consulta = analizar(texto)
+    plan = planificar(consulta, motor)
+    if consulta.explicar:
+        return explicar(plan), plan
+    return ejecutar(plan, motor), plan
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from motor_olap import MotorOLAP
+
+    parser = argparse.ArgumentParser(description="Consultas SELECT ... BY ... WHERE ... sobre el almacén de ventas.")
+    parser.add_argument('consulta', help="Texto de la consulta, entre comillas")
+    parser.add_argument('--csv', default='ventas.csv', help="CSV base del almacén")
+    parser.add_argument('--explain', action='store_true', help="Mostrar el plan y su costo en lugar de ejecutar")
+    args = parser.parse_args()
+
+    motor = MotorOLAP.desde_almacen(args.csv, particionado=True)
+    texto = f"EXPLAIN {args.consulta}" if args.explain else args.consulta
+    resultado, plan = consultar(texto, motor)
+    print(resultado.to_string(index=False))
+    if not plan.consulta.explicar:
+        print(f"\nFuente: {plan.fuente} (costo {plan.costo:,})")
@@ -0,0 +1,205 @@
+# motor_olap.py
+# Motor OLAP sin interfaz: concentra slice, dice, roll-up, drill-down y pivot
+# sobre el almacén columnar, el cubo de agregados, los diccionarios de
+# dimensiones y los bitmaps. Lo usan app_ventas.py y olap_practica.py, y se
+# puede importar desde cualquier script o tarea programada sin Streamlit.
+
+import functools
+
+import numpy as np
+
+import almacen
+import bitmaps
+import bocetos
+import cache_consultas
+import dimensiones
+import indice_diario
+import instantanea
+import instrumentacion
+import particiones
+import reticulo
+import servicio
+import tablas_arrow
+
+# Jerarquía temporal de general a específico
+JERARQUIA_TIEMPO = ['Año', 'Trimestre', 'Mes']
+
+
+def _lista(valor):
+    return [valor] if isinstance(valor, str) else list(valor)
+
+
+class MotorOLAP:
+    # lector(filtros, desde, hasta, formato) -> filas: si se indica,
+    # registros() lee las filas bajo demanda (por ejemplo de las particiones
+    # Año/Mes) en lugar de usar df
+    # diario: índice de sumas acumuladas por día (indice_diario.py) para
+    # rangos de fechas, ventanas móviles y comparaciones interanuales.
+    # bocetos_ventas: histogramas logarítmicos por celda (bocetos.py) para cuantiles.
+    # Si no se pasan y hay ruta_csv, ambos se cargan del almacén la primera
+    # vez que se usan.
+    def __init__(self, df, cubo_ventas, version, indice=None, cache=True, lector=None, diario=None,
+                 bocetos_ventas=None, ruta_csv=None):
+        self.df = df
+        self.cubo = cubo_ventas
+        self.version = version
+        self.diccionario = dimensiones.construir_diccionario(df)
+        self.indice = indice
+        self.usar_cache = cache
+        self.lector = lector
+        self.ruta_csv = ruta_csv
+        self._diario = diario
+        self._bocetos = bocetos_ventas
+        self.reticulo = reticulo.Reticulo(cubo_ventas)
+
+    @property
+    def diario(self):
+        if self._diario is None and self.ruta_csv is not None:
+            self._diario = indice_diario.cargar(self.ruta_csv)
+        return self._diario
+
+    @property
+    def bocetos(self):
+        if self._bocetos is None and self.ruta_csv is not None:
+            self._bocetos = bocetos.cargar(self.ruta_csv)
+        return self._bocetos
+
+    # Abrir el almacén asociado al CSV (se ingiere si hace falta).
+    # indice_bitmaps=True construye los bitmaps para materializar filas;
+    # procesos es el pool para reconstruir el cubo por particiones Año/Mes.
+    # particionado=True no carga las filas: registros() lee solo las
+    # particiones que tocan los filtros de tiempo (df queda vacío).
+    # desde_instantanea=True abre con memory-mapping el cubo, los índices y
+    # las vistas materializadas guardados (instantanea.py) y, si no hay una
+    # instantánea vigente, la guarda después de calcularlos. Sin instantánea,
+    # el índice diario y los bocetos se cargan recién cuando se consultan: un
+    # script que solo agrega sobre el cubo no los lee ni los construye.
+    @classmethod
+    def desde_almacen(cls, ruta_csv='ventas.csv', indice_bitmaps=True, cache=True, procesos=None,
+                      particionado=False, desde_instantanea=False):
+        version = almacen.preparar(ruta_csv)
+        estado = instantanea.abrir(ruta_csv) if desde_instantanea else None
+        if estado is None:
+            cubo_ventas = almacen.cargar_cubo(ruta_csv, particiones.PROCESOS if procesos is None else procesos)
+            diario = bocetos_ventas = None
+        else:
+            cubo_ventas, diario, bocetos_ventas = estado['cubo'], estado.get('diario'), estado.get('bocetos')
+
+        if particionado:
+            meta = particiones.preparar(ruta_csv)
+            lector = functools.partial(particiones.leer, ruta_csv, meta=meta)
+            motor = cls(particiones.esquema(meta), cubo_ventas, version, None, cache, lector, diario, bocetos_ventas,
+                        ruta_csv)
+        else:
+            df = almacen.cargar_ventas(ruta_csv)
+            indice = bitmaps.construir_indice(df) if indice_bitmaps else None
+            motor = cls(df, cubo_ventas, version, indice, cache, diario=diario, bocetos_ventas=bocetos_ventas,
+                        ruta_csv=ruta_csv)
+
+        if estado is not None:
+            motor.reticulo.restaurar(estado['vistas'], estado['frecuencias'])
+        elif desde_instantanea:
+            instantanea.guardar(motor, ruta_csv)
+        return motor
+
+    # Resolver una consulta canónica, pasando por la caché del proceso y,
+    # si hay que calcularla, por la vista materializada más chica que la
+    # contiene. El cálculo corre en el pool del servicio compartido, que
+    # agrupa las consultas idénticas en curso de distintas sesiones.
+    # 'operacion' solo da nombre a la medición (olap.<operacion>).
+    def consultar(self, consulta, operacion='consulta'):
+        self.reticulo.registrar(consulta)
+
+        def calcular():
+            return servicio.SERVICIO.ejecutar(
+                (self.version, consulta),
+                lambda: cache_consultas.ejecutar(self.reticulo.resolver(consulta), consulta)
+            )
+
+        with instrumentacion.medir(f'olap.{operacion}'):
+            if not self.usar_cache:
+                return calcular()
+            return cache_consultas.CACHE.obtener(consulta, self.version, calcular)
+
+    # Totales (suma, conteo, mínimo, máximo, promedio) bajo unos filtros
+    def totales(self, filtros=None):
+        return self.consultar(cache_consultas.consulta((), filtros), 'totales')
+
+    # Miembros con datos de una dimensión, en orden de presentación
+    def miembros(self, dim, filtros=None):
+        return list(self.consultar(cache_consultas.consulta([dim], filtros), 'miembros')[dim])
+
+    # Slice: fijar un miembro de una dimensión
+    def slice(self, dim, valor, filtros=None):
+        return self.totales(dict(filtros or {}, **{dim: [valor]}))
+
+    # Dice: varios miembros en varias dimensiones a la vez
+    def dice(self, filtros):
+        return self.totales(filtros)
+
+    # Roll-up: agregar hasta las dimensiones indicadas
+    def rollup(self, por, filtros=None, agregacion='suma'):
+        return self.consultar(cache_consultas.consulta(_lista(por), filtros, agregacion), 'rollup')
+
+    # Drill-down: detalle por la ruta jerárquica indicada (de general a específico)
+    def drilldown(self, ruta, filtros=None, agregacion='suma'):
+        return self.consultar(cache_consultas.consulta(_lista(ruta), filtros, agregacion), 'drilldown')
+
+    # Pivot: tabla dinámica filas x columnas (cada una, dimensión o lista)
+    def pivot(self, filas, columnas, filtros=None, agregacion='suma'):
+        dims = (tuple(_lista(filas)), tuple(_lista(columnas)))
+        return self.consultar(cache_consultas.consulta(dims, filtros, agregacion, pivot=True), 'pivot')
+
+    # Cuantiles de Ventas combinando los bocetos de las celdas del slice:
+    # {probabilidad: valor}, con error relativo menor que self.bocetos['precision']
+    def cuantiles(self, filtros=None, probabilidades=(0.5, 0.95)):
+        with instrumentacion.medir('olap.cuantiles'):
+            return bocetos.cuantiles(self.bocetos, probabilidades, filtros)
+
+    # Días distintos con ventas bajo los filtros (exacto, del índice diario)
+    def dias_con_ventas(self, filtros=None):
+        with instrumentacion.medir('olap.dias_con_ventas'):
+            return indice_diario.dias_con_ventas(self.diario, filtros)
+
+    # Primer y último día con datos
+    def rango_fechas(self):
+        return indice_diario.limites(self.diario)
+
+    # Totales entre dos fechas (incluidas) con el índice diario. De los
+    # filtros solo se usan Producto y Región: el tiempo lo da el rango.
+    def rango(self, desde, hasta, filtros=None):
+        with instrumentacion.medir('olap.rango'):
+            return indice_diario.rango(self.diario, desde, hasta, filtros)
+
+    # Rango comparado con el mismo período del año anterior
+    def interanual(self, desde, hasta, filtros=None):
+        with instrumentacion.medir('olap.interanual'):
+            return indice_diario.interanual(self.diario, desde, hasta, filtros)
+
+    # Ventas de los últimos 'ventana' días para cada fecha del rango
+    def movil(self, ventana, desde, hasta, filtros=None):
+        with instrumentacion.medir('olap.movil'):
+            return indice_diario.movil(self.diario, ventana, desde, hasta, filtros)
+
+    # Filas que cumplen los filtros (con bitmaps si están construidos).
+    # desde/hasta materializan solo una página de la selección. La lectura
+    # corre en el pool del servicio compartido, como consultar().
+    # formato='arrow' devuelve una tabla de pyarrow (ver tablas_arrow.py).
+    def registros(self, filtros=None, desde=0, hasta=None, formato='pandas'):
+        filtros = filtros or {}
+        clave = (self.version, 'registros', cache_consultas.consulta((), filtros).filtros, desde, hasta, formato)
+        with instrumentacion.medir('olap.registros'):
+            return servicio.SERVICIO.ejecutar(clave, lambda: self._registros(filtros, desde, hasta, formato))
+
+    def _registros(self, filtros, desde, hasta, formato):
+        if self.lector is not None:
+            return self.lector(filtros, desde=desde, hasta=hasta, formato=formato)
+        if self.indice is not None and all(dim in bitmaps.DIMENSIONES_INDEXADAS for dim in filtros):
+            seleccion = bitmaps.seleccionar(self.indice, filtros)
+            posiciones = bitmaps.posiciones(self.indice, seleccion)
+        else:
+            posiciones = np.flatnonzero(dimensiones.mascara(self.df, filtros, self.diccionario))
+        filas = almacen.con_fechas(self.df.iloc[posiciones[desde:hasta]])
+        if formato == 'arrow':
+            return tablas_arrow.desde_dataframe(filas)
+        return filas
@@ -0,0 +1,263 @@
+# muestras.py
+# Modo aproximado: muestra estratificada por Producto x Región x Mes (cada
+# mes de cada año es un estrato aparte) con hasta MUESTRA_POR_ESTRATO filas
+# por estrato y el tamaño real de cada uno. Con ella se arma un cubo de
+# estimaciones con la misma forma que el de cubo.py:
+#
+#   suma     N_h * media_h            (estimador de la suma del estrato)
+#   conteo   N_h                      (exacto: se cuenta al muestrear)
+#   varianza N_h² (1 - n_h/N_h) s_h² / n_h
+#
+# Como los estratos son las celdas del cubo, cualquier filtro del dashboard
+# selecciona estratos completos: la suma estimada y su varianza se obtienen
+# sumando celdas, los conteos son exactos y los estratos con N_h <= n_h no
+# aportan error. Mínimo y máximo salen de la muestra y son solo indicativos.
+#
+# La muestra se arma en la misma lectura del CSV que ingiere el almacén y
+# se guarda con él (muestra_filas.npz y el cubo en muestra.npz) por versión
+# de datos. Cada lote anexado se suma a la muestra sin volver a recorrer el
+# histórico. Para un almacén que no la tenga se puede precalcular con:
+#
+#   python muestras.py ventas.csv
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import almacen
+import cache_consultas
+import cubo
+
+ARCHIVO_MUESTRA = 'muestra.npz'
+ARCHIVO_FILAS = 'muestra_filas.npz'
+MUESTRA_POR_ESTRATO = int(os.environ.get('OLAP_MUESTRA_ESTRATO', '64'))
+Z_95 = 1.959964
+
+
+def _lista(valor):
+    return [valor] if isinstance(valor, str) else list(valor)
+
+
+# Clave del estrato de cada fila (mes de cada año, producto y región). No
+# depende de cuántas categorías haya, así que sirve mientras se ingiere.
+def _estratos(columnas):
+    mes = columnas['Año'].astype(np.int64) * 12 + columnas['Mes'] - 1
+    return (mes << 32) | (columnas['Producto'].astype(np.int64) << 16) | columnas['Región'].astype(np.int64)
+
+
+# Muestra sin filas: columnas del almacén más N, el tamaño del estrato
+def vacia():
+    muestra = {dim: np.zeros(0, dtype=tipo) for dim, (_, tipo) in almacen.COLUMNAS.items()}
+    muestra['N'] = np.zeros(0, dtype=np.int64)
+    return muestra
+
+
+# Posiciones de hasta cupo[i] filas al azar del estrato de cada fila i
+def _elegir(estrato, cupo, rng):
+    orden = np.lexsort((rng.random(len(estrato)), estrato))
+    agrupado = estrato[orden]
+    rango = np.arange(len(orden)) - np.searchsorted(agrupado, agrupado, side='left')
+    return orden[rango < cupo[orden]]
+
+
+# Sumar filas nuevas (columnas del almacén) a la muestra de modo que cada
+# estrato siga siendo una muestra uniforme sin reemplazo de todas sus filas:
+# de sus min(N, por_estrato) plazas, cuántas quedan para las ya muestreadas
+# sale de una hipergeométrica (N previas contra M nuevas) y el resto, del
+# lote. Los estratos que el lote no toca no cambian.
+def combinar(muestra, columnas, rng, por_estrato=MUESTRA_POR_ESTRATO):
+    if len(columnas['Fecha']) == 0:
+        return muestra
+    estrato_lote = _estratos(columnas)
+    estrato_muestra = _estratos(muestra)
+    claves, nuevas = np.unique(estrato_lote, return_counts=True)
+    claves_muestra, primera = np.unique(estrato_muestra, return_index=True)
+
+    previas = np.zeros(len(claves), dtype=np.int64)
+    if len(claves_muestra):
+        posicion = np.minimum(np.searchsorted(claves_muestra, claves), len(claves_muestra) - 1)
+        encontrada = claves_muestra[posicion] == claves
+        previas[encontrada] = muestra['N'][primera[posicion[encontrada]]]
+    poblacion = previas + nuevas
+    plazas = np.minimum(poblacion, por_estrato)
+    de_muestra = rng.hypergeometric(previas, nuevas, plazas)
+
+    # Cupo por fila: las muestreadas de estratos sin filas nuevas quedan todas
+    tamaño = muestra['N'].copy()
+    cupo_muestra = np.full(len(estrato_muestra), np.iinfo(np.int64).max)
+    posicion = np.minimum(np.searchsorted(claves, estrato_muestra), len(claves) - 1)
+    tocada = claves[posicion] == estrato_muestra
+    cupo_muestra[tocada] = de_muestra[posicion[tocada]]
+    tamaño[tocada] = poblacion[posicion[tocada]]
+    del_lote = np.searchsorted(claves, estrato_lote)
+
+    quedan = _elegir(estrato_muestra, cupo_muestra, rng)
+    entran = _elegir(estrato_lote, (plazas - de_muestra)[del_lote], rng)
+    resultado = {dim: np.concatenate([muestra[dim][quedan], np.asarray(columnas[dim])[entran]])
+                 for dim in almacen.COLUMNAS}
+    resultado['N'] = np.concatenate([tamaño[quedan], poblacion[del_lote[entran]]])
+    return resultado
+
+
+# Muestra de todo el almacén, sumando sus bloques uno por uno
+def muestrear(ruta_csv='ventas.csv', por_estrato=MUESTRA_POR_ESTRATO, semilla=0):
+    rng = np.random.default_rng(semilla)
+    muestra = vacia()
+    for bloque, _ in almacen.bloques_columnas(ruta_csv):
+        muestra = combinar(muestra, bloque, rng, por_estrato)
+    return muestra
+
+
+# Filas de la muestra como las espera construir_estimaciones (con N y n)
+def _tabla(muestra, meta, por_estrato=MUESTRA_POR_ESTRATO):
+    df = almacen.a_dataframe({dim: muestra[dim] for dim in almacen.COLUMNAS}, meta)
+    return df[cubo.DIMENSIONES + ['Ventas']].assign(N=muestra['N'], n=np.minimum(muestra['N'], por_estrato))
+
+
+# Cubo de estimaciones a partir de la muestra
+def construir_estimaciones(muestra):
+    y = muestra['Ventas'].to_numpy(dtype=np.float64)
+    peso = muestra['N'].to_numpy(dtype=np.float64) / muestra['n'].to_numpy(dtype=np.float64)
+
+    base = cubo.construir_cubo(muestra)
+    suma = cubo.construir_cubo(muestra.assign(Ventas=peso * y))['suma']
+    poblacion = np.rint(cubo.construir_cubo(muestra.assign(Ventas=peso))['suma']).astype(np.int64)
+    cuadrados = cubo.construir_cubo(muestra.assign(Ventas=y * y))['suma']
+
+    n = base['conteo'].astype(np.float64)
+    suma_muestra = base['suma'].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s2 = np.where(n > 1, (cuadrados - suma_muestra ** 2 / n) / (n - 1), 0.0)
+        varianza = np.where(n > 0, poblacion ** 2 * (1 - n / poblacion) * s2 / n, 0.0)
+
+    return {
+        'dimensiones': list(cubo.DIMENSIONES),
+        'miembros': base['miembros'],
+        'entero': False,
+        'suma': suma,
+        'conteo': poblacion,
+        'minimo': base['minimo'],
+        'maximo': base['maximo'],
+        'varianza': np.maximum(varianza, 0.0),
+    }
+
+
+# Guardar en el directorio del almacén las filas de la muestra (para sumarle
+# lotes anexados) y su cubo de estimaciones, con la versión de meta
+def guardar(muestra, ruta, meta, por_estrato=MUESTRA_POR_ESTRATO):
+    estimaciones = construir_estimaciones(_tabla(muestra, meta, por_estrato))
+    archivo = os.path.join(ruta, ARCHIVO_FILAS)
+    np.savez(archivo + '.tmp.npz', version=str(meta['version']), por_estrato=por_estrato, **muestra)
+    os.replace(archivo + '.tmp.npz', archivo)
+    cubo.guardar(estimaciones, os.path.join(ruta, ARCHIVO_MUESTRA), meta['version'])
+    return estimaciones
+
+
+def _abrir_filas(archivo):
+    with np.load(archivo) as datos:
+        muestra = {nombre: datos[nombre] for nombre in list(almacen.COLUMNAS) + ['N']}
+        return muestra, str(datos['version']), int(datos['por_estrato'])
+
+
+# Cubo de estimaciones guardado para la versión actual del almacén, o None
+# si no hay uno vigente (no muestrea)
+def abrir_estimaciones(ruta_csv='ventas.csv'):
+    version = almacen.preparar(ruta_csv)
+    archivo = os.path.join(almacen.ruta_almacen(ruta_csv), ARCHIVO_MUESTRA)
+    if os.path.exists(archivo):
+        estimaciones, version_muestra = cubo.cargar(archivo)
+        if version_muestra == str(version):
+            return estimaciones
+    return None
+
+
+# Cubo de estimaciones del almacén: el guardado si es de la versión actual;
+# si no, se muestrea todo el almacén y se guarda
+def cargar_estimaciones(ruta_csv='ventas.csv'):
+    estimaciones = abrir_estimaciones(ruta_csv)
+    if estimaciones is None:
+        ruta = almacen.ruta_almacen(ruta_csv)
+        estimaciones = guardar(muestrear(ruta_csv), ruta, almacen.abrir_columnas(ruta)[1])
+    return estimaciones
+
+
+# Sumar a la muestra guardada un lote anexado al almacén, si era de la
+# versión anterior, y guardarla con la nueva junto con sus estimaciones
+def anexar(ruta_csv, columnas, meta_almacen, version_anterior):
+    ruta = almacen.ruta_almacen(ruta_csv)
+    archivo = os.path.join(ruta, ARCHIVO_FILAS)
+    if not os.path.exists(archivo):
+        return None
+    muestra, version_muestra, por_estrato = _abrir_filas(archivo)
+    if version_muestra != str(version_anterior):
+        return None
+    rng = np.random.default_rng(meta_almacen['version'])
+    return guardar(combinar(muestra, columnas, rng, por_estrato), ruta, meta_almacen, por_estrato)
+
+
+# Mismas consultas que MotorOLAP respondidas desde la muestra, con el
+# semiancho del intervalo de confianza del 95% de las sumas
+class MotorAproximado:
+    def __init__(self, estimaciones, version):
+        self.cubo = estimaciones
+        # Versión distinta de la exacta: las vistas memorizadas no se mezclan
+        self.version = f'{version}~aprox'
+        # Mismo cubo con la varianza en lugar de la suma: agregar() suma
+        # varianzas de estratos independientes igual que sumas
+        self._varianzas = dict(estimaciones, suma=estimaciones['varianza'])
+
+    # construir=False solo abre la muestra ya guardada y devuelve None si
+    # no hay una de la versión actual
+    @classmethod
+    def desde_almacen(cls, ruta_csv='ventas.csv', construir=True):
+        estimaciones = cargar_estimaciones(ruta_csv) if construir else abrir_estimaciones(ruta_csv)
+        if estimaciones is None:
+            return None
+        return cls(estimaciones, almacen.preparar(ruta_csv))
+
+    def consultar(self, consulta):
+        return cache_consultas.ejecutar(self.cubo, consulta)
+
+    def totales(self, filtros=None):
+        resultado = cubo.totales(self.cubo, filtros)
+        resultado['suma_ic'] = Z_95 * np.sqrt(cubo.totales(self._varianzas, filtros)['suma'])
+        resultado['promedio_ic'] = resultado['suma_ic'] / resultado['conteo'] if resultado['conteo'] else 0.0
+        return resultado
+
+    def miembros(self, dim, filtros=None):
+        return cubo.miembros(self.cubo, dim, filtros)
+
+    def slice(self, dim, valor, filtros=None):
+        return self.totales(dict(filtros or {}, **{dim: [valor]}))
+
+    def dice(self, filtros):
+        return self.totales(filtros)
+
+    # Roll-up con la columna 'IC 95%' junto a las sumas estimadas
+    def rollup(self, por, filtros=None, agregacion='suma'):
+        por = _lista(por)
+        datos = self.consultar(cache_consultas.consulta(por, filtros, agregacion))
+        if agregacion == 'suma':
+            varianzas = cubo.agregar(self._varianzas, por, filtros)['Ventas'].to_numpy()
+            datos = datos.assign(**{'IC 95%': Z_95 * np.sqrt(varianzas)})
+        return datos
+
+    def drilldown(self, ruta, filtros=None, agregacion='suma'):
+        return self.rollup(ruta, filtros, agregacion)
+
+    def pivot(self, filas, columnas, filtros=None, agregacion='suma'):
+        dims = (tuple(_lista(filas)), tuple(_lista(columnas)))
+        return self.consultar(cache_consultas.consulta(dims, filtros, agregacion, pivot=True))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precalcular la muestra estratificada del modo aproximado.")
+    parser.add_argument('csv', nargs='?', default='ventas.csv', help="CSV base del almacén")
+    args = parser.parse_args()
+
+    estimaciones = cargar_estimaciones(args.csv)
+    print(f"Muestra guardada en {os.path.join(almacen.ruta_almacen(args.csv), ARCHIVO_MUESTRA)} "
+          f"({int(estimaciones['conteo'].sum()):,} registros representados)")
@@ -1,46 +1,163 @@
 # olap_practica.py
-import pandas as pd
-
-# Cargar datos
-df = pd.read_csv('ventas.csv', parse_dates=['Fecha'])
-df['Mes'] = df['Fecha'].dt.month
-df['Año'] = df['Fecha'].dt.year
-
-# Mostrar datos base
-print("=== Datos originales ===")
-print(df)
-
-# Crear cubo: Producto x Región x Mes
-print("\n=== Cubo OLAP: Producto x Región x Mes ===")
-cubo = pd.pivot_table(df, values='Ventas', index=['Producto'], columns=['Región', 'Mes'], aggfunc='sum', fill_value=0)
-print(cubo)
-
-# Slice: Producto A
-print("\n=== Slice: Ventas del Producto A ===")
-slice_A = df[df['Producto'] == 'A']
-print(slice_A)
-
-# Dice: Productos A y B en Región Centro
-print("\n=== Dice: Productos A y B en Región Centro ===")
-dice = df[(df['Producto'].isin(['A', 'B'])) & (df['Región'] == 'Centro')]
-print(dice)
-
-# Roll-up: Ventas por Año y Producto
-print("\n=== Roll-up: Ventas por Año y Producto ===")
-rollup = df.groupby(['Año', 'Producto'])['Ventas'].sum().reset_index()
-print(rollup)
-
-# Drill-down: Ventas por Año, Mes y Producto
-print("\n=== Drill-down: Ventas por Año, Mes y Producto ===")
-drill = df.groupby(['Año', 'Mes', 'Producto'])['Ventas'].sum().reset_index()
-print(drill)
-
-# Pivot: Región vs Producto
-print("\n=== Pivot: Ventas por Región y Producto ===")
-pivot = df.pivot_table(values='Ventas', index='Región', columns='Producto', aggfunc='sum', fill_value=0)
-print(pivot)
-
-# Exportar a Excel para Power BI
+# Operaciones OLAP de práctica sobre las ventas y exportación a Excel para
+# Power BI. Con --streaming recorre el almacén por bloques: los agregados se
+# acumulan en cubos parciales que se combinan entre bloques y el slice y el
+# dice se escriben a CSV a medida que se leen, así que la memoria no depende
+# del tamaño del histórico. Con --procesos N (todos los núcleos por defecto)
+# y un histórico de al menos almacen.FILAS_MINIMAS_PARALELO filas, los
+# agregados se calculan como map-reduce sobre las particiones Año/Mes
+# (particiones.py); con menos filas se combinan los cubos de cada bloque.
+#
+#   python olap_practica.py
+#   python olap_practica.py --streaming --bloque 500000 --salida salida_olap
+#   python olap_practica.py --streaming --procesos 32
+
+import argparse
+import os
+
+import almacen
+import cache_consultas
+import cubo
+import dimensiones
+import exportacion
+import particiones
+from motor_olap import MotorOLAP
+
+# Consultas de detalle: archivo de salida -> filtros
+SLICE_A = {'Producto': ['A']}
+DICE_AB_CENTRO = {'Producto': ['A', 'B'], 'Región': ['Centro']}
+SALIDAS_DETALLE = {
+    'slice_producto_A.csv': SLICE_A,
+    'dice_A_B_centro.csv': DICE_AB_CENTRO,
+}
+
 output_file = 'cubo_para_powerbi.xlsx'
-pivot.to_excel(output_file)
-print(f"\nArchivo exportado a Excel: {output_file}")
+
+
+def exportar(cubo_ventas):
+    # Exportar a Excel para Power BI: cubo, roll-ups, drill-down y pivot en
+    # hojas separadas, escritas en modo streaming
+    exportacion.exportar(output_file, cubo_ventas)
+    print(f"\nArchivo exportado a Excel: {output_file}")
+
+
+def ejecutar(ruta_csv, procesos):
+    # Cargar datos (almacén columnar con Mes/Año ya calculados y cubo de agregados)
+    motor = MotorOLAP.desde_almacen(ruta_csv, indice_bitmaps=False, procesos=procesos)
+    df = motor.df
+
+    # Mostrar datos base
+    print("=== Datos originales ===")
+    print(almacen.con_fechas(df))
+
+    # Crear cubo: Producto x Región x Mes
+    print("\n=== Cubo OLAP: Producto x Región x Mes ===")
+    print(motor.pivot(['Producto'], ['Región', 'Mes']))
+
+    # Slice: Producto A
+    print("\n=== Slice: Ventas del Producto A ===")
+    print(motor.registros(SLICE_A))
+
+    # Dice: Productos A y B en Región Centro
+    print("\n=== Dice: Productos A y B en Región Centro ===")
+    print(motor.registros(DICE_AB_CENTRO))
+
+    # Roll-up: Ventas por Año y Producto
+    print("\n=== Roll-up: Ventas por Año y Producto ===")
+    print(motor.rollup(['Año', 'Producto']))
+
+    # Drill-down: Ventas por Año, Mes y Producto
+    print("\n=== Drill-down: Ventas por Año, Mes y Producto ===")
+    print(motor.drilldown(['Año', 'Mes', 'Producto']))
+
+    # Pivot: Región vs Producto
+    print("\n=== Pivot: Ventas por Región y Producto ===")
+    print(motor.pivot('Región', 'Producto'))
+
+    exportar(motor.cubo)
+
+
+def ejecutar_streaming(ruta_csv, filas_por_bloque, directorio, procesos):
+    os.makedirs(directorio, exist_ok=True)
+    rutas = {archivo: os.path.join(directorio, archivo) for archivo in SALIDAS_DETALLE}
+    escritas = dict.fromkeys(SALIDAS_DETALLE, 0)
+
+    # Con varios procesos y un histórico grande (el mismo umbral que
+    # almacen.cargar_cubo) el cubo sale del map-reduce por particiones y los
+    # bloques solo se recorren para escribir el slice y el dice. Por debajo,
+    # copiar el almacén en particiones y levantar el pool cuesta más que
+    # combinar los cubos parciales de cada bloque.
+    almacen.preparar(ruta_csv)
+    total = almacen.abrir_columnas(almacen.ruta_almacen(ruta_csv))[1]['filas']
+    paralelo = procesos > 1 and total >= almacen.FILAS_MINIMAS_PARALELO
+    acumulado = particiones.construir_cubo(ruta_csv, procesos) if paralelo else None
+
+    # Cada bloque aporta un cubo parcial; el tamaño del acumulado depende de
+    # los miembros de las dimensiones, no de las filas leídas
+    filas = 0
+    bloques = 0
+    for bloque in almacen.leer_bloques(ruta_csv, filas_por_bloque):
+        if not paralelo:
+            parcial = cubo.construir_cubo(bloque)
+            acumulado = parcial if acumulado is None else cubo.combinar(acumulado, parcial)
+
+        diccionario = dimensiones.construir_diccionario(bloque)
+        for archivo, filtros in SALIDAS_DETALLE.items():
+            seleccion = almacen.con_fechas(bloque[dimensiones.mascara(bloque, filtros, diccionario)])
+            seleccion.to_csv(rutas[archivo], mode='w' if bloques == 0 else 'a',
+                             header=bloques == 0, index=False, encoding='utf-8')
+            escritas[archivo] += len(seleccion)
+        filas += len(bloque)
+        bloques += 1
+
+    if filas == 0:
+        print(f"No hay registros en {ruta_csv}")
+        return
+
+    print("=== Datos originales ===")
+    print(f"{filas:,} registros leídos en {bloques:,} bloques de hasta {filas_por_bloque:,} filas")
+
+    print("\n=== Cubo OLAP: Producto x Región x Mes ===")
+    print(cubo.pivot(acumulado, ['Producto'], ['Región', 'Mes']))
+
+    print("\n=== Slice: Ventas del Producto A ===")
+    print(f"{escritas['slice_producto_A.csv']:,} registros escritos en {rutas['slice_producto_A.csv']}")
+
+    print("\n=== Dice: Productos A y B en Región Centro ===")
+    print(f"{escritas['dice_A_B_centro.csv']:,} registros escritos en {rutas['dice_A_B_centro.csv']}")
+
+    # Mismas columnas que motor.rollup/drilldown (suma de Ventas)
+    print("\n=== Roll-up: Ventas por Año y Producto ===")
+    print(cache_consultas.ejecutar(acumulado, cache_consultas.consulta(['Año', 'Producto'])))
+
+    print("\n=== Drill-down: Ventas por Año, Mes y Producto ===")
+    print(cache_consultas.ejecutar(acumulado, cache_consultas.consulta(['Año', 'Mes', 'Producto'])))
+
+    print("\n=== Pivot: Ventas por Región y Producto ===")
+    print(cubo.pivot(acumulado, 'Región', 'Producto'))
+
+    exportar(acumulado)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Operaciones OLAP de práctica y exportación para Power BI.")
+    parser.add_argument('csv', nargs='?', default='ventas.csv', help="CSV de ventas (se usa su almacén columnar)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Procesar por bloques con memoria acotada y escribir slice/dice a disco")
+    parser.add_argument('--bloque', type=int, default=almacen.FILAS_POR_BLOQUE, help="Filas por bloque en modo streaming")
+    parser.add_argument('--salida', default='salida_olap', help="Directorio de los CSV de slice/dice en modo streaming")
+    parser.add_argument('--procesos', type=int, default=particiones.PROCESOS,
+                        help="Procesos para agregar por particiones Año/Mes (1 = secuencial)")
+    args = parser.parse_args()
+    for opcion in ('bloque', 'procesos'):
+        if getattr(args, opcion) <= 0:
+            parser.error(f"--{opcion} debe ser un entero positivo")
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.streaming:
+        ejecutar_streaming(args.csv, args.bloque, args.salida, args.procesos)
+    else:
+        ejecutar(args.csv, args.procesos)
@@ -0,0 +1,280 @@
+# particiones.py
+# Copia del almacén columnar particionada por Año/Mes en disco
+# (ventas_columnar/particiones/2023-01/, ...) y agregación map-reduce sobre
+# un pool de procesos: cada worker construye el cubo de una partición y los
+# cubos parciales se combinan en orden de partición, así que el resultado
+# no depende del número de procesos ni del orden en que terminan.
+#
+# meta.json guarda filas y mínimo/máximo de cada columna por partición;
+# leer() usa esas estadísticas para abrir solo las particiones que tocan los
+# filtros de Año/Trimestre/Mes de una consulta. Un lote anexado al almacén
+# se agrega solo a las particiones de sus meses.
+#
+#   python particiones.py ventas.csv --procesos 32
+
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import numpy as np
+
+import almacen
+import cubo
+import dimensiones
+import instrumentacion
+import tablas_arrow
+
+DIRECTORIO = 'particiones'
+VERSION_PARTICIONES = 2
+
+# Columnas con estadísticas mínimo/máximo y las que sirven para podar
+ESTADISTICAS = ['Fecha', 'Año', 'Trimestre', 'Mes', 'Ventas']
+PODABLES = ['Año', 'Trimestre', 'Mes']
+
+# Un solo hilo por proceso reescribe las particiones a la vez
+_lock = threading.Lock()
+
+# Procesos por defecto (OLAP_PROCESOS, o todos los núcleos)
+PROCESOS = int(os.environ.get('OLAP_PROCESOS', '0')) or os.cpu_count() or 1
+
+
+def ruta_particiones(ruta_csv):
+    return os.path.join(almacen.ruta_almacen(ruta_csv), DIRECTORIO)
+
+
+def _nombre(año, mes):
+    return f'{año:04d}-{mes:02d}'
+
+
+def _leer_meta(ruta):
+    archivo = os.path.join(ruta, 'meta.json')
+    if not os.path.exists(archivo):
+        return None
+    with open(archivo, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _escribir_meta(ruta, meta):
+    temporal = os.path.join(ruta, 'meta.json.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, os.path.join(ruta, 'meta.json'))
+
+
+# Filas de un bloque de columnas agrupadas por partición Año/Mes; dentro de
+# cada partición conservan su orden
+def _por_particion(columnas):
+    clave = columnas['Año'].astype(np.int32) * 100 + columnas['Mes']
+    orden = np.argsort(clave, kind='stable')
+    claves, inicios = np.unique(clave[orden], return_index=True)
+    finales = np.append(inicios[1:], len(orden))
+    for valor, desde, hasta in zip(claves, inicios, finales):
+        yield _nombre(int(valor) // 100, int(valor) % 100), {dim: col[orden[desde:hasta]] for dim, col in columnas.items()}
+
+
+# Sumar las filas y el mínimo/máximo de una parte a las estadísticas de su partición
+def _acumular(estadisticas, parte):
+    estadisticas['filas'] += len(parte['Fecha'])
+    for dim in ESTADISTICAS:
+        minimo, maximo = int(parte[dim].min()), int(parte[dim].max())
+        previo = estadisticas.get(dim, [minimo, maximo])
+        estadisticas[dim] = [min(previo[0], minimo), max(previo[1], maximo)]
+
+
+# Repartir las filas del almacén en un directorio por Año/Mes. Se lee por
+# bloques y, dentro de cada partición, las filas conservan su orden.
+def particionar(ruta_csv='ventas.csv', filas_por_bloque=almacen.FILAS_POR_BLOQUE):
+    ruta = ruta_particiones(ruta_csv)
+    temporal = ruta + '.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    filas = {}
+    meta_almacen = None
+    for columnas, meta_almacen in almacen.bloques_columnas(ruta_csv, filas_por_bloque):
+        for nombre, parte in _por_particion(columnas):
+            destino = os.path.join(temporal, nombre)
+            os.makedirs(destino, exist_ok=True)
+            almacen.escribir_columnas(destino, parte)
+            _acumular(filas.setdefault(nombre, {'filas': 0}), parte)
+
+    if meta_almacen is None:
+        meta_almacen = almacen.abrir_columnas(almacen.ruta_almacen(ruta_csv))[1]
+    meta = {
+        'version_particiones': VERSION_PARTICIONES,
+        'version': meta_almacen['version'],
+        'categorias': meta_almacen['categorias'],
+        'dias_semana': meta_almacen['dias_semana'],
+        'particiones': dict(sorted(filas.items())),
+    }
+    _escribir_meta(temporal, meta)
+    shutil.rmtree(ruta, ignore_errors=True)
+    os.rename(temporal, ruta)
+    return meta
+
+
+# Añadir las filas de un lote (columnas ya escritas en el almacén) a las
+# particiones de sus meses, si estaban al día con la versión anterior del
+# almacén: solo se escriben y se actualizan en meta.json las particiones
+# que toca el lote. Si no, quedan para rehacerse en el próximo preparar().
+def anexar(ruta_csv, columnas, meta_almacen, version_anterior):
+    ruta = ruta_particiones(ruta_csv)
+    with _lock:
+        meta = _leer_meta(ruta)
+        if (meta is None or meta.get('version_particiones') != VERSION_PARTICIONES
+                or meta['version'] != version_anterior):
+            return None
+        for nombre, parte in _por_particion(columnas):
+            destino = os.path.join(ruta, nombre)
+            os.makedirs(destino, exist_ok=True)
+            estadisticas = meta['particiones'].setdefault(nombre, {'filas': 0})
+            # Descartar bytes de un anexado anterior que no llegó a meta.json
+            for archivo, tipo in almacen.COLUMNAS.values():
+                with open(os.path.join(destino, archivo), 'ab') as f:
+                    f.truncate(estadisticas['filas'] * np.dtype(tipo).itemsize)
+            almacen.escribir_columnas(destino, parte)
+            _acumular(estadisticas, parte)
+        meta['version'] = meta_almacen['version']
+        meta['categorias'] = meta_almacen['categorias']
+        meta['particiones'] = dict(sorted(meta['particiones'].items()))
+        _escribir_meta(ruta, meta)
+    return meta
+
+
+# Dejar las particiones al día con el almacén (se rehacen si cambió su
+# versión o el formato de las particiones)
+def preparar(ruta_csv='ventas.csv'):
+    version = almacen.preparar(ruta_csv)
+    with _lock:
+        meta = _leer_meta(ruta_particiones(ruta_csv))
+        if (meta is None or meta.get('version_particiones') != VERSION_PARTICIONES
+                or meta['version'] != version):
+            meta = particionar(ruta_csv)
+    return meta
+
+
+def _columnas_particion(ruta, nombre, meta):
+    filas = meta['particiones'][nombre]['filas']
+    return {
+        dim: np.fromfile(os.path.join(ruta, nombre, archivo), dtype=tipo, count=filas)
+        for dim, (archivo, tipo) in almacen.COLUMNAS.items()
+    }
+
+
+# Leer una partición completa como DataFrame
+def leer_particion(ruta, nombre, meta):
+    return almacen.a_dataframe(_columnas_particion(ruta, nombre, meta), meta)
+
+
+# Particiones cuyo rango mínimo/máximo admite algún valor pedido en cada
+# filtro de Año/Trimestre/Mes (los demás filtros no podan)
+def podar(meta, filtros=None):
+    nombres = []
+    for nombre, estadisticas in meta['particiones'].items():
+        for dim, valores in (filtros or {}).items():
+            if dim not in PODABLES or valores is None:
+                continue
+            minimo, maximo = estadisticas[dim]
+            if not any(minimo <= v <= maximo for v in np.atleast_1d(valores)):
+                break
+        else:
+            nombres.append(nombre)
+    return nombres
+
+
+# DataFrame vacío con las columnas y categorías del almacén
+def esquema(meta):
+    return almacen.a_dataframe({dim: np.zeros(0, dtype=tipo) for dim, (_, tipo) in almacen.COLUMNAS.items()}, meta)
+
+
+# Columnas de una partición como memmaps: solo se leen del disco las
+# páginas que tocan la máscara y las filas elegidas
+def _abrir_particion(ruta, nombre, meta):
+    filas = meta['particiones'][nombre]['filas']
+    return {
+        dim: np.memmap(os.path.join(ruta, nombre, archivo), dtype=tipo, mode='r', shape=(filas,))
+        for dim, (archivo, tipo) in almacen.COLUMNAS.items()
+    }
+
+
+# Filas que cumplen los filtros leyendo del disco solo las particiones que
+# tocan sus predicados de tiempo. Las filas salen en orden de partición;
+# desde/hasta eligen una página y solo esas filas se copian de los memmaps.
+# formato='arrow' devuelve una tabla de pyarrow armada sin pasar por pandas.
+def leer(ruta_csv='ventas.csv', filtros=None, meta=None, desde=0, hasta=None, formato='pandas'):
+    meta = meta or preparar(ruta_csv)
+    ruta = ruta_particiones(ruta_csv)
+    filtros = filtros or {}
+    diccionario = dimensiones.construir_diccionario(esquema(meta))
+    nombres = podar(meta, filtros)
+
+    partes = []
+    saltar = desde
+    faltan = None if hasta is None else max(hasta - desde, 0)
+    leidas = 0
+    for nombre in nombres:
+        if faltan == 0:
+            break
+        columnas = _abrir_particion(ruta, nombre, meta)
+        leidas += 1
+        posiciones = np.flatnonzero(dimensiones.mascara(columnas, filtros, diccionario))
+        if saltar >= len(posiciones):
+            saltar -= len(posiciones)
+            continue
+        posiciones = posiciones[saltar:None if faltan is None else saltar + faltan]
+        saltar = 0
+        if faltan is not None:
+            faltan -= len(posiciones)
+        partes.append({dim: columna[posiciones] for dim, columna in columnas.items()})
+    instrumentacion.contar('particiones.leidas', leidas)
+    instrumentacion.contar('particiones.podadas', len(meta['particiones']) - len(nombres))
+
+    columnas = {
+        dim: np.concatenate([parte[dim] for parte in partes]) if partes else np.zeros(0, dtype=tipo)
+        for dim, (_, tipo) in almacen.COLUMNAS.items()
+    }
+    if formato == 'arrow':
+        return tablas_arrow.desde_columnas(columnas, meta)
+    return almacen.con_fechas(almacen.a_dataframe(columnas, meta))
+
+
+# Map: cubo de una partición (se ejecuta en un worker)
+def _cubo_particion(ruta, nombre, meta):
+    return cubo.construir_cubo(leer_particion(ruta, nombre, meta))
+
+
+# Cubo completo como map-reduce sobre las particiones. pool.map devuelve los
+# parciales en el orden de las particiones y se combinan siempre en ese orden.
+def construir_cubo(ruta_csv='ventas.csv', procesos=PROCESOS):
+    meta = preparar(ruta_csv)
+    ruta = ruta_particiones(ruta_csv)
+    nombres = list(meta['particiones'])
+    if not nombres:
+        return cubo.construir_cubo(almacen.cargar_ventas(ruta_csv))
+
+    argumentos = ([ruta] * len(nombres), nombres, [meta] * len(nombres))
+    if procesos <= 1:
+        parciales = map(_cubo_particion, *argumentos)
+        return reduce(cubo.combinar, parciales)
+    with ProcessPoolExecutor(max_workers=min(procesos, len(nombres))) as pool:
+        return reduce(cubo.combinar, pool.map(_cubo_particion, *argumentos))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Particiones Año/Mes del almacén y cubo en paralelo.")
+    parser.add_argument('csv', nargs='?', default='ventas.csv', help="CSV base del almacén")
+    parser.add_argument('--procesos', type=int, default=PROCESOS, help="Procesos del pool (1 = secuencial)")
+    args = parser.parse_args()
+
+    meta = preparar(args.csv)
+    print(f"{len(meta['particiones'])} particiones en {ruta_particiones(args.csv)}")
+    inicio = time.perf_counter()
+    resultado = construir_cubo(args.csv, args.procesos)
+    print(f"Cubo construido con {args.procesos} procesos en {time.perf_counter() - inicio:.2f} s "
+          f"({int(resultado['conteo'].sum()):,} registros)")
@@ -0,0 +1,145 @@
+# presupuesto_render.py
+# Presupuesto de render para los gráficos y tablas del dashboard: limita
+# las hojas de sunburst/treemap, las categorías de barras y heatmaps y los
+# puntos de las series, agrupando la cola larga en "Otros", y pagina las
+# tablas de detalle en el servidor. Cada función informa qué se podó.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+OTROS = 'Otros'
+
+MAX_HOJAS = int(os.environ.get('OLAP_MAX_HOJAS', '300'))
+MAX_CATEGORIAS = int(os.environ.get('OLAP_MAX_CATEGORIAS', '25'))
+MAX_PUNTOS = int(os.environ.get('OLAP_MAX_PUNTOS', '2000'))
+FILAS_POR_PAGINA = int(os.environ.get('OLAP_FILAS_POR_PAGINA', '500'))
+
+
+# Dentro de cada grupo, quedarse con los k hijos de mayor valor y sumar el
+# resto en una fila "Otros"
+def _top_k_por_grupo(df, grupos, categoria, valor, k):
+    if grupos:
+        rango = df.groupby(grupos, sort=False)[valor].rank(method='first', ascending=False)
+    else:
+        rango = df[valor].rank(method='first', ascending=False)
+    conservar = rango <= k
+    if conservar.all():
+        return df, 0
+    cola = df[~conservar]
+    if grupos:
+        otros = cola.groupby(grupos, as_index=False, sort=False)[valor].sum()
+    else:
+        otros = pd.DataFrame({valor: [cola[valor].sum()]})
+    otros[categoria] = OTROS
+    return pd.concat([df[conservar], otros[df.columns]], ignore_index=True), len(cola)
+
+
+# Limitar las hojas de una jerarquía (sunburst/treemap). Se recorta primero
+# el último nivel con un top-k por padre; si ni así entra en el presupuesto,
+# se quita el nivel más profundo de la ruta.
+def limitar_hojas(df, ruta, valor, max_hojas=MAX_HOJAS):
+    ruta = list(ruta)
+    datos = df.groupby(ruta, as_index=False, sort=False, observed=True)[valor].sum()
+    info = {'hojas_originales': len(datos), 'agrupadas': 0, 'niveles_omitidos': []}
+
+    while len(datos) > max_hojas and len(ruta) > 1:
+        padres = ruta[:-1]
+        grupos = datos.groupby(padres, sort=False, observed=True).ngroups
+        k = max_hojas // grupos
+        if k >= 2:
+            # k - 1 hijos por padre más su "Otros"
+            datos = datos.astype({ruta[-1]: object})
+            datos, agrupadas = _top_k_por_grupo(datos, padres, ruta[-1], valor, k - 1)
+            info['agrupadas'] += agrupadas
+            break
+        info['niveles_omitidos'].append(ruta.pop())
+        datos = datos.groupby(ruta, as_index=False, sort=False, observed=True)[valor].sum()
+
+    info['hojas_mostradas'] = len(datos)
+    info['ruta'] = ruta
+    return datos, info
+
+
+# Limitar las categorías distintas de una columna (colores de barras) a las
+# n de mayor total; el resto se suma como "Otros"
+def limitar_categorias(df, categoria, valor, otras_dims=(), max_categorias=MAX_CATEGORIAS):
+    totales = df.groupby(categoria, observed=True)[valor].sum().sort_values(ascending=False)
+    info = {'categorias_originales': len(totales), 'agrupadas': 0}
+    if len(totales) <= max_categorias:
+        info['categorias_mostradas'] = len(totales)
+        return df, info
+    conservar = set(totales.index[:max_categorias - 1])
+    datos = df.astype({categoria: object})
+    datos.loc[~datos[categoria].isin(conservar), categoria] = OTROS
+    datos = datos.groupby(list(otras_dims) + [categoria], as_index=False, sort=False)[valor].sum()
+    info['agrupadas'] = len(totales) - len(conservar)
+    info['categorias_mostradas'] = len(conservar) + 1
+    return datos, info
+
+
+# Limitar filas y columnas de una tabla dinámica (heatmap) sumando la cola
+# en una fila/columna "Otros"
+def limitar_matriz(pivot, max_categorias=MAX_CATEGORIAS):
+    info = {'forma_original': pivot.shape, 'agrupadas': 0}
+
+    def recortar(tabla):
+        if len(tabla) <= max_categorias:
+            return tabla, 0
+        orden = tabla.sum(axis=1).sort_values(ascending=False).index
+        cabeza = tabla.loc[orden[:max_categorias - 1]]
+        cola = tabla.loc[orden[max_categorias - 1:]]
+        otros = pd.DataFrame([cola.sum()], index=[OTROS])
+        return pd.concat([cabeza, otros]), len(cola)
+
+    resultado, filas = recortar(pivot)
+    resultado, columnas = recortar(resultado.T)
+    resultado = resultado.T
+    info['agrupadas'] = filas + columnas
+    info['forma_mostrada'] = resultado.shape
+    return resultado, info
+
+
+# Reducir una serie a lo sumo a max_puntos conservando el mínimo y el máximo
+# de cada tramo, para que los picos sigan viéndose
+def reducir_puntos(df, x, y, max_puntos=MAX_PUNTOS):
+    info = {'puntos_originales': len(df)}
+    if len(df) <= max_puntos:
+        info['puntos_mostrados'] = len(df)
+        return df, info
+    tramos = max(max_puntos // 2, 1)
+    valores = df[y].to_numpy()
+    limites = np.linspace(0, len(df), tramos + 1).astype(int)
+    posiciones = []
+    for inicio, fin in zip(limites[:-1], limites[1:]):
+        if fin <= inicio:
+            continue
+        tramo = valores[inicio:fin]
+        par = sorted({inicio + int(np.argmin(tramo)), inicio + int(np.argmax(tramo))})
+        posiciones.extend(par)
+    datos = df.iloc[posiciones]
+    info['puntos_mostrados'] = len(datos)
+    return datos, info
+
+
+# Número de páginas y rango [desde, hasta) de una página de la tabla
+def pagina(total_filas, numero, filas_por_pagina=FILAS_POR_PAGINA):
+    paginas = max((total_filas + filas_por_pagina - 1) // filas_por_pagina, 1)
+    numero = min(max(numero, 1), paginas)
+    desde = (numero - 1) * filas_por_pagina
+    return paginas, desde, min(desde + filas_por_pagina, total_filas)
+
+
+# Texto breve con lo que se podó (None si no se podó nada)
+def describir(info):
+    partes = []
+    if info.get('agrupadas'):
+        partes.append(f"{info['agrupadas']:,} elementos agrupados en \"{OTROS}\"")
+    if info.get('niveles_omitidos'):
+        partes.append(f"niveles omitidos: {', '.join(info['niveles_omitidos'])}")
+    if info.get('puntos_originales', 0) > info.get('puntos_mostrados', 0):
+        partes.append(f"{info['puntos_originales']:,} puntos reducidos a {info['puntos_mostrados']:,}")
+    if not partes:
+        return None
+    return "Presupuesto de render: " + "; ".join(partes)
@@ -0,0 +1,363 @@
+# prueba_carga.py
+# Prueba de carga del dashboard con muchas sesiones simultáneas. Cada sesión
+# es un AppTest de Streamlit (streamlit.testing.v1) que ejecuta
+# app_ventas.py sin navegador ni servidor, dentro de este proceso: como en
+# el servidor real, todas comparten el motor, las cachés y el servicio de
+# consultas (st.cache_resource) y cada una tiene su propio session_state.
+#
+# Cada sesión reproduce una traza de interacciones (cambiar de año, elegir
+# producto y región en el Slice, armar un Dice, cambiar el nivel del
+# Roll-up, bajar por el Drill-down, reconfigurar el Pivot) y se mide cada
+# rerun. El informe da percentiles de latencia por acción, reruns por
+# segundo, CPU del proceso y memoria por sesión, y se puede comparar con
+# una corrida anterior para detectar regresiones de concurrencia:
+#
+#   python prueba_carga.py --sesiones 100 --concurrencia 20 --salida carga.json
+#   python prueba_carga.py --sesiones 100 --concurrencia 20 --comparar carga.json
+#
+# Las trazas se generan al azar (--semilla) o se leen de un JSON (--trazas):
+# una lista de sesiones, cada una una lista de pasos
+# [acción, pestaña o null, {clave del widget: valor}].
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import almacen
+import instrumentacion
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app_ventas.py')
+PESTAÑA_INICIAL = 'Slice Analysis'
+
+# Tipos de widget en los que se busca cada clave de una traza
+TIPOS_WIDGET = ['selectbox', 'multiselect', 'toggle', 'number_input', 'date_input', 'text_area']
+
+# Reruns mínimos de una acción (en ambas corridas) para compararla: con
+# menos, el p90 es ruido
+MINIMO_MUESTRAS = 10
+
+# Frecuencia relativa de cada acción en las trazas generadas
+PESOS = {'año': 1, 'slice': 3, 'slice_detalle': 1, 'slice_rango': 1, 'dice': 2,
+         'rollup': 2, 'drilldown': 2, 'pivot': 2}
+
+
+# Miembros del almacén con los que se arman las trazas
+def miembros(ruta_csv='ventas.csv'):
+    almacen.preparar(ruta_csv)
+    columnas, meta = almacen.abrir_columnas(almacen.ruta_almacen(ruta_csv))
+    primero, ultimo = int(columnas['Fecha'].min()), int(columnas['Fecha'].max())
+    return {
+        'Año': list(range(int(columnas['Año'].min()), int(columnas['Año'].max()) + 1)),
+        'Producto': sorted(meta['categorias']['Producto']),
+        'Región': sorted(meta['categorias']['Región']),
+        'Fecha': (date(1970, 1, 1) + timedelta(days=primero), date(1970, 1, 1) + timedelta(days=ultimo)),
+    }
+
+
+def _algunos(rng, valores):
+    return sorted(rng.sample(valores, rng.randint(1, len(valores))))
+
+
+def _drill(rng):
+    trimestre = rng.randint(1, 4)
+    return {'drill_trimestre': trimestre, 'drill_mes': rng.choice(range(3 * trimestre - 2, 3 * trimestre + 1))}
+
+
+# Cada acción devuelve (pestaña o None para quedarse en la actual, valores)
+ACCIONES = {
+    'año': lambda rng, m: (None, {'filtro_año': rng.choice(m['Año'])}),
+    'slice': lambda rng, m: ('Slice Analysis', {
+        'slice_producto_individual': rng.choice(['Todos'] + m['Producto']),
+        'slice_region_individual': rng.choice(['Todas'] + m['Región']),
+    }),
+    'slice_detalle': lambda rng, m: ('Slice Analysis', {'slice_detalle': rng.random() < 0.5}),
+    'slice_rango': lambda rng, m: ('Slice Analysis', {
+        'slice_rango_fechas': [str(m['Fecha'][1] - timedelta(days=rng.randint(30, 365))), str(m['Fecha'][1])],
+        'slice_ventana': rng.choice([7, 30, 90]),
+    }),
+    'dice': lambda rng, m: ('Dice Operations', {
+        'dice_productos': _algunos(rng, m['Producto']),
+        'dice_regiones': _algunos(rng, m['Región']),
+        'dice_trimestres': _algunos(rng, [1, 2, 3, 4]),
+    }),
+    'rollup': lambda rng, m: ('Roll-up Analysis', {
+        'rollup_nivel': rng.choice(['Año', 'Trimestre', 'Mes']),
+        'rollup_dimension': rng.choice(['Producto', 'Región', 'Ninguna']),
+    }),
+    'drilldown': lambda rng, m: ('Drill-down Explorer', _drill(rng)),
+    'pivot': lambda rng, m: ('Pivot Tables', dict(zip(
+        ('pivot_index', 'pivot_columns'), rng.sample(['Región', 'Producto', 'Mes', 'Trimestre'], 2)
+    ))),
+}
+
+
+# Trazas al azar: 'sesiones' listas de 'pasos' acciones según PESOS
+def generar_trazas(m, sesiones, pasos, semilla=42):
+    rng = random.Random(semilla)
+    nombres = list(PESOS)
+    trazas = []
+    for _ in range(sesiones):
+        traza = []
+        for accion in rng.choices(nombres, weights=[PESOS[n] for n in nombres], k=pasos):
+            pestaña, valores = ACCIONES[accion](rng, m)
+            traza.append([accion, pestaña, valores])
+        trazas.append(traza)
+    return trazas
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        # Sin /proc: el pico del proceso (KB en Linux, bytes en macOS)
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _cpu_s():
+    uso = resource.getrusage(resource.RUSAGE_SELF)
+    return uso.ru_utime + uso.ru_stime
+
+
+# Muestrear el RSS del proceso mientras corre la prueba
+class _Memoria:
+    def __init__(self, intervalo=0.05):
+        self.intervalo = intervalo
+        self.pico = _rss_mb()
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, _rss_mb())
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+        self.pico = max(self.pico, _rss_mb())
+
+
+def _widget(at, clave):
+    for tipo in TIPOS_WIDGET:
+        try:
+            return getattr(at, tipo)(key=clave)
+        except KeyError:
+            continue
+    return None
+
+
+# Fijar un widget como lo haría el usuario. Devuelve False si el widget no
+# está en la pantalla actual o el valor no es una de sus opciones.
+def _fijar(at, clave, valor):
+    widget = _widget(at, clave)
+    if widget is None:
+        return False
+    if clave == 'slice_rango_fechas':
+        valor = tuple(date.fromisoformat(v) for v in valor)
+    opciones = getattr(widget, 'options', None)
+    if opciones is not None:
+        elegidos = valor if isinstance(valor, list) else [valor]
+        if not all(str(v) in opciones for v in elegidos):
+            return False
+    widget.set_value(valor)
+    return True
+
+
+# Reproducir una traza en una sesión nueva: [(acción, segundos, error), ...]
+# y la cantidad de valores omitidos (widgets o valores que no aplicaban)
+def reproducir(traza, pausa=0.0, timeout=120):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    mediciones = []
+    omitidos = 0
+    pestaña = PESTAÑA_INICIAL
+
+    def rerun(accion):
+        # AppTest no conserva la pestaña abierta entre reruns: se fija en
+        # cada uno, como el navegador que la mantiene abierta
+        at.session_state['pestaña_activa'] = pestaña
+        inicio = time.perf_counter()
+        at.run()
+        error = at.exception[0].message if len(at.exception) else None
+        mediciones.append((accion, time.perf_counter() - inicio, error))
+
+    rerun('inicio')
+    for accion, destino, valores in traza:
+        if destino is not None and destino != pestaña:
+            pestaña = destino
+            rerun('pestaña')
+        # Como en el navegador, cada widget que cambia es un rerun (y el
+        # siguiente ve las opciones que dejó el anterior, p. ej. los meses
+        # del trimestre elegido)
+        for clave, valor in valores.items():
+            if _fijar(at, clave, valor):
+                rerun(accion)
+            else:
+                omitidos += 1
+        if pausa:
+            time.sleep(pausa)
+    return mediciones, omitidos
+
+
+# Correr todas las trazas con 'concurrencia' sesiones a la vez
+def ejecutar(trazas, concurrencia, pausa=0.0, timeout=120):
+    # Sesión de calentamiento: carga el motor compartido y queda fuera de
+    # las mediciones; su memoria es la base del proceso
+    inicio = time.perf_counter()
+    reproducir([], timeout=timeout)
+    arranque = time.perf_counter() - inicio
+    # Streamlit ya leyó su configuración (que fija el nivel de log): desde
+    # acá sus avisos de cada rerun solo taparían el informe
+    from streamlit import logger
+    logger.set_log_level('error')
+    base = _rss_mb()
+
+    cpu_inicio = _cpu_s()
+    inicio = time.perf_counter()
+    with _Memoria() as memoria, ThreadPoolExecutor(max_workers=concurrencia,
+                                                   thread_name_prefix='sesion') as pool:
+        resultados = list(pool.map(lambda traza: reproducir(traza, pausa, timeout), trazas))
+    duracion = time.perf_counter() - inicio
+    cpu = _cpu_s() - cpu_inicio
+
+    tiempos = {'rerun': []}
+    errores = []
+    for mediciones, _ in resultados:
+        for accion, segundos, error in mediciones:
+            tiempos['rerun'].append(segundos * 1000)
+            tiempos.setdefault(accion, []).append(segundos * 1000)
+            if error is not None:
+                errores.append(f"{accion}: {error}")
+    reruns = len(tiempos['rerun'])
+    sesiones = len(trazas)
+    return {
+        'sesiones': sesiones,
+        'concurrencia': concurrencia,
+        'arranque_s': arranque,
+        'duracion_s': duracion,
+        'reruns': reruns,
+        'reruns_por_s': reruns / duracion if duracion else 0.0,
+        'omitidos': sum(omitidos for _, omitidos in resultados),
+        'errores': len(errores),
+        'primeros_errores': errores[:5],
+        'latencia': instrumentacion.resumir(tiempos),
+        'cpu_s': cpu,
+        'cpu_por_sesion_s': cpu / sesiones if sesiones else 0.0,
+        'uso_cpu': cpu / duracion / (os.cpu_count() or 1) if duracion else 0.0,
+        'rss_base_mb': base,
+        'rss_pico_mb': memoria.pico,
+        'rss_por_sesion_mb': (memoria.pico - base) / min(concurrencia, sesiones) if sesiones else 0.0,
+    }
+
+
+def imprimir(informe):
+    print(f"{informe['sesiones']} sesiones, {informe['concurrencia']} a la vez: "
+          f"{informe['reruns']:,} reruns en {informe['duracion_s']:.1f} s "
+          f"({informe['reruns_por_s']:.1f} reruns/s, arranque {informe['arranque_s']:.1f} s)")
+    print(f"CPU {informe['cpu_s']:.1f} s ({informe['cpu_por_sesion_s']:.2f} s por sesión, "
+          f"{informe['uso_cpu']:.0%} de {os.cpu_count()} CPUs) · RSS base {informe['rss_base_mb']:.0f} MB, "
+          f"pico {informe['rss_pico_mb']:.0f} MB ({informe['rss_por_sesion_mb']:.1f} MB por sesión activa)")
+    print(f"Errores: {informe['errores']} · valores omitidos: {informe['omitidos']}")
+    for error in informe['primeros_errores']:
+        print(f"  {error}")
+    print(f"\n{'acción':<16} {'n':>7} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'máx ms':>10}")
+    for nombre, r in informe['latencia'].items():
+        print(f"{nombre:<16} {r['n']:>7} {r['p50_ms']:>10.1f} {r['p90_ms']:>10.1f} "
+              f"{r['p99_ms']:>10.1f} {r['max_ms']:>10.1f}")
+
+
+# Comparar contra una corrida anterior: p90 de latencia por acción, reruns
+# por segundo y memoria por sesión. Devuelve las regresiones encontradas.
+def comparar(actual, anterior, tolerancia, minimo_ms):
+    regresiones = []
+    for accion, medicion in actual['latencia'].items():
+        referencia = anterior['latencia'].get(accion)
+        if referencia is None or min(referencia['n'], medicion['n']) < MINIMO_MUESTRAS:
+            continue
+        antes, despues = referencia['p90_ms'], medicion['p90_ms']
+        if despues / antes > 1 + tolerancia and despues - antes > minimo_ms:
+            regresiones.append((f'p90 {accion}', antes, despues))
+    if anterior['reruns_por_s'] and actual['reruns_por_s'] < anterior['reruns_por_s'] / (1 + tolerancia):
+        regresiones.append(('reruns/s', anterior['reruns_por_s'], actual['reruns_por_s']))
+    if (anterior['rss_por_sesion_mb'] > 0
+            and actual['rss_por_sesion_mb'] > anterior['rss_por_sesion_mb'] * (1 + tolerancia)):
+        regresiones.append(('MB por sesión', anterior['rss_por_sesion_mb'], actual['rss_por_sesion_mb']))
+    if actual['errores'] > anterior['errores']:
+        regresiones.append(('errores', anterior['errores'], actual['errores']))
+    for nombre, antes, despues in regresiones:
+        print(f"REGRESIÓN {nombre:<24} {antes:>10.2f} -> {despues:>10.2f}")
+    return regresiones
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prueba de carga del dashboard con sesiones simultáneas.")
+    parser.add_argument('--sesiones', type=int, default=100, help="Sesiones simuladas en total")
+    parser.add_argument('--concurrencia', type=int, default=20, help="Sesiones ejecutándose a la vez")
+    parser.add_argument('--pasos', type=int, default=10, help="Acciones por traza generada")
+    parser.add_argument('--pausa', type=float, default=0.0, help="Segundos de espera entre acciones")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--trazas', metavar='JSON', help="Reproducir estas trazas en lugar de generarlas")
+    parser.add_argument('--guardar-trazas', metavar='JSON', help="Guardar las trazas generadas")
+    parser.add_argument('--timeout', type=float, default=120, help="Segundos máximos por rerun")
+    parser.add_argument('--salida', default='carga_resultados.json', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', metavar='ANTERIOR', help="JSON de una corrida anterior")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Empeoramiento admitido (0.2 = 20%%)")
+    parser.add_argument('--minimo-ms', type=float, default=5.0,
+                        help="Empeoramiento absoluto mínimo para marcar una regresión de latencia")
+    args = parser.parse_args()
+    for opcion in ('sesiones', 'concurrencia', 'pasos'):
+        if getattr(args, opcion) <= 0:
+            parser.error(f"--{opcion} debe ser un entero positivo")
+    if args.timeout <= 0:
+        parser.error("--timeout debe ser positivo")
+    for opcion in ('pausa', 'tolerancia', 'minimo_ms'):
+        if getattr(args, opcion) < 0:
+            parser.error(f"--{opcion.replace('_', '-')} no puede ser negativo")
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # Las sesiones ejecutan el dashboard con rutas relativas a su directorio
+    os.chdir(os.path.dirname(APP))
+
+    if args.trazas:
+        with open(args.trazas, encoding='utf-8') as f:
+            trazas = json.load(f)
+    else:
+        trazas = generar_trazas(miembros(), args.sesiones, args.pasos, args.semilla)
+    if args.guardar_trazas:
+        with open(args.guardar_trazas, 'w', encoding='utf-8') as f:
+            json.dump(trazas, f, ensure_ascii=False)
+
+    informe = ejecutar(trazas, args.concurrencia, args.pausa, args.timeout)
+    imprimir(informe)
+    informe.update({
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'semilla': args.semilla,
+    })
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {args.salida}", file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            if comparar(informe, json.load(f), args.tolerancia, args.minimo_ms):
+                sys.exit(1)
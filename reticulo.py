@@ -0,0 +1,193 @@
+# reticulo.py
+# Vistas materializadas del retículo de dimensiones. Cada subconjunto de
+# Año/Trimestre/Mes/Producto/Región es un nodo del retículo; el cubo base
+# (todas las dimensiones) responde cualquier consulta y un nodo responde las
+# que solo agrupan o filtran por sus dimensiones.
+#
+# Se cuenta cuántas veces se pide cada combinación de dimensiones y cada
+# REVISAR_CADA consultas se eligen de nuevo los nodos a materializar dentro
+# del presupuesto (OLAP_VISTAS_MB) con el criterio greedy de Harinarayan,
+# Rajaraman y Ullman: beneficio (celdas ahorradas x frecuencia) por byte.
+# La revisión corre en el pool del servicio compartido (servicio.py), no en
+# la sesión que llegó al umbral. Cada consulta se resuelve sobre el ancestro
+# materializado más chico y el plan queda registrado para el panel de
+# diagnóstico.
+
+import os
+import threading
+from collections import Counter, deque
+from itertools import combinations
+
+import numpy as np
+
+import cubo
+import instrumentacion
+import servicio
+
+PRESUPUESTO_MB = float(os.environ.get('OLAP_VISTAS_MB', '64'))
+REVISAR_CADA = 50
+BYTES_POR_CELDA = 8 * len(cubo.MEDIDAS)
+
+# Miembro único de una dimensión ya agregada en una vista
+TODOS = '(todos)'
+
+NODOS = [frozenset(combinacion) for n in range(len(cubo.DIMENSIONES))
+         for combinacion in combinations(cubo.DIMENSIONES, n)]
+
+
+# Dimensiones que necesita una consulta canónica: las que agrupa y las que filtra
+def dimensiones_consulta(consulta):
+    dims = set()
+    if consulta.pivot:
+        filas, columnas = consulta.dimensiones
+        dims.update(filas)
+        dims.update(columnas)
+    else:
+        dims.update(consulta.dimensiones)
+    dims.update(dim for dim, _ in consulta.filtros)
+    return frozenset(dims)
+
+
+def nombre_nodo(dims):
+    if dims is None:
+        return 'base'
+    return ' × '.join(dim for dim in cubo.DIMENSIONES if dim in dims) or '(total)'
+
+
+def celdas(vista):
+    return int(vista['suma'].size)
+
+
+# Agregar un cubo hasta las dimensiones indicadas. Las demás quedan como
+# ejes de tamaño 1, así cubo.agregar/pivot/totales funcionan sin cambios.
+def reducir(origen, dims):
+    ejes = tuple(i for i, dim in enumerate(cubo.DIMENSIONES) if dim not in dims)
+    return {
+        'dimensiones': list(cubo.DIMENSIONES),
+        'miembros': {dim: origen['miembros'][dim] if dim in dims else np.array([TODOS])
+                     for dim in cubo.DIMENSIONES},
+        'entero': origen['entero'],
+        'suma': origen['suma'].sum(axis=ejes, keepdims=True),
+        'conteo': origen['conteo'].sum(axis=ejes, keepdims=True),
+        'minimo': origen['minimo'].min(axis=ejes, keepdims=True, initial=np.inf),
+        'maximo': origen['maximo'].max(axis=ejes, keepdims=True, initial=-np.inf),
+    }
+
+
+class Reticulo:
+    def __init__(self, base, presupuesto_bytes=PRESUPUESTO_MB * 1024 * 1024):
+        self.base = base
+        self.presupuesto_bytes = presupuesto_bytes
+        self.vistas = {}                  # dimensiones -> cubo reducido
+        self.frecuencias = Counter()      # dimensiones pedidas -> consultas
+        self.servidas = Counter()         # nodo -> consultas resueltas
+        self.planes = deque(maxlen=20)
+        self._consultas = 0
+        self._lock = threading.Lock()
+
+    def _celdas_nodo(self, dims):
+        if dims is None:
+            return celdas(self.base)
+        return int(np.prod([len(self.base['miembros'][dim]) for dim in dims]))
+
+    # Ancestro más chico entre los nodos dados (None = cubo base)
+    def _ancestro(self, dims, nodos):
+        mejor = None
+        for nodo in nodos:
+            if dims <= nodo and self._celdas_nodo(nodo) < self._celdas_nodo(mejor):
+                mejor = nodo
+        return mejor
+
+    # Anotar la consulta; cada REVISAR_CADA se revisa la selección de vistas
+    # en el pool del servicio compartido, sin demorar a la sesión que llegó
+    # al umbral. Devuelve el Future de la revisión si se lanzó una.
+    def registrar(self, consulta):
+        with self._lock:
+            self.frecuencias[dimensiones_consulta(consulta)] += 1
+            self._consultas += 1
+            revisar = self._consultas % REVISAR_CADA == 0
+        if revisar:
+            return servicio.SERVICIO.lanzar(('reticulo', id(self)), self._revisar)
+        return None
+
+    def _revisar(self):
+        with instrumentacion.medir('reticulo.seleccionar'):
+            return self.seleccionar()
+
+    # Nodo y cubo que responderían la consulta, sin registrarla (EXPLAIN)
+    def elegir(self, consulta):
+        vistas = self.vistas
+        nodo = self._ancestro(dimensiones_consulta(consulta), vistas)
+        return nodo, self.base if nodo is None else vistas[nodo]
+
+    # Cubo sobre el que se ejecuta la consulta (el ancestro más chico)
+    def resolver(self, consulta):
+        dims = dimensiones_consulta(consulta)
+        nodo, vista = self.elegir(consulta)
+        nombre = nombre_nodo(nodo)
+        with self._lock:
+            self.servidas[nombre] += 1
+            self.planes.append({'consulta': nombre_nodo(dims), 'vista': nombre, 'celdas': celdas(vista)})
+        instrumentacion.contar(f'reticulo.{nombre}')
+        return vista
+
+    # Elegir los nodos a materializar por beneficio por byte dentro del
+    # presupuesto y materializarlos desde su ancestro más chico ya armado
+    def seleccionar(self):
+        with self._lock:
+            frecuencias = dict(self.frecuencias)
+
+        elegidos = []
+        usado = 0
+        while True:
+            mejor, mejor_razon = None, 0.0
+            for nodo in NODOS:
+                tamaño = self._celdas_nodo(nodo) * BYTES_POR_CELDA
+                # Un nodo sin celdas (alguna dimensión sin miembros) no ahorra nada
+                if tamaño == 0 or nodo in elegidos or usado + tamaño > self.presupuesto_bytes:
+                    continue
+                beneficio = 0
+                for dims, frecuencia in frecuencias.items():
+                    if dims <= nodo:
+                        actual = self._celdas_nodo(self._ancestro(dims, elegidos))
+                        beneficio += frecuencia * max(actual - self._celdas_nodo(nodo), 0)
+                if beneficio / tamaño > mejor_razon:
+                    mejor, mejor_razon = nodo, beneficio / tamaño
+            if mejor is None:
+                break
+            elegidos.append(mejor)
+            usado += self._celdas_nodo(mejor) * BYTES_POR_CELDA
+
+        previas = self.vistas
+        nuevas = {}
+        for nodo in sorted(elegidos, key=self._celdas_nodo, reverse=True):
+            if nodo in previas:
+                nuevas[nodo] = previas[nodo]
+                continue
+            origen = self._ancestro(nodo, nuevas)
+            nuevas[nodo] = reducir(self.base if origen is None else nuevas[origen], nodo)
+        self.vistas = nuevas
+        return [nombre_nodo(nodo) for nodo in elegidos]
+
+    # Vistas armadas y frecuencias de consulta, para guardarlas
+    def estado(self):
+        with self._lock:
+            return dict(self.vistas), dict(self.frecuencias)
+
+    # Retomar vistas y frecuencias guardadas (instantanea.py)
+    def restaurar(self, vistas, frecuencias):
+        with self._lock:
+            self.vistas = dict(vistas)
+            self.frecuencias = Counter(frecuencias)
+
+    # Vistas materializadas, consultas servidas por cada una y últimos planes
+    def estadisticas(self):
+        with self._lock:
+            vistas = [
+                {'vista': nombre_nodo(nodo), 'celdas': celdas(vista),
+                 'KB': celdas(vista) * BYTES_POR_CELDA / 1024, 'consultas': self.servidas[nombre_nodo(nodo)]}
+                for nodo, vista in self.vistas.items()
+            ]
+            vistas.append({'vista': 'base', 'celdas': celdas(self.base),
+                           'KB': celdas(self.base) * BYTES_POR_CELDA / 1024, 'consultas': self.servidas['base']})
+            return {'vistas': vistas, 'planes': list(self.planes)}
@@ -0,0 +1,77 @@
+# servicio.py
+# Servicio de consultas compartido por todas las sesiones de Streamlit. El
+# motor, el cubo y la caché ya son únicos por proceso (st.cache_resource);
+# acá se acota el trabajo pesado: los cálculos que no salen de la caché y
+# las lecturas de filas corren en un pool de OLAP_HILOS_CONSULTA hilos, y
+# si varias sesiones piden la misma consulta mientras se calcula, esperan
+# el mismo resultado en lugar de repetirlo.
+#
+# Con 200 usuarios la memoria no crece por sesión: hay a lo sumo
+# OLAP_HILOS_CONSULTA cálculos en curso y un resultado por consulta
+# distinta. Los resultados se comparten entre sesiones y no deben modificarse.
+
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentacion
+
+HILOS = int(os.environ.get('OLAP_HILOS_CONSULTA', '0')) or min(4, os.cpu_count() or 1)
+
+
+class Servicio:
+    def __init__(self, hilos=HILOS):
+        self.hilos = hilos
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='consulta')
+        self._en_curso = {}      # clave -> Future
+        self._lock = threading.Lock()
+        self._contadores = Counter()
+
+    def _terminar(self, clave, futuro):
+        with self._lock:
+            if self._en_curso.get(clave) is futuro:
+                del self._en_curso[clave]
+
+    # Resultado de calcular() para la clave. Si ya hay un cálculo en curso
+    # con la misma clave se espera ese; si no, se encola en el pool.
+    def ejecutar(self, clave, calcular):
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            nuevo = futuro is None
+            if nuevo:
+                futuro = self._pool.submit(calcular)
+                self._en_curso[clave] = futuro
+            self._contadores['ejecutadas' if nuevo else 'agrupadas'] += 1
+        if nuevo:
+            # Fuera del lock: si ya terminó, el callback corre en este hilo
+            futuro.add_done_callback(lambda f: self._terminar(clave, f))
+        else:
+            instrumentacion.contar('servicio.agrupadas')
+        return futuro.result()
+
+    # Encolar calcular() en el pool sin esperarlo, para trabajo de fondo que
+    # no debe pagar la sesión que lo dispara (revisar las vistas del
+    # retículo). Si ya hay uno en curso con la clave, se devuelve ese Future.
+    def lanzar(self, clave, calcular):
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                return futuro
+            futuro = self._pool.submit(calcular)
+            self._en_curso[clave] = futuro
+        futuro.add_done_callback(lambda f: self._terminar(clave, f))
+        return futuro
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'hilos': self.hilos,
+                'en_curso': len(self._en_curso),
+                'ejecutadas': self._contadores['ejecutadas'],
+                'agrupadas': self._contadores['agrupadas'],
+            }
+
+
+# Servicio único del proceso
+SERVICIO = Servicio()
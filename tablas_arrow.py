@@ -0,0 +1,46 @@
+# tablas_arrow.py
+# Tablas Arrow armadas directamente sobre las columnas del almacén, sin
+# pasar por pandas. Los enteros se envuelven sin copiar (Arrow usa el mismo
+# buffer que numpy), Producto, Región y Día_Semana quedan como columnas
+# diccionario (los códigos del almacén más sus categorías) y Fecha como
+# date32 sobre los mismos días desde 1970. st.dataframe recibe la tabla tal
+# cual y no tiene que convertir un DataFrame en cada rerun.
+#
+# pyarrow es opcional: sin él DISPONIBLE es False y se sigue usando pandas.
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+DISPONIBLE = pa is not None
+
+
+def _enteros(columna):
+    return pa.array(np.ascontiguousarray(columna))
+
+
+def _diccionario(codigos, categorias, ordenada=False):
+    return pa.DictionaryArray.from_arrays(_enteros(codigos), pa.array(list(categorias), type=pa.string()),
+                                          ordered=ordenada)
+
+
+# Tabla con las mismas columnas (y en el mismo orden) que almacen.a_dataframe
+def desde_columnas(columnas, meta):
+    return pa.table({
+        'Fecha': _enteros(columnas['Fecha']).view(pa.date32()),
+        'Producto': _diccionario(columnas['Producto'], meta['categorias']['Producto']),
+        'Región': _diccionario(columnas['Región'], meta['categorias']['Región']),
+        'Ventas': _enteros(columnas['Ventas']),
+        'Mes': _enteros(columnas['Mes']),
+        'Año': _enteros(columnas['Año']),
+        'Trimestre': _enteros(columnas['Trimestre']),
+        'Día_Semana': _diccionario(columnas['Día_Semana'], meta['dias_semana'], ordenada=True),
+    })
+
+
+# Filas ya materializadas en pandas (camino sin particiones)
+def desde_dataframe(df):
+    return pa.Table.from_pandas(df, preserve_index=False)
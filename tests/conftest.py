@@ -0,0 +1,64 @@
+# conftest.py
+# Datos compartidos por las pruebas: un ventas.csv chico generado con
+# generador_datos.py y su almacén columnar, en un directorio temporal. Las
+# pruebas comparan cada estructura contra un groupby de pandas sobre las
+# mismas filas leídas directamente del CSV.
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import almacen  # noqa: E402
+import generador_datos  # noqa: E402
+
+FILAS = 6000
+INICIO = '2023-01-01'
+FIN = '2024-12-31'
+
+
+def dia(fecha):
+    return int(np.datetime64(fecha, 'D').astype(np.int64))
+
+
+# Escribir un CSV de 'filas' ventas entre dos fechas (bloques de 2500, un proceso)
+def escribir_ventas(ruta, filas=FILAS, semilla=7, inicio=INICIO, fin=FIN):
+    bloques = generador_datos.generar_bloques(filas, semilla, dia(inicio), dia(fin), 2500, 1)
+    generador_datos.escribir_csv(ruta, bloques)
+    return ruta
+
+
+# Filas del CSV con las columnas de calendario calculadas por pandas
+def leer_ventas(ruta):
+    df = pd.read_csv(ruta, parse_dates=['Fecha'])
+    return df.assign(Año=df['Fecha'].dt.year, Trimestre=df['Fecha'].dt.quarter, Mes=df['Fecha'].dt.month)
+
+
+# Ventas, registros, mínimo y máximo por 'por', como los devuelve el cubo
+def agrupar(df, por):
+    agregaciones = {'Ventas': ('Ventas', 'sum'), 'Registros': ('Ventas', 'size'),
+                    'Mínimo': ('Ventas', 'min'), 'Máximo': ('Ventas', 'max')}
+    if not por:
+        return pd.DataFrame([{columna: df['Ventas'].agg(funcion) for columna, (_, funcion) in agregaciones.items()}])
+    return df.groupby(list(por), sort=True, as_index=False).agg(**agregaciones)
+
+
+@pytest.fixture(scope='session')
+def ruta_csv(tmp_path_factory):
+    ruta = escribir_ventas(str(tmp_path_factory.mktemp('ventas') / 'ventas.csv'))
+    almacen.preparar(ruta)
+    return ruta
+
+
+@pytest.fixture(scope='session')
+def ventas(ruta_csv):
+    return leer_ventas(ruta_csv)
+
+
+@pytest.fixture(scope='session')
+def cubo_ventas(ruta_csv):
+    return almacen.cargar_cubo(ruta_csv)
@@ -0,0 +1,104 @@
+# test_anexar.py
+# Anexar un lote al almacén combina su cubo con el guardado: el resultado
+# es el groupby de todas las filas, y el cubo guardado queda en la versión
+# nueva sin reconstruirse desde las columnas.
+
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import almacen
+import cubo
+import indice_diario
+from conftest import agrupar, escribir_ventas, leer_ventas
+
+
+def test_anexar_lote(tmp_path, monkeypatch):
+    ruta_csv = escribir_ventas(str(tmp_path / 'ventas.csv'), filas=3000, inicio='2023-03-01', fin='2023-12-31')
+    almacen.cargar_cubo(ruta_csv)
+
+    # El lote trae fechas antes y después del histórico y un producto y una región nuevos
+    lote = leer_ventas(escribir_ventas(str(tmp_path / 'lote.csv'), filas=1000, semilla=11,
+                                       inicio='2022-11-01', fin='2024-02-29'))
+    nuevos = pd.DataFrame({'Fecha': pd.to_datetime(['2023-06-15', '2024-01-02']), 'Producto': ['E', 'E'],
+                           'Región': ['Norte', 'Islas'], 'Ventas': [150, 275]})
+    lote = pd.concat([lote, nuevos], ignore_index=True)
+    version = almacen.anexar(lote[almacen.COLUMNAS_LOTE], ruta_csv)
+
+    def reconstruir(*args):
+        raise AssertionError("el cubo anexado debía reutilizarse")
+    monkeypatch.setattr(cubo, 'construir_cubo', reconstruir)
+    assert almacen.preparar(ruta_csv) == version
+    combinado = almacen.cargar_cubo(ruta_csv)
+
+    todas = leer_ventas(ruta_csv)
+    todas = pd.concat([todas, lote.assign(Año=lote['Fecha'].dt.year, Trimestre=lote['Fecha'].dt.quarter,
+                                          Mes=lote['Fecha'].dt.month)], ignore_index=True)
+    for por in (['Año', 'Mes', 'Producto', 'Región'], ['Región'], []):
+        pd.testing.assert_frame_equal(cubo.agregar(combinado, por).reset_index(drop=True), agrupar(todas, por),
+                                      check_dtype=False)
+
+
+def test_anexar_sin_columnas(tmp_path):
+    ruta_csv = escribir_ventas(str(tmp_path / 'ventas.csv'), filas=100)
+    almacen.preparar(ruta_csv)
+    with pytest.raises(ValueError, match='Producto, Región'):
+        almacen.anexar(pd.DataFrame({'Fecha': ['2024-01-01'], 'Ventas': [10]}), ruta_csv)
+
+
+@pytest.mark.parametrize('columna, valor, motivo', [
+    ('Ventas', float('nan'), 'Ventas vacía'),
+    ('Ventas', 12.7, 'Ventas con decimales'),
+    ('Ventas', 3e9, 'Ventas fuera del rango de int32'),
+    ('Ventas', 'doce', 'Ventas vacía o no numérica'),
+    ('Fecha', None, 'Fecha vacía o inválida'),
+    ('Fecha', '2024-02-30', 'Fecha vacía o inválida'),
+    ('Producto', None, 'Producto vacío'),
+    ('Región', '', 'Región vacía'),
+])
+def test_lote_invalido_no_toca_el_almacen(tmp_path, columna, valor, motivo):
+    ruta_csv = escribir_ventas(str(tmp_path / 'ventas.csv'), filas=100)
+    almacen.cargar_cubo(ruta_csv)
+    ruta = almacen.ruta_almacen(ruta_csv)
+    antes = (almacen._leer_meta(ruta), os.path.getsize(os.path.join(ruta, 'ventas.bin')))
+
+    lote = pd.DataFrame({'Fecha': ['2024-01-01'] * 4, 'Producto': ['A'] * 4, 'Región': ['Sur'] * 4,
+                         'Ventas': [10, 20, 30, 40]}, dtype=object)
+    lote.loc[2, columna] = valor
+    with pytest.raises(ValueError, match=f'{motivo}.* filas 2$'):
+        almacen.anexar(lote, ruta_csv)
+    assert (almacen._leer_meta(ruta), os.path.getsize(os.path.join(ruta, 'ventas.bin'))) == antes
+
+
+# Las estructuras derivadas se extienden antes de publicar la versión nueva
+def test_version_nueva_se_publica_al_final(tmp_path, monkeypatch):
+    ruta_csv = escribir_ventas(str(tmp_path / 'ventas.csv'), filas=200)
+    version_anterior = almacen.preparar(ruta_csv)
+    almacen.cargar_cubo(ruta_csv)
+    vistas = []
+    original = indice_diario.anexar
+
+    def anexar_indice(ruta, columnas, meta, version):
+        vistas.append(almacen._leer_meta(almacen.ruta_almacen(ruta))['version'])
+        return original(ruta, columnas, meta, version)
+    monkeypatch.setattr(indice_diario, 'anexar', anexar_indice)
+
+    lote = leer_ventas(escribir_ventas(str(tmp_path / 'lote.csv'), filas=10, semilla=2))
+    version = almacen.anexar(lote[almacen.COLUMNAS_LOTE], ruta_csv)
+    assert vistas == [version_anterior]
+    assert almacen.preparar(ruta_csv) == version
+
+
+def test_anexados_simultaneos(tmp_path):
+    ruta_csv = escribir_ventas(str(tmp_path / 'ventas.csv'), filas=200)
+    almacen.cargar_cubo(ruta_csv)
+    lote = leer_ventas(escribir_ventas(str(tmp_path / 'lote.csv'), filas=50, semilla=4))[almacen.COLUMNAS_LOTE]
+    hilos = [threading.Thread(target=almacen.anexar, args=(lote, ruta_csv)) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert almacen.cargar_cubo(ruta_csv)['conteo'].sum() == 400
+    assert len(almacen.cargar_ventas(ruta_csv)) == 400
@@ -0,0 +1,64 @@
+# test_bocetos.py
+# Los cuantiles de los bocetos están a menos de la precisión configurada
+# (1% relativo) del cuantil exacto de pandas sobre las mismas filas
+
+import numpy as np
+import pytest
+
+import almacen
+import bocetos
+from conftest import escribir_ventas, leer_ventas
+
+PROBABILIDADES = (0.05, 0.25, 0.5, 0.9, 0.95, 0.99)
+
+
+@pytest.fixture(scope='module')
+def bocetos_ventas(ruta_csv):
+    return bocetos.cargar(ruta_csv, precision=0.01)
+
+
+@pytest.mark.parametrize('filtros', [
+    None,
+    {'Año': [2024]},
+    {'Producto': ['A'], 'Región': ['Centro', 'Sur']},
+    {'Trimestre': [4], 'Mes': [11, 12, 1]},
+    {'Año': [2023], 'Mes': [6], 'Región': ['Este']},
+])
+def test_cuantiles_dentro_de_la_precision(bocetos_ventas, ventas, filtros):
+    filas = ventas
+    for dim, valores in (filtros or {}).items():
+        filas = filas[filas[dim].isin(valores)]
+    estimados = bocetos.cuantiles(bocetos_ventas, PROBABILIDADES, filtros)
+    for p in PROBABILIDADES:
+        exacto = filas['Ventas'].quantile(p, interpolation='lower')
+        assert abs(estimados[p] - exacto) <= 0.01 * exacto * (1 + 1e-9), (p, estimados[p], exacto)
+
+
+def test_conteos_por_celda(bocetos_ventas, ventas):
+    assert bocetos.combinar(bocetos_ventas).sum() == len(ventas)
+    filtros = {'Producto': ['C'], 'Trimestre': [1]}
+    filas = ventas[(ventas['Producto'] == 'C') & (ventas['Trimestre'] == 1)]
+    assert bocetos.combinar(bocetos_ventas, filtros).sum() == len(filas)
+
+
+def test_slice_sin_datos(bocetos_ventas):
+    assert bocetos.cuantiles(bocetos_ventas, (0.5,), {'Región': ['Inexistente']}) == {0.5: 0.0}
+
+
+# Un lote con ventas fuera de las cubetas guardadas, otros años y un
+# producto nuevo se suma a los bocetos guardados igual que reconstruirlos
+def test_anexar_igual_a_construir(tmp_path):
+    ruta_csv = escribir_ventas(str(tmp_path / 'ventas.csv'), filas=2000, inicio='2023-01-01', fin='2023-12-31')
+    bocetos.cargar(ruta_csv, precision=0.01)
+    lote = leer_ventas(escribir_ventas(str(tmp_path / 'lote.csv'), filas=500, semilla=5,
+                                       inicio='2022-07-01', fin='2024-06-30'))
+    lote.loc[:4, 'Ventas'] = [1, 3, 20, 5000, 90000]
+    lote.loc[5:9, 'Producto'] = 'E'
+    version = almacen.anexar(lote[almacen.COLUMNAS_LOTE], ruta_csv)
+
+    guardados, version_guardada = bocetos._abrir(str(tmp_path / 'ventas_columnar' / bocetos.ARCHIVO_BOCETOS))
+    assert version_guardada == str(version)
+    reconstruidos = bocetos.construir(ruta_csv, precision=0.01)
+    assert guardados['desplazamiento'] == reconstruidos['desplazamiento']
+    for nombre in ('años', 'productos', 'regiones', 'conteos'):
+        np.testing.assert_array_equal(guardados[nombre], reconstruidos[nombre])
@@ -0,0 +1,88 @@
+# test_cache_consultas.py
+# Consultas canónicas, su ejecución sobre el cubo contra un groupby de
+# pandas y el desalojo LRU de la caché de resultados
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache_consultas
+from conftest import agrupar
+
+
+def test_consulta_canonica():
+    a = cache_consultas.consulta(['Año'], {'Región': ['Sur', 'Norte'], 'Producto': 'A'})
+    b = cache_consultas.consulta(['Año'], {'Producto': ['A'], 'Región': ('Norte', 'Sur', 'Norte')})
+    assert a == b and hash(a) == hash(b)
+    assert cache_consultas.consulta(['Año'], {'Año': np.int64(2024)}) == cache_consultas.consulta(['Año'], {'Año': 2024})
+    assert cache_consultas.consulta(['Año'], {'Producto': None}) == cache_consultas.consulta(['Año'])
+    assert cache_consultas.consulta(['Año']) != cache_consultas.consulta(['Año'], agregacion='conteo')
+
+
+def test_agregacion_invalida():
+    with pytest.raises(ValueError):
+        cache_consultas.consulta(['Año'], agregacion='mediana')
+
+
+@pytest.mark.parametrize('agregacion, columna', [('suma', 'Ventas'), ('conteo', 'Registros'),
+                                                  ('minimo', 'Mínimo'), ('maximo', 'Máximo')])
+def test_ejecutar_igual_a_groupby(cubo_ventas, ventas, agregacion, columna):
+    c = cache_consultas.consulta(['Producto', 'Mes'], {'Año': [2024]}, agregacion)
+    esperado = agrupar(ventas[ventas['Año'] == 2024], ['Producto', 'Mes'])[['Producto', 'Mes', columna]]
+    pd.testing.assert_frame_equal(cache_consultas.ejecutar(cubo_ventas, c).reset_index(drop=True), esperado,
+                                  check_dtype=False)
+
+
+def test_ejecutar_totales_y_pivot(cubo_ventas, ventas):
+    totales = cache_consultas.ejecutar(cubo_ventas, cache_consultas.consulta((), {'Región': 'Este'}))
+    assert totales['suma'] == ventas.loc[ventas['Región'] == 'Este', 'Ventas'].sum()
+
+    c = cache_consultas.consulta(('Trimestre', 'Región'), None, 'conteo', pivot=True)
+    esperado = ventas.pivot_table(values='Ventas', index='Trimestre', columns='Región', aggfunc='size', fill_value=0)
+    pd.testing.assert_frame_equal(cache_consultas.ejecutar(cubo_ventas, c), esperado, check_dtype=False,
+                                  check_index_type=False, check_names=False)
+
+
+# Resultados de 800 bytes en una caché de 2000: entran dos
+def _resultado():
+    return np.zeros(100)
+
+
+def test_lru_desaloja_el_menos_usado():
+    cache = cache_consultas.CacheResultados(presupuesto_bytes=2000)
+    calculadas = []
+
+    def obtener(nombre):
+        return cache.obtener(cache_consultas.consulta([nombre]), 1, lambda: calculadas.append(nombre) or _resultado())
+
+    obtener('Año')
+    obtener('Mes')
+    obtener('Año')           # acierto: Año pasa a ser el más reciente
+    obtener('Región')        # desaloja Mes
+    assert calculadas == ['Año', 'Mes', 'Región']
+    obtener('Año')
+    obtener('Mes')
+    assert calculadas == ['Año', 'Mes', 'Región', 'Mes']
+
+    estadisticas = cache.estadisticas()
+    assert estadisticas['entradas'] == 2
+    assert estadisticas['bytes_usados'] == 1600
+    assert (estadisticas['aciertos'], estadisticas['fallos'], estadisticas['desalojos']) == (2, 4, 2)
+
+
+def test_version_nueva_vacia_la_cache():
+    cache = cache_consultas.CacheResultados(presupuesto_bytes=2000)
+    c = cache_consultas.consulta(['Año'])
+    primero = cache.obtener(c, 1, _resultado)
+    assert cache.obtener(c, 1, _resultado) is primero
+    assert cache.obtener(c, 2, _resultado) is not primero
+    assert cache.estadisticas()['entradas'] == 1
+
+
+def test_resultado_mayor_que_el_presupuesto_no_se_guarda():
+    cache = cache_consultas.CacheResultados(presupuesto_bytes=500)
+    c = cache_consultas.consulta(['Año'])
+    cache.obtener(c, 1, _resultado)
+    assert cache.estadisticas()['entradas'] == 0
+    assert cache.obtener(c, 1, _resultado) is not None
+    assert cache.estadisticas()['fallos'] == 2
@@ -0,0 +1,90 @@
+# test_cubo.py
+# El cubo de agregados contra un groupby de pandas sobre las filas del CSV
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cubo
+from conftest import agrupar
+
+
+def _comparar(obtenido, esperado):
+    pd.testing.assert_frame_equal(obtenido.reset_index(drop=True), esperado.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize('por', [
+    [],
+    ['Año'],
+    ['Producto'],
+    ['Región', 'Producto'],
+    ['Año', 'Trimestre', 'Mes'],
+    ['Año', 'Trimestre', 'Mes', 'Producto', 'Región'],
+])
+def test_agregar_igual_a_groupby(cubo_ventas, ventas, por):
+    _comparar(cubo.agregar(cubo_ventas, por), agrupar(ventas, por))
+
+
+def test_agregar_con_filtros(cubo_ventas, ventas):
+    filtros = {'Región': ['Norte', 'Centro'], 'Trimestre': [2, 3], 'Año': 2024}
+    filas = ventas[ventas['Región'].isin(['Norte', 'Centro']) & ventas['Trimestre'].isin([2, 3])
+                   & (ventas['Año'] == 2024)]
+    _comparar(cubo.agregar(cubo_ventas, ['Mes', 'Producto'], filtros), agrupar(filas, ['Mes', 'Producto']))
+
+
+def test_filtro_sin_datos(cubo_ventas):
+    assert cubo.agregar(cubo_ventas, ['Producto'], {'Región': ['Inexistente']}).empty
+    assert cubo.totales(cubo_ventas, {'Año': [1999]})['conteo'] == 0
+
+
+def test_totales(cubo_ventas, ventas):
+    filas = ventas[ventas['Producto'] == 'B']
+    totales = cubo.totales(cubo_ventas, {'Producto': 'B'})
+    assert totales['suma'] == filas['Ventas'].sum()
+    assert totales['conteo'] == len(filas)
+    assert totales['minimo'] == filas['Ventas'].min()
+    assert totales['maximo'] == filas['Ventas'].max()
+    assert totales['promedio'] == pytest.approx(filas['Ventas'].mean())
+
+
+def test_pivot(cubo_ventas, ventas):
+    esperado = ventas.pivot_table(values='Ventas', index='Región', columns='Producto', aggfunc='sum', fill_value=0)
+    obtenido = cubo.pivot(cubo_ventas, 'Región', 'Producto')
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False, check_names=False)
+
+
+def test_miembros(cubo_ventas, ventas):
+    assert cubo.miembros(cubo_ventas, 'Mes', {'Trimestre': [4]}) == [10, 11, 12]
+    assert cubo.miembros(cubo_ventas, 'Región') == sorted(ventas['Región'].unique())
+
+
+def test_guardar_y_cargar(cubo_ventas, tmp_path):
+    ruta = str(tmp_path / 'cubo.npz')
+    cubo.guardar(cubo_ventas, ruta, version=123)
+    cargado, version = cubo.cargar(ruta)
+    assert version == '123'
+    for medida in cubo.MEDIDAS:
+        np.testing.assert_array_equal(cargado[medida], cubo_ventas[medida])
+    for dim in cubo.DIMENSIONES:
+        np.testing.assert_array_equal(cargado['miembros'][dim], cubo_ventas['miembros'][dim])
+
+
+# Dos cubos con miembros distintos (otro año, otros productos) combinados
+# dan lo mismo que el cubo de todas las filas
+def test_combinar(ventas):
+    antes = ventas[(ventas['Año'] == 2023) & ventas['Producto'].isin(['A', 'B'])]
+    despues = ventas.drop(antes.index)
+    combinado = cubo.combinar(cubo.construir_cubo(antes), cubo.construir_cubo(despues))
+    completo = cubo.construir_cubo(ventas)
+    for dim in cubo.DIMENSIONES:
+        np.testing.assert_array_equal(combinado['miembros'][dim], completo['miembros'][dim])
+    for medida in cubo.MEDIDAS:
+        np.testing.assert_array_equal(combinado[medida], completo[medida])
+    _comparar(cubo.agregar(combinado, ['Año', 'Producto']), agrupar(ventas, ['Año', 'Producto']))
+
+
+def test_combinar_con_cubo_vacio(ventas):
+    vacio = cubo.construir_cubo(ventas.iloc[:0])
+    combinado = cubo.combinar(vacio, cubo.construir_cubo(ventas))
+    _comparar(cubo.agregar(combinado, ['Región']), agrupar(ventas, ['Región']))
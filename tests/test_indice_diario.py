@@ -0,0 +1,104 @@
+# test_indice_diario.py
+# El índice de sumas acumuladas por día es exacto: rangos, agrupaciones,
+# ventanas móviles e interanuales iguales a los de pandas sobre las filas
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import almacen
+import indice_diario
+from conftest import escribir_ventas, leer_ventas
+
+
+@pytest.fixture(scope='module')
+def indice(ruta_csv):
+    return indice_diario.cargar(ruta_csv)
+
+
+def _entre(ventas, desde, hasta):
+    return ventas[(ventas['Fecha'] >= desde) & (ventas['Fecha'] <= hasta)]
+
+
+def test_limites(indice, ventas):
+    primero, ultimo = indice_diario.limites(indice)
+    assert pd.Timestamp(primero) == ventas['Fecha'].min()
+    assert pd.Timestamp(ultimo) == ventas['Fecha'].max()
+
+
+@pytest.mark.parametrize('desde, hasta, filtros', [
+    ('2023-01-01', '2024-12-31', None),
+    ('2023-02-14', '2023-02-14', None),
+    ('2023-11-20', '2024-03-05', {'Producto': ['A', 'D'], 'Región': ['Sur']}),
+    ('2022-06-01', '2023-01-10', {'Región': ['Centro']}),
+    ('2030-01-01', '2030-12-31', None),
+])
+def test_rango(indice, ventas, desde, hasta, filtros):
+    filas = _entre(ventas, desde, hasta)
+    for dim, valores in (filtros or {}).items():
+        filas = filas[filas[dim].isin(valores)]
+    assert indice_diario.rango(indice, desde, hasta, filtros) == {'suma': filas['Ventas'].sum(), 'conteo': len(filas)}
+
+
+@pytest.mark.parametrize('por', [['Fecha'], ['Producto'], ['Fecha', 'Región'], ['Producto', 'Región'], []])
+def test_agrupar(indice, ventas, por):
+    desde, hasta, filtros = '2024-03-01', '2024-04-15', {'Producto': ['B', 'C']}
+    filas = _entre(ventas, desde, hasta)
+    filas = filas[filas['Producto'].isin(['B', 'C'])]
+    if por:
+        esperado = filas.groupby(por, as_index=False).agg(Ventas=('Ventas', 'sum'), Registros=('Ventas', 'size'))
+    else:
+        esperado = pd.DataFrame([{'Ventas': filas['Ventas'].sum(), 'Registros': len(filas)}])
+    obtenido = indice_diario.agrupar(indice, por, desde, hasta, filtros)
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+
+
+def test_movil(indice, ventas):
+    filtros = {'Región': ['Norte']}
+    diarias = ventas[ventas['Región'] == 'Norte'].groupby('Fecha')['Ventas'].sum()
+    diarias = diarias.reindex(pd.date_range('2023-01-01', '2024-12-31', freq='D'), fill_value=0)
+    esperado = diarias.rolling(30).sum()
+
+    tabla = indice_diario.movil(indice, 30, '2023-01-15', '2024-12-31', filtros)
+    obtenido = tabla.set_index('Fecha')['Ventas']
+    # Las ventanas que empiezan antes del primer día quedan vacías
+    assert obtenido.loc[:'2023-01-29'].isna().all()
+    pd.testing.assert_series_equal(obtenido.loc['2023-01-30':], esperado.loc['2023-01-30':], check_names=False,
+                                   check_freq=False)
+    anterior = tabla.set_index('Fecha')['Año anterior']
+    assert anterior.loc[:'2024-01-29'].isna().all()
+    np.testing.assert_array_equal(anterior.loc['2024-03-01':'2024-12-31'].to_numpy(),
+                                  esperado.loc['2023-03-01':'2023-12-31'].to_numpy())
+
+
+def test_interanual(indice, ventas):
+    resultado = indice_diario.interanual(indice, '2024-06-01', '2024-08-31')
+    actual = _entre(ventas, '2024-06-01', '2024-08-31')['Ventas'].sum()
+    anterior = _entre(ventas, '2023-06-01', '2023-08-31')['Ventas'].sum()
+    assert resultado['actual']['suma'] == actual
+    assert resultado['anterior']['suma'] == anterior
+    assert resultado['variacion'] == pytest.approx((actual - anterior) / anterior)
+
+
+def test_dias_con_ventas(indice, ventas):
+    filas = ventas[(ventas['Producto'] == 'A') & (ventas['Región'] == 'Oeste') & (ventas['Trimestre'] == 2)]
+    filtros = {'Producto': ['A'], 'Región': ['Oeste'], 'Trimestre': [2]}
+    assert indice_diario.dias_con_ventas(indice, filtros) == filas['Fecha'].nunique()
+
+
+# Anexar un lote con días antes y después del rango y un producto nuevo
+# deja guardado el mismo índice que reconstruirlo desde el almacén
+def test_anexar_igual_a_construir(tmp_path):
+    ruta_csv = escribir_ventas(str(tmp_path / 'ventas.csv'), filas=2000, inicio='2023-05-01', fin='2023-08-31')
+    indice_diario.cargar(ruta_csv)
+    lote = leer_ventas(escribir_ventas(str(tmp_path / 'lote.csv'), filas=500, semilla=3,
+                                       inicio='2023-03-01', fin='2023-10-31'))
+    lote.loc[:9, 'Producto'] = 'E'
+    version = almacen.anexar(lote[almacen.COLUMNAS_LOTE], ruta_csv)
+
+    guardado, version_guardada = indice_diario._abrir(str(tmp_path / 'ventas_columnar' / indice_diario.ARCHIVO_INDICE))
+    assert version_guardada == str(version)
+    reconstruido = indice_diario.construir(ruta_csv)
+    assert guardado['inicio'] == reconstruido['inicio']
+    for nombre in ('productos', 'regiones', 'suma', 'conteo'):
+        np.testing.assert_array_equal(guardado[nombre], reconstruido[nombre])
@@ -0,0 +1,182 @@
+# test_lenguaje_olap.py
+# Análisis de SELECT ... BY ... WHERE, errores de sintaxis, poda de filtros,
+# elección de fuente y resultados contra un groupby de pandas
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache_consultas
+import lenguaje_olap
+from conftest import agrupar
+from motor_olap import MotorOLAP
+
+
+@pytest.fixture(scope='module')
+def motor(ruta_csv):
+    return MotorOLAP.desde_almacen(ruta_csv, cache=False, procesos=1, particionado=True)
+
+
+def _comparar(obtenido, esperado):
+    pd.testing.assert_frame_equal(obtenido.reset_index(drop=True), esperado.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+
+
+# --- Análisis -----------------------------------------------------------
+
+def test_analizar_consulta_completa():
+    consulta = lenguaje_olap.analizar(
+        "EXPLAIN SELECT SUM(Ventas), AVG(Ventas), COUNT(*) BY Año, Producto "
+        "WHERE Región IN ('Norte', \"Sur\") AND Trimestre BETWEEN 2 AND 3 AND Fecha = '2024-05-01' "
+        "ORDER BY Ventas DESC LIMIT 10;")
+    assert consulta.explicar
+    assert consulta.medidas == ['Ventas', 'Promedio', 'Registros']
+    assert consulta.dimensiones == ['Año', 'Producto']
+    assert consulta.condiciones == [
+        ('Región', 'IN', ['Norte', 'Sur']),
+        ('Trimestre', 'BETWEEN', (2, 3)),
+        ('Fecha', 'BETWEEN', (np.datetime64('2024-05-01'), np.datetime64('2024-05-01'))),
+    ]
+    assert consulta.orden == ('Ventas', True)
+    assert consulta.limite == 10
+
+
+def test_analizar_sin_mayusculas_ni_tildes():
+    consulta = lenguaje_olap.analizar("select ventas, minimo, ventas group by anio, region, dia_semana "
+                                      "where producto = 'A' order by region")
+    assert consulta.medidas == ['Ventas', 'Mínimo']
+    assert consulta.dimensiones == ['Año', 'Región', 'Día_Semana']
+    assert consulta.condiciones == [('Producto', 'IN', ['A'])]
+    assert consulta.orden == ('Región', False)
+    assert not consulta.explicar
+
+
+@pytest.mark.parametrize('texto, mensaje', [
+    ("", "Se esperaba SELECT"),
+    ("Ventas BY Año", "Se esperaba SELECT"),
+    ("SELECT", "Medida desconocida"),
+    ("SELECT Ganancia", "Medida desconocida"),
+    ("SELECT SUM(Registros)", "Solo se agrega la medida Ventas"),
+    ("SELECT SUM(*)", r"SUM\(\*\) no tiene sentido"),
+    ("SELECT SUM(Ventas", "Se esperaba \\)"),
+    ("SELECT Ventas BY", "Se esperaba una dimensión"),
+    ("SELECT Ventas BY Color", "Dimensión desconocida: Color"),
+    ("SELECT Ventas GROUP Año", "Se esperaba BY"),
+    ("SELECT Ventas WHERE Región", "Condición incompleta"),
+    ("SELECT Ventas WHERE Año = 'dos mil'", "Año es numérica"),
+    ("SELECT Ventas WHERE Fecha = '2024-13-40'", "Fecha inválida"),
+    ("SELECT Ventas WHERE Fecha IN ('2024-01-01')", "Fecha se filtra con = o BETWEEN"),
+    ("SELECT Ventas WHERE Producto IN ('A'", "Se esperaba \\)"),
+    ("SELECT Ventas WHERE Mes BETWEEN 1", "Se esperaba AND"),
+    ("SELECT Ventas WHERE Producto =", "Se esperaba un valor"),
+    ("SELECT Ventas WHERE Año = 2024 OR Año = 2023", "Sobra texto"),
+    ("SELECT Ventas BY Año LIMIT", "LIMIT necesita un entero"),
+    ("SELECT Ventas BY Año LIMIT -1", "LIMIT necesita un entero"),
+    ("SELECT Ventas BY Año ORDER BY Producto", "no está en el resultado"),
+    ("SELECT Ventas; DROP", "Símbolo inesperado"),
+    ("SELECT Ventas WHERE Ventas > 10", "Símbolo inesperado"),
+    ("SELECT Ventas WHERE Ventas = 10", "Dimensión desconocida: Ventas"),
+])
+def test_errores_de_sintaxis(texto, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        lenguaje_olap.analizar(texto)
+
+
+# --- Planificación y ejecución ------------------------------------------
+
+def test_cubo_igual_a_groupby(motor, ventas):
+    resultado, plan = lenguaje_olap.consultar(
+        "SELECT SUM(Ventas), COUNT(*), AVG(Ventas) BY Año, Producto "
+        "WHERE Región IN ('Norte', 'Sur') AND Trimestre BETWEEN 2 AND 3", motor)
+    assert plan.fuente == 'cubo'
+    filas = ventas[ventas['Región'].isin(['Norte', 'Sur']) & ventas['Trimestre'].between(2, 3)]
+    esperado = agrupar(filas, ['Año', 'Producto'])
+    esperado['Promedio'] = esperado['Ventas'] / esperado['Registros']
+    _comparar(resultado, esperado[['Año', 'Producto', 'Ventas', 'Registros', 'Promedio']])
+
+
+def test_totales_sin_dimensiones(motor, ventas):
+    resultado, plan = lenguaje_olap.consultar("SELECT MIN(Ventas), MAX(Ventas), COUNT(*) WHERE Mes = 2", motor)
+    assert plan.fuente == 'cubo'
+    _comparar(resultado, agrupar(ventas[ventas['Mes'] == 2], [])[['Mínimo', 'Máximo', 'Registros']])
+
+
+def test_diario_igual_a_groupby(motor, ventas):
+    resultado, plan = lenguaje_olap.consultar(
+        "SELECT Ventas, Registros BY Fecha WHERE Fecha BETWEEN '2024-03-01' AND '2024-03-31' AND Producto = 'A'",
+        motor)
+    assert plan.fuente == 'diario'
+    filas = ventas[ventas['Fecha'].between('2024-03-01', '2024-03-31') & (ventas['Producto'] == 'A')]
+    _comparar(resultado, agrupar(filas, ['Fecha'])[['Fecha', 'Ventas', 'Registros']])
+
+
+def test_filas_con_rango_de_fechas(motor, ventas):
+    resultado, plan = lenguaje_olap.consultar(
+        "SELECT Ventas, Máximo BY Mes, Región WHERE Fecha BETWEEN '2023-02-10' AND '2023-04-20'", motor)
+    assert plan.fuente == 'filas'
+    filas = ventas[ventas['Fecha'].between('2023-02-10', '2023-04-20')]
+    _comparar(resultado, agrupar(filas, ['Mes', 'Región'])[['Mes', 'Región', 'Ventas', 'Máximo']])
+
+
+def test_filas_por_dia_de_semana(motor, ventas):
+    resultado, plan = lenguaje_olap.consultar(
+        "SELECT MIN(Ventas), MAX(Ventas) BY Día_Semana WHERE Año = 2024", motor)
+    assert plan.fuente == 'filas'
+    filas = ventas[ventas['Año'] == 2024]
+    filas = filas.assign(Día_Semana=pd.Categorical(filas['Fecha'].dt.day_name(),
+                                                   ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+                                                    'Saturday', 'Sunday'], ordered=True))
+    esperado = filas.groupby('Día_Semana', observed=True, as_index=False).agg(
+        Mínimo=('Ventas', 'min'), Máximo=('Ventas', 'max'))
+    _comparar(resultado, esperado)
+
+
+def test_orden_y_limite(motor, ventas):
+    resultado, _ = lenguaje_olap.consultar("SELECT Ventas BY Mes, Producto ORDER BY Ventas DESC LIMIT 3", motor)
+    esperado = agrupar(ventas, ['Mes', 'Producto']).sort_values('Ventas', ascending=False, kind='stable').head(3)
+    _comparar(resultado, esperado[['Mes', 'Producto', 'Ventas']])
+
+
+def test_poda_de_filtros(motor):
+    plan = lenguaje_olap.planificar(lenguaje_olap.analizar(
+        "SELECT Ventas BY Producto WHERE Región IN ('Norte', 'Marte') AND Región IN ('Norte', 'Sur') "
+        "AND Producto IN ('A', 'B', 'C', 'D')"), motor)
+    assert plan.fuente == 'cubo'
+    assert plan.filtros == {'Región': ['Norte']}
+
+
+@pytest.mark.parametrize('condicion', [
+    "Producto IN ('Z')",
+    "Fecha BETWEEN '2030-01-01' AND '2030-12-31'",
+    "Producto = 'A' AND Producto IN ('B', 'C')",
+])
+def test_resultado_vacio_sin_leer_datos(motor, condicion):
+    resultado, plan = lenguaje_olap.consultar(f"SELECT Ventas BY Producto WHERE {condicion}", motor)
+    assert plan.fuente == 'vacío' and plan.costo == 0
+    assert resultado.empty and list(resultado.columns) == ['Producto', 'Ventas']
+
+
+def test_fecha_que_cubre_todo_se_descarta(motor):
+    plan = lenguaje_olap.planificar(lenguaje_olap.analizar(
+        "SELECT Ventas BY Región WHERE Fecha BETWEEN '2000-01-01' AND '2099-12-31'"), motor)
+    assert plan.fuente == 'cubo' and plan.fechas is None
+
+
+def test_explain(motor):
+    tabla, plan = lenguaje_olap.consultar("EXPLAIN SELECT Ventas BY Región WHERE Año = 2024 LIMIT 2", motor)
+    assert list(tabla.columns) == ['Paso', 'Detalle', 'Costo']
+    assert tabla.iloc[0].tolist() == ['Fuente', 'cubo', 0]
+    assert tabla.iloc[-1]['Paso'] == 'Total' and tabla.iloc[-1]['Costo'] == plan.costo
+    assert 'Limitar' in set(tabla['Paso'])
+
+
+# Con la vista Producto materializada el plan la usa y cuesta sus celdas
+def test_plan_usa_la_vista_materializada(ruta_csv):
+    motor = MotorOLAP.desde_almacen(ruta_csv, cache=False, procesos=1, particionado=True)
+    for _ in range(10):
+        motor.reticulo.registrar(cache_consultas.consulta(['Producto'], None, 'todas'))
+    motor.reticulo.seleccionar()
+    plan = lenguaje_olap.planificar(lenguaje_olap.analizar("SELECT Ventas BY Producto"), motor)
+    assert plan.fuente == 'cubo'
+    assert 'vista materializada Producto' in plan.pasos[-1][1]
+    assert plan.costo == 4
@@ -0,0 +1,93 @@
+# test_reticulo.py
+# Selección greedy de vistas (Harinarayan, Rajaraman y Ullman) y consultas
+# resueltas sobre la vista más chica, contra un groupby de pandas
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache_consultas
+import cubo
+import reticulo
+from conftest import agrupar
+
+
+def _comparar(obtenido, esperado):
+    pd.testing.assert_frame_equal(obtenido.reset_index(drop=True), esperado.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize('dims', [{'Año'}, {'Producto', 'Región'}, {'Año', 'Trimestre', 'Mes'}])
+def test_reducir_igual_a_groupby(cubo_ventas, ventas, dims):
+    vista = reticulo.reducir(cubo_ventas, frozenset(dims))
+    por = [dim for dim in cubo.DIMENSIONES if dim in dims]
+    _comparar(cubo.agregar(vista, por), agrupar(ventas, por))
+    assert reticulo.celdas(vista) == np.prod([ventas[dim].nunique() for dim in por])
+
+
+def test_sin_consultas_no_materializa(cubo_ventas):
+    assert reticulo.Reticulo(cubo_ventas).seleccionar() == []
+
+
+def test_elige_el_nodo_consultado(cubo_ventas):
+    r = reticulo.Reticulo(cubo_ventas)
+    for _ in range(10):
+        r.registrar(cache_consultas.consulta(['Producto']))
+    assert r.seleccionar() == ['Producto']
+    nodo, vista = r.elegir(cache_consultas.consulta(['Producto']))
+    assert nodo == frozenset({'Producto'}) and reticulo.celdas(vista) == 4
+
+
+# Con dos consultas frecuentes se materializan los dos nodos y cada una se
+# resuelve sobre el más chico que la contiene; el filtro cuenta como dimensión
+def test_ancestro_mas_chico(cubo_ventas, ventas):
+    r = reticulo.Reticulo(cubo_ventas)
+    por_producto = cache_consultas.consulta(['Producto'])
+    por_año = cache_consultas.consulta(['Año'], {'Producto': ['A', 'C']})
+    for _ in range(10):
+        r.registrar(por_producto)
+        r.registrar(por_año)
+    assert r.seleccionar() == ['Producto', 'Año × Producto']
+
+    assert r.elegir(por_producto)[0] == frozenset({'Producto'})
+    assert r.elegir(por_año)[0] == frozenset({'Año', 'Producto'})
+    assert r.elegir(cache_consultas.consulta(['Región']))[0] is None
+
+    _comparar(cache_consultas.ejecutar(r.resolver(por_año), por_año),
+              agrupar(ventas[ventas['Producto'].isin(['A', 'C'])], ['Año'])[['Año', 'Ventas']])
+    _comparar(cache_consultas.ejecutar(r.resolver(por_producto), por_producto),
+              agrupar(ventas, ['Producto'])[['Producto', 'Ventas']])
+
+
+def test_respeta_el_presupuesto(cubo_ventas):
+    consulta = cache_consultas.consulta(['Año', 'Mes', 'Producto'])
+    # Año × Mes × Producto ocupa 2 x 12 x 4 celdas
+    tamaño = 2 * 12 * 4 * reticulo.BYTES_POR_CELDA
+    justo = reticulo.Reticulo(cubo_ventas, presupuesto_bytes=tamaño)
+    corto = reticulo.Reticulo(cubo_ventas, presupuesto_bytes=tamaño - 1)
+    for r in (justo, corto):
+        r.registrar(consulta)
+    assert justo.seleccionar() == ['Año × Mes × Producto']
+    assert corto.seleccionar() == []
+    assert corto.elegir(consulta)[1] is cubo_ventas
+
+
+# La revisión se lanza en el pool del servicio al llegar a REVISAR_CADA
+def test_revisa_cada_tantas_consultas(cubo_ventas):
+    r = reticulo.Reticulo(cubo_ventas)
+    for _ in range(reticulo.REVISAR_CADA - 1):
+        assert r.registrar(cache_consultas.consulta(['Región'])) is None
+    assert r.vistas == {}
+    revision = r.registrar(cache_consultas.consulta(['Región']))
+    assert revision.result() == ['Región']
+    assert list(r.vistas) == [frozenset({'Región'})]
+
+
+# Un cubo sin miembros en alguna dimensión (almacén vacío o slice vacío)
+def test_cubo_vacio(ventas):
+    vacio = cubo.construir_cubo(ventas.iloc[:0])
+    r = reticulo.Reticulo(vacio)
+    r.registrar(cache_consultas.consulta(['Producto']))
+    assert r.seleccionar() == []
+    assert cache_consultas.ejecutar(r.resolver(cache_consultas.consulta(['Producto'])),
+                                    cache_consultas.consulta(['Producto'])).empty
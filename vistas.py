@@ -0,0 +1,30 @@
+# vistas.py
+# Evaluación perezosa de las vistas del dashboard. Cada vista declara las
+# entradas de las que depende (versión de datos, filtros, selecciones) y su
+# resultado se reutiliza mientras esas entradas no cambien. El estado se
+# guarda en un diccionario por sesión (st.session_state en la app).
+
+import instrumentacion
+
+CLAVE_ESTADO = '_vistas'
+
+
+# Devolver el resultado guardado de la vista o calcularlo con construir()
+def memo(estado, nombre, entradas, construir):
+    vistas = estado.setdefault(CLAVE_ESTADO, {})
+    previo = vistas.get(nombre)
+    if previo is not None and previo[0] == entradas:
+        instrumentacion.contar(f'vista.{nombre}.reutilizada')
+        return previo[1]
+    resultado = construir()
+    vistas[nombre] = (entradas, resultado)
+    instrumentacion.contar(f'vista.{nombre}.calculada')
+    return resultado
+
+
+# Los widgets de una pestaña que no se ejecuta en un rerun pierden su valor.
+# Reasignar las claves al inicio del script las mantiene entre pestañas.
+def conservar_widgets(estado, claves):
+    for clave in claves:
+        if clave in estado:
+            estado[clave] = estado[clave]